@@ -0,0 +1,52 @@
+"""
+Compares two results files from benchmarks/run.py.
+
+    python benchmarks/compare.py baseline.json candidate.json
+
+For each (stage, size) in both files, prints seconds and peak RSS side by
+side with the candidate/baseline ratio (below 1.0 is better).
+"""
+import argparse
+import json
+from typing import Dict, Tuple
+
+
+def _load(path: str) -> Tuple[Dict, Dict[Tuple[str, int], Dict]]:
+    with open(path, "r", encoding="utf-8") as f:
+        report = json.load(f)
+    return report.get("meta", {}), {(r["stage"], r["size"]): r for r in report["results"]}
+
+
+def _ratio(new, old) -> str:
+    if not new or not old:
+        return "   -  "
+    return f"{new / old:6.2f}"
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    p.add_argument("baseline")
+    p.add_argument("candidate")
+    args = p.parse_args()
+
+    old_meta, old = _load(args.baseline)
+    new_meta, new = _load(args.candidate)
+    print(f"baseline:  {old_meta.get('git_rev')} {old_meta.get('timestamp')}")
+    print(f"candidate: {new_meta.get('git_rev')} {new_meta.get('timestamp')}\n")
+    print(f"{'stage':>12} {'size':>7} {'old s':>9} {'new s':>9} {'x':>6} {'old MB':>8} {'new MB':>8} {'x':>6}")
+
+    for key in sorted(old.keys() & new.keys(), key=lambda k: (k[1], k[0])):
+        o, n = old[key], new[key]
+        print(
+            f"{key[0]:>12} {key[1]:>7} {o['seconds']:9.3f} {n['seconds']:9.3f} {_ratio(n['seconds'], o['seconds'])} "
+            f"{o.get('peak_rss_mb') or 0:8.1f} {n.get('peak_rss_mb') or 0:8.1f} "
+            f"{_ratio(n.get('peak_rss_mb'), o.get('peak_rss_mb'))}"
+        )
+
+    only = sorted((old.keys() ^ new.keys()), key=lambda k: (k[1], k[0]))
+    if only:
+        print("\nIn only one file: " + ", ".join(f"{s}@{n}" for s, n in only))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,332 @@
+"""
+Synthetic data for the benchmarks: Track lists, Rekordbox XML exports,
+Discogs release payloads / compact indexes, and a local fake Discogs API.
+
+Everything is seeded, so the same arguments always give the same data.
+"""
+import hashlib
+import json
+import os
+import random
+import sys
+import threading
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Sequence
+from urllib.parse import parse_qs, urlparse
+from xml.sax.saxutils import quoteattr
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from discogs_sync import _compact_index, save_release_index  # noqa: E402
+from models import Track  # noqa: E402
+
+WORDS = (
+    "love night dance fire heart baby disco dream city light feel music time "
+    "summer body soul funk groove star fever magic paradise rhythm desire moon "
+    "boogie shine midnight crazy sweet golden electric tonight forever"
+).split()
+MIXES = ["(Original Mix)", "(Extended Mix)", "(Dub)", "(12\" Version)", "(Edit)", ""]
+GENRES = ["Disco", "Italo-Disco", "Boogie", "House", "Funk", "Soul", "Electro", "Hi-NRG"]
+# date_added of the newest collection item
+_NEWEST = datetime(2024, 1, 1, tzinfo=timezone.utc)
+_LAST_MODIFIED = "Mon, 01 Jan 2024 00:00:00 GMT"
+
+
+def _name(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS).capitalize() for _ in range(words))
+
+
+def synthetic_library(n: int, seed: int = 0) -> List[Track]:
+    rng = random.Random(seed)
+    artists = [_name(rng, rng.randint(1, 3)) for _ in range(max(1, n // 8))]
+    return [
+        Track(
+            id=i + 1,
+            title=f"{_name(rng, rng.randint(1, 4))} {rng.choice(MIXES)}".strip(),
+            artist=rng.choice(artists),
+            bpm=rng.uniform(95, 130),
+            key=f"{rng.randint(1, 12):02d}{rng.choice('AB')}",
+            genres=rng.sample(GENRES, rng.randint(0, 2)),
+            energy=rng.randint(1, 10) if rng.random() < 0.8 else None,
+        )
+        for i in range(n)
+    ]
+
+
+def edited_library(
+    tracks: Sequence[Track], added: int = 10, removed: int = 5, changed: int = 5, seed: int = 3
+) -> List[Track]:
+    """
+    The library as a later Rekordbox export might have it: some tracks gone,
+    some re-analysed (new BPM, key, energy), and new ones at the end with
+    ids past the existing ones.
+    """
+    rng = random.Random(seed)
+    gone = set(rng.sample(range(len(tracks)), min(removed, len(tracks))))
+    out = [t for i, t in enumerate(tracks) if i not in gone]
+    for i in rng.sample(range(len(out)), min(changed, len(out))):
+        t = out[i]
+        out[i] = Track(
+            id=t.id,
+            title=t.title,
+            artist=t.artist,
+            bpm=round(t.bpm + rng.uniform(-1, 1), 2),
+            key=f"{rng.randint(1, 12):02d}{rng.choice('AB')}",
+            genres=t.genres,
+            energy=rng.randint(1, 10),
+        )
+    next_id = max((t.id for t in tracks), default=0) + 1
+    for i, t in enumerate(synthetic_library(added, seed=seed)):
+        t.id = next_id + i
+        out.append(t)
+    return out
+
+
+def _typo(rng: random.Random, text: str) -> str:
+    if len(text) < 4:
+        return text
+    i = rng.randrange(len(text) - 1)
+    return text[:i] + text[i + 1] + text[i] + text[i + 2:]
+
+
+def _discogs_title(rng: random.Random, title: str) -> str:
+    """
+    How a Rekordbox title tends to look on Discogs: no mix info, sometimes a
+    typo or a missing word.
+    """
+    title = title.split(" (")[0]
+    if rng.random() < 0.5:
+        title = _typo(rng, title)
+    words = title.split()
+    if len(words) > 2 and rng.random() < 0.3:
+        words.pop(rng.randrange(len(words)))
+    return " ".join(words)
+
+
+def synthetic_queries(library: Sequence[Track], n: int, seed: int = 1):
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(n):
+        if rng.random() < 0.1:
+            queries.append((_name(rng, 2), _name(rng, 3)))
+            continue
+        t = rng.choice(library)
+        artist = t.artist if rng.random() < 0.8 else _typo(rng, t.artist)
+        queries.append((artist, _discogs_title(rng, t.title)))
+    return queries
+
+
+def write_rekordbox_xml(path: str, tracks: Sequence[Track], seed: int = 0, crates: int = 20) -> None:
+    """
+    Writes a Rekordbox-style export: every track in COLLECTION, an "All"
+    playlist, and a "Crates" folder of genre folders holding random crates
+    (nested NODEs, some tracks in several crates). Streams to disk, so
+    500k-track files don't need the document in memory.
+    """
+    rng = random.Random(seed)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<DJ_PLAYLISTS Version="1.0.0">\n')
+        f.write('  <PRODUCT Name="rekordbox" Version="6.8.0" Company="AlphaTheta"/>\n')
+        f.write(f'  <COLLECTION Entries="{len(tracks)}">\n')
+        for t in tracks:
+            comments = f"#{t.energy} Energy" if t.energy is not None else ""
+            f.write(
+                f'    <TRACK TrackID="{t.id}" Name={quoteattr(t.title)} Artist={quoteattr(t.artist)} '
+                f'Genre={quoteattr(", ".join(t.genres))} AverageBpm="{t.bpm:.2f}" '
+                f'Tonality="{t.key.lstrip("0")}" Comments={quoteattr(comments)}/>\n'
+            )
+        f.write("  </COLLECTION>\n  <PLAYLISTS>\n")
+        f.write('    <NODE Type="0" Name="ROOT" Count="2">\n')
+
+        f.write(f'      <NODE Name="All" Type="1" KeyType="0" Entries="{len(tracks)}">\n')
+        for t in tracks:
+            f.write(f'        <TRACK Key="{t.id}"/>\n')
+        f.write("      </NODE>\n")
+
+        f.write(f'      <NODE Type="0" Name="Crates" Count="{len(GENRES)}">\n')
+        per_folder = max(1, crates // len(GENRES))
+        for genre in GENRES:
+            f.write(f'        <NODE Type="0" Name={quoteattr(genre)} Count="{per_folder}">\n')
+            for c in range(per_folder):
+                size = min(len(tracks), rng.randint(20, 500))
+                members = rng.sample(range(len(tracks)), size)
+                f.write(f'          <NODE Name={quoteattr(f"{genre} {c + 1}")} Type="1" KeyType="0" Entries="{size}">\n')
+                for i in members:
+                    f.write(f'            <TRACK Key="{tracks[i].id}"/>\n')
+                f.write("          </NODE>\n")
+            f.write("        </NODE>\n")
+        f.write("      </NODE>\n")
+
+        f.write("    </NODE>\n  </PLAYLISTS>\n</DJ_PLAYLISTS>\n")
+
+
+def discogs_releases(library: Sequence[Track], n: int, seed: int = 2, per_release: int = 4) -> List[Dict]:
+    """
+    Discogs /releases/{id} payloads whose tracklists are perturbed copies of
+    library tracks (so they can be matched back), one artist per release.
+    """
+    rng = random.Random(seed)
+    releases = []
+    for i in range(n):
+        picks = [library[j] for j in rng.sample(range(len(library)), min(per_release, len(library)))]
+        sides = "AB" if len(picks) > 2 else "A"
+        releases.append(
+            {
+                "id": 100000 + i,
+                "title": _name(rng, rng.randint(1, 3)),
+                "artists": [{"name": picks[0].artist}],
+                "year": rng.randint(1975, 1989),
+                "formats": [{"name": "Vinyl", "qty": "1", "descriptions": ["12\""]}],
+                "tracklist": [
+                    {
+                        "position": f"{sides[j * len(sides) // len(picks)]}{j + 1}",
+                        "title": _discogs_title(rng, t.title),
+                        "duration": f"{rng.randint(3, 9)}:{rng.randint(0, 59):02d}",
+                    }
+                    for j, t in enumerate(picks)
+                ],
+            }
+        )
+    return releases
+
+
+def collection_items(releases: Sequence[Dict]) -> List[Dict]:
+    """
+    Collection listing entries (newest first) for the given releases.
+    """
+    items = []
+    for i, r in enumerate(releases):
+        items.append(
+            {
+                "instance_id": 500000 + i,
+                "date_added": (_NEWEST - timedelta(minutes=i)).isoformat(),
+                "basic_information": {
+                    "id": r["id"],
+                    "title": r["title"],
+                    "artists": r["artists"],
+                    "year": r["year"],
+                    "formats": r["formats"],
+                },
+            }
+        )
+    return items
+
+
+def write_release_index(path: str, releases: Sequence[Dict], username: str = "bench") -> Dict:
+    """
+    Writes (and returns) a compact discogs_releases.json for the releases,
+    as sync-discogs would produce it.
+    """
+    items = collection_items(releases)
+    index = _compact_index(username, 0, len(items), items, {r["id"]: r for r in releases})
+    save_release_index(index, path)
+    return index
+
+
+class FakeDiscogsServer:
+    """
+    Local stand-in for the Discogs API (collection listing + release
+    endpoints) on a background thread. Its rate-limit headers always report
+    plenty of budget, so the client's limiter never waits; `latency_s` adds
+    a fixed per-request delay to mimic the network.
+
+    Releases are served with an ETag (a hash of the body) and Last-Modified,
+    and conditional requests get a bodyless 304 while the release is
+    unchanged. Replacing an entry in `releases` changes its ETag.
+
+        with FakeDiscogsServer(releases) as server:
+            client = DiscogsClient("token", "bench", base_url=server.url, ...)
+    """
+
+    def __init__(self, releases: Sequence[Dict], latency_s: float = 0.0):
+        self.releases = {r["id"]: r for r in releases}
+        self.items = collection_items(releases)
+        self.latency_s = latency_s
+        self.requests = 0
+        self.not_modified = 0
+        self._lock = threading.Lock()
+        self._httpd: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handle(self, handler: BaseHTTPRequestHandler) -> None:
+        with self._lock:
+            self.requests += 1
+        if self.latency_s:
+            threading.Event().wait(self.latency_s)
+
+        url = urlparse(handler.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if "/collection/" in url.path:
+            page, per_page = int(params.get("page", 1)), int(params.get("per_page", 50))
+            items = self.items
+            if params.get("sort_order") == "asc":
+                items = items[::-1]
+            body = {
+                "pagination": {
+                    "page": page,
+                    "pages": max(1, -(-len(items) // per_page)),
+                    "per_page": per_page,
+                    "items": len(items),
+                },
+                "releases": items[(page - 1) * per_page: page * per_page],
+            }
+        else:
+            release = self.releases.get(int(url.path.rsplit("/", 1)[-1]))
+            if release is None:
+                handler.send_response(404)
+                handler.send_header("Content-Length", "0")
+                handler.end_headers()
+                return
+            body = release
+
+        data = json.dumps(body).encode("utf-8")
+        validators = {}
+        if "/releases/" in url.path and "/collection/" not in url.path:
+            validators = {"ETag": f'"{hashlib.sha1(data).hexdigest()}"', "Last-Modified": _LAST_MODIFIED}
+        not_modified = bool(validators) and handler.headers.get("If-None-Match") == validators["ETag"]
+        if not_modified:
+            with self._lock:
+                self.not_modified += 1
+
+        limit = 1000000
+        handler.send_response(304 if not_modified else 200)
+        for name, value in validators.items():
+            handler.send_header(name, value)
+        if not not_modified:
+            handler.send_header("Content-Type", "application/json")
+            handler.send_header("Content-Length", str(len(data)))
+        handler.send_header("X-Discogs-Ratelimit", str(limit))
+        handler.send_header("X-Discogs-Ratelimit-Used", "0")
+        handler.send_header("X-Discogs-Ratelimit-Remaining", str(limit))
+        handler.end_headers()
+        if not not_modified:
+            handler.wfile.write(data)
+
+    def __enter__(self) -> "FakeDiscogsServer":
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # headers and body go out in separate writes; don't let Nagle +
+            # delayed ACK add ~40ms to every keep-alive response
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args) -> None:
+                pass
+
+            def do_GET(self) -> None:
+                server._handle(self)
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._httpd.daemon_threads = True
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
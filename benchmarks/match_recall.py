@@ -0,0 +1,77 @@
+"""
+Recall/speed of MatchIndex.best_candidates against the brute-force ranking.
+
+    python benchmarks/match_recall.py --tracks 20000 --queries 200
+
+Queries are perturbed copies of library tracks (dropped mix info, typos,
+missing words) plus some that match nothing. Recall@N is the share of the
+brute-force top-N that the index also returns.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from match import rank_candidates  # noqa: E402
+from match_index import DEFAULT_SHORTLIST, MatchIndex  # noqa: E402
+from fixtures import synthetic_library, synthetic_queries  # noqa: E402
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    p.add_argument("--tracks", type=int, default=20000)
+    p.add_argument("--queries", type=int, default=200)
+    p.add_argument("--top", type=int, default=5)
+    p.add_argument("--shortlist", type=int, default=DEFAULT_SHORTLIST)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = p.parse_args()
+
+    library = synthetic_library(args.tracks, seed=args.seed)
+    queries = synthetic_queries(library, args.queries, seed=args.seed + 1)
+
+    t0 = time.perf_counter()
+    index = MatchIndex(library)
+    build_s = time.perf_counter() - t0
+
+    found = expected = top1 = 0
+    brute_s = index_s = 0.0
+    for artist, title in queries:
+        t0 = time.perf_counter()
+        exact = rank_candidates(artist, title, library, top_n=args.top)
+        brute_s += time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        approx = index.best_candidates(artist, title, top_n=args.top, shortlist_size=args.shortlist)
+        index_s += time.perf_counter() - t0
+
+        exact_ids = {t.id for _, t in exact}
+        found += len(exact_ids & {t.id for _, t in approx})
+        expected += len(exact_ids)
+        top1 += bool(exact and approx and exact[0][1].id == approx[0][1].id)
+
+    results = {
+        "tracks": args.tracks,
+        "queries": len(queries),
+        "top_n": args.top,
+        "shortlist": args.shortlist,
+        "recall_at_n": found / expected if expected else 1.0,
+        "top1_agreement": top1 / len(queries) if queries else 1.0,
+        "index_build_s": build_s,
+        "brute_force_ms_per_query": 1000 * brute_s / len(queries),
+        "index_ms_per_query": 1000 * index_s / len(queries),
+        "speedup": brute_s / index_s if index_s else None,
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for k, v in results.items():
+        print(f"{k:>26}: {v:.4f}" if isinstance(v, float) else f"{k:>26}: {v}")
+
+
+if __name__ == "__main__":
+    main()
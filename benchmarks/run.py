@@ -0,0 +1,287 @@
+"""
+Times the main pipelines on synthetic data and writes machine-readable results.
+
+    python benchmarks/run.py --sizes 1000,10000,100000 --out results.json
+    python benchmarks/compare.py old.json results.json
+
+Stages (pick with --stages):
+  import      import_rekordbox_playlist_xml on a generated export ("All" playlist)
+  match       MatchIndex candidate search for Discogs-style queries
+  match_brute brute-force track_match_score ranking (sizes up to --brute-max)
+  recommend   engine.recommend(k=10) for random seeds
+  recommend_many
+              engine.recommend_many(k=10) for the same seeds, as one batch
+  refresh     refresh_rekordbox_library + in-place TrackIndex/MatchIndex
+              updates after a re-export with a few tracks added, removed and
+              changed (full_rebuild_s: parse and index from scratch instead)
+  sync        build_release_index_all against a local fake Discogs API, then
+              again with a warm release store (sync_warm), then a conditional
+              revalidation of every cached release (sync_refresh)
+
+Sizes are library track counts, except for sync where they are collection
+release counts. Every stage runs in a fresh process so peak_rss_mb is that
+stage's own high-water mark; setup_rss_mb is the mark after fixtures were
+loaded, before the timed part.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from multiprocessing import get_context
+from typing import Callable, Dict, List, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from fixtures import (  # noqa: E402
+    FakeDiscogsServer,
+    discogs_releases,
+    edited_library,
+    synthetic_library,
+    synthetic_queries,
+    write_rekordbox_xml,
+)
+from timings import peak_rss_mb  # noqa: E402
+
+
+def _timed(fn: Callable[[], object]) -> float:
+    t0 = time.perf_counter()
+    fn()
+    return time.perf_counter() - t0
+
+
+def xml_fixture(workdir: str, size: int, seed: int) -> str:
+    path = os.path.join(workdir, f"rekordbox_{size}_{seed}.xml")
+    if not os.path.exists(path):
+        write_rekordbox_xml(path, synthetic_library(size, seed=seed), seed=seed)
+    return path
+
+
+def stage_import(size: int, args: argparse.Namespace) -> Dict:
+    from rekordbox_import import import_rekordbox_playlist_xml
+
+    path = xml_fixture(args.workdir, size, args.seed)
+    setup = peak_rss_mb()
+    tracks: List = []
+    seconds = _timed(lambda: tracks.extend(import_rekordbox_playlist_xml(path, "All")))
+    return {"setup_rss_mb": setup, "seconds": seconds, "items": len(tracks),
+            "xml_mb": os.path.getsize(path) / 1e6}
+
+
+def stage_match(size: int, args: argparse.Namespace) -> Dict:
+    from match_index import MatchIndex
+
+    library = synthetic_library(size, seed=args.seed)
+    queries = synthetic_queries(library, args.queries, seed=args.seed + 1)
+    setup = peak_rss_mb()
+
+    t0 = time.perf_counter()
+    index = MatchIndex(library)
+    build_s = time.perf_counter() - t0
+    seconds = _timed(lambda: [index.best_candidates(a, t, top_n=5) for a, t in queries])
+    return {"setup_rss_mb": setup, "seconds": seconds, "items": len(queries), "index_build_s": build_s}
+
+
+def stage_match_brute(size: int, args: argparse.Namespace) -> Optional[Dict]:
+    from match import rank_candidates
+
+    if size > args.brute_max:
+        return None
+    library = synthetic_library(size, seed=args.seed)
+    queries = synthetic_queries(library, args.queries, seed=args.seed + 1)
+    setup = peak_rss_mb()
+    seconds = _timed(lambda: [rank_candidates(a, t, library, top_n=5) for a, t in queries])
+    return {"setup_rss_mb": setup, "seconds": seconds, "items": len(queries)}
+
+
+def stage_recommend(size: int, args: argparse.Namespace) -> Dict:
+    from columnar import TrackColumns
+    from engine import recommend
+
+    library = synthetic_library(size, seed=args.seed)
+    seeds = random.Random(args.seed).choices(library, k=args.queries)
+    setup = peak_rss_mb()
+
+    t0 = time.perf_counter()
+    columns = TrackColumns(library)
+    build_s = time.perf_counter() - t0
+    seconds = _timed(lambda: [recommend(s, columns, k=10) for s in seeds])
+    return {"setup_rss_mb": setup, "seconds": seconds, "items": len(seeds), "columns_build_s": build_s}
+
+
+def stage_recommend_many(size: int, args: argparse.Namespace) -> Dict:
+    from columnar import TrackColumns
+    from engine import recommend_many
+
+    library = synthetic_library(size, seed=args.seed)
+    seeds = random.Random(args.seed).choices(library, k=args.queries)
+    columns = TrackColumns(library)
+    setup = peak_rss_mb()
+
+    seconds = _timed(lambda: recommend_many(seeds, columns, k=10))
+    return {"setup_rss_mb": setup, "seconds": seconds, "items": len(seeds)}
+
+
+def stage_refresh(size: int, args: argparse.Namespace) -> Dict:
+    from library_cache import load_rekordbox_library, refresh_rekordbox_library
+    from match_index import MatchIndex
+    from query import TrackIndex
+    from rekordbox_import import parse_rekordbox_library
+
+    path = os.path.join(args.workdir, f"rekordbox_refresh_{size}_{args.seed}.xml")
+    tracks = synthetic_library(size, seed=args.seed)
+    write_rekordbox_xml(path, tracks, seed=args.seed)
+    library = load_rekordbox_library(path, rebuild=True)
+    pool = library.pool()
+    index, match_index = TrackIndex(pool), MatchIndex(pool)
+    write_rekordbox_xml(path, edited_library(tracks), seed=args.seed)
+    setup = peak_rss_mb()
+
+    def refresh() -> None:
+        diff = refresh_rekordbox_library(library, path)
+        new_pool = library.pool()
+        diff = diff.for_pool(pool, new_pool)
+        index.update(new_pool, diff.changed)
+        match_index.update(new_pool, diff.changed)
+
+    seconds = _timed(refresh)
+
+    def rebuild() -> None:
+        new_pool = parse_rekordbox_library(path).pool()
+        TrackIndex(new_pool), MatchIndex(new_pool)
+
+    return {"setup_rss_mb": setup, "seconds": seconds, "items": len(library.collection),
+            "full_rebuild_s": _timed(rebuild)}
+
+
+def stage_sync(size: int, args: argparse.Namespace) -> List[Dict]:
+    from discogs_client import DiscogsClient
+    from discogs_sync import build_release_index_all, refresh_releases_cached
+
+    library = synthetic_library(max(1000, size), seed=args.seed)
+    releases = discogs_releases(library, size, seed=args.seed + 2)
+    del library
+
+    # build_release_index_all uses the default release store under ./cache
+    os.chdir(tempfile.mkdtemp(prefix="sync_", dir=args.workdir))
+    results = []
+    with FakeDiscogsServer(releases, latency_s=args.latency_ms / 1000) as server:
+        client = DiscogsClient("bench-token", "CrateLogicBench/0.1", base_url=server.url)
+        setup = peak_rss_mb()
+        for stage in ("sync", "sync_warm"):
+            before = server.requests
+            index: Dict = {}
+            seconds = _timed(lambda: index.update(build_release_index_all(client, "bench", workers=args.workers)))
+            results.append({"stage": stage, "setup_rss_mb": setup, "seconds": seconds,
+                            "items": len(index["releases"]), "http_requests": server.requests - before})
+
+        # Revalidate every cached release: all 304s, no bodies
+        before, before_304 = server.requests, server.not_modified
+        counts: Dict = {}
+        seconds = _timed(lambda: counts.update(refresh_releases_cached(
+            client, [r["release_id"] for r in index["releases"]], workers=args.workers)))
+        results.append({"stage": "sync_refresh", "setup_rss_mb": setup, "seconds": seconds,
+                        "items": counts["checked"], "http_requests": server.requests - before,
+                        "not_modified": server.not_modified - before_304})
+    return results
+
+
+STAGES: Dict[str, Callable] = {
+    "import": stage_import,
+    "match": stage_match,
+    "match_brute": stage_match_brute,
+    "recommend": stage_recommend,
+    "recommend_many": stage_recommend_many,
+    "refresh": stage_refresh,
+    "sync": stage_sync,
+}
+
+
+def _run_stage(name: str, size: int, args: argparse.Namespace) -> List[Dict]:
+    out = STAGES[name](size, args)
+    if out is None:
+        return []
+    peak = peak_rss_mb()
+    rows = out if isinstance(out, list) else [dict(out, stage=name)]
+    for row in rows:
+        row["size"] = size
+        row["throughput_per_s"] = row["items"] / row["seconds"] if row["seconds"] else None
+        row["peak_rss_mb"] = peak
+    return rows
+
+
+def _meta() -> Dict:
+    try:
+        rev = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip() or None
+    except OSError:
+        rev = None
+    try:
+        import numpy
+        numpy_version = numpy.__version__
+    except ImportError:
+        numpy_version = None
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_rev": rev,
+        "python": platform.python_version(),
+        "numpy": numpy_version,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    p.add_argument("--stages", default=",".join(STAGES), help="Comma-separated stages to run")
+    p.add_argument("--sizes", default="1000,10000", help="Comma-separated sizes (1000 - 500000)")
+    p.add_argument("--queries", type=int, default=200, help="Queries/seeds per match and recommend run")
+    p.add_argument("--brute-max", type=int, default=20000, help="Largest size for match_brute")
+    p.add_argument("--workers", type=int, default=4, help="Release fetch threads for sync")
+    p.add_argument("--latency-ms", type=float, default=0.0, help="Fake Discogs per-request latency")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--workdir", help="Where generated fixtures are kept (default: a temp dir)")
+    p.add_argument("--out", help="Write results JSON here instead of stdout")
+    args = p.parse_args()
+
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = [s for s in stages if s not in STAGES]
+    if unknown:
+        p.error(f"Unknown stages: {', '.join(unknown)}")
+    sizes = [int(s) for s in args.sizes.split(",")]
+    args.workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="cratelogic_bench_"))
+    os.makedirs(args.workdir, exist_ok=True)
+
+    results: List[Dict] = []
+    for size in sizes:
+        for name in stages:
+            # Fresh process per run, so peak RSS isn't inherited from earlier stages
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+                rows = pool.submit(_run_stage, name, size, args).result()
+            for row in rows:
+                print(
+                    f"{row['stage']:>12} size={size:<7} {row['seconds']:8.3f}s "
+                    f"{row['throughput_per_s'] or 0:12.1f}/s  peak {row['peak_rss_mb'] or 0:8.1f} MB",
+                    file=sys.stderr,
+                )
+            results.extend(rows)
+
+    report = {"meta": _meta(), "results": results}
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
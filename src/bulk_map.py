@@ -0,0 +1,220 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+from mapping_file import MAPPING_FORMAT
+from match_index import MatchIndex
+from models import Track
+
+# Auto-accept a match at or above this score...
+DEFAULT_THRESHOLD = 0.85
+# ...if it also beats the runner-up by at least this much
+DEFAULT_MARGIN = 0.05
+# Lines whose best candidate scores below this are treated as unmatched
+DEFAULT_REVIEW_FLOOR = 0.5
+# Releases handed to the process pool at a time
+DEFAULT_BATCH_SIZE = 2000
+
+# Per-worker state, set once by _init_worker so tasks only ship a release
+_worker_index: Optional[MatchIndex] = None
+
+
+def _init_worker(rb_tracks: Sequence[Track]) -> None:
+    global _worker_index
+    _worker_index = MatchIndex(rb_tracks)
+
+
+def map_release_auto(
+    index: MatchIndex,
+    release: Dict,
+    threshold: float = DEFAULT_THRESHOLD,
+    margin: float = DEFAULT_MARGIN,
+    review_floor: float = DEFAULT_REVIEW_FLOOR,
+    top_n: int = 5,
+) -> Tuple[Dict, List[Dict]]:
+    """
+    Non-interactive version of map-release for one release.
+    Returns (mapping, review items); mapping has the same shape as the
+    mapping_<release_id>.json files written by map-release. Review items
+    are "ambiguous" (a plausible match that isn't clear enough to accept)
+    or "unmatched" (nothing scored review_floor or more).
+    """
+    release_artist = (release.get("artists") or [""])[0]
+    mapping = {
+        "format": MAPPING_FORMAT,
+        "release_id": release.get("release_id"),
+        "title": release.get("title"),
+        "artists": release.get("artists"),
+        "genres": release.get("genres") or [],
+        "styles": release.get("styles") or [],
+        "tracks": [],
+    }
+    review: List[Dict] = []
+
+    for tr in release.get("tracklist", []):
+        pos = tr.get("position") or ""
+        title = tr.get("title") or ""
+        if not title:
+            continue
+
+        candidates = index.best_candidates(release_artist, title, top_n=top_n)
+        best_score = candidates[0][0] if candidates else 0.0
+        runner_up = candidates[1][0] if len(candidates) > 1 else 0.0
+        if best_score >= threshold and best_score - runner_up >= margin:
+            best = candidates[0][1]
+            mapping["tracks"].append(
+                {
+                    "position": pos,
+                    "discogs_title": title,
+                    "rb_track_id": best.id,
+                    "rb_artist": best.artist,
+                    "rb_title": best.title,
+                    "match_score": round(best_score, 4),
+                }
+            )
+            continue
+
+        review.append(
+            {
+                "status": "ambiguous" if best_score >= review_floor else "unmatched",
+                "release_id": release.get("release_id"),
+                "release_artist": release_artist,
+                "release_title": release.get("title"),
+                "position": pos,
+                "discogs_title": title,
+                "candidates": [
+                    {
+                        "rb_track_id": t.id,
+                        "rb_artist": t.artist,
+                        "rb_title": t.title,
+                        "match_score": round(score, 4),
+                    }
+                    for score, t in candidates
+                ],
+            }
+        )
+
+    return mapping, review
+
+
+def _map_release_task(args: Tuple[Dict, float, float, float, int]) -> Tuple[Dict, List[Dict]]:
+    release, threshold, margin, review_floor, top_n = args
+    return map_release_auto(_worker_index, release, threshold, margin, review_floor, top_n)
+
+
+def mapping_path(out_dir: str, release_id) -> str:
+    return os.path.join(out_dir, f"mapping_{release_id}.json")
+
+
+def _load_review_queue(path: str) -> List[Dict]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return []
+
+
+def _write_review_queue(path: str, batches: Iterable[List[Dict]]) -> int:
+    """
+    Writes review items as one JSON list while they arrive, batch by batch.
+    The file is replaced only once the list is complete.
+    """
+    count = 0
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write("[")
+        for batch in batches:
+            for item in batch:
+                f.write(",\n  " if count else "\n  ")
+                f.write(json.dumps(item, ensure_ascii=False, indent=2).replace("\n", "\n  "))
+                count += 1
+        f.write("\n]" if count else "]")
+    os.replace(tmp, path)
+    return count
+
+
+def map_all_releases(
+    releases: Iterable[Dict],
+    rb_tracks: Sequence[Track],
+    out_dir: str = ".",
+    review_path: str = "review_queue.json",
+    threshold: float = DEFAULT_THRESHOLD,
+    margin: float = DEFAULT_MARGIN,
+    review_floor: float = DEFAULT_REVIEW_FLOOR,
+    top_n: int = 5,
+    workers: Optional[int] = None,
+    overwrite: bool = False,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> Dict[str, int]:
+    """
+    Auto-maps every release against the Rekordbox pool across a process pool.
+
+    Each worker builds its own MatchIndex once; releases (any iterable, e.g.
+    a ReleaseIndexReader) are then fed to the workers batch_size at a time,
+    so a big collection is never held in memory at once. Releases with at
+    least one accepted track get a mapping_<release_id>.json in out_dir
+    (existing files are left alone unless overwrite=True); ambiguous and
+    unmatched lines go to review_path. Items already queued there for
+    releases this run doesn't map again (skipped as already mapped, or not
+    in `releases`) are kept; the rest are replaced by this run's.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    stats = {
+        "releases": 0,
+        "skipped_existing": 0,
+        "mapping_files": 0,
+        "accepted": 0,
+        "review": 0,
+        "unmatched": 0,
+        "review_kept": 0,
+    }
+    # Read up front, so a broken queue fails the run before any work is done
+    previous = _load_review_queue(review_path)
+    mapped_ids: Set = set()
+
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, batch_size // (workers * 8))
+
+    def todo_batches() -> Iterator[List[Dict]]:
+        it = iter(releases)
+        while True:
+            batch = list(islice(it, batch_size))
+            if not batch:
+                return
+            todo = [
+                r for r in batch
+                if overwrite or not os.path.exists(mapping_path(out_dir, r.get("release_id")))
+            ]
+            stats["skipped_existing"] += len(batch) - len(todo)
+            stats["releases"] += len(todo)
+            if todo:
+                yield todo
+
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(list(rb_tracks),)
+    ) as pool:
+        def review_batches() -> Iterator[List[Dict]]:
+            for todo in todo_batches():
+                mapped_ids.update(r.get("release_id") for r in todo)
+                tasks = [(r, threshold, margin, review_floor, top_n) for r in todo]
+                for mapping, review in pool.map(_map_release_task, tasks, chunksize=chunksize):
+                    unmatched = sum(item["status"] == "unmatched" for item in review)
+                    stats["unmatched"] += unmatched
+                    stats["review"] += len(review) - unmatched
+                    yield review
+                    if not mapping["tracks"]:
+                        continue
+                    with open(mapping_path(out_dir, mapping["release_id"]), "w", encoding="utf-8") as f:
+                        json.dump(mapping, f, ensure_ascii=False, indent=2)
+                    stats["mapping_files"] += 1
+                    stats["accepted"] += len(mapping["tracks"])
+
+            kept = [item for item in previous if item.get("release_id") not in mapped_ids]
+            stats["review_kept"] = len(kept)
+            yield kept
+
+        _write_review_queue(review_path, review_batches())
+
+    return stats
@@ -1,12 +1,20 @@
 import argparse
+import cProfile
 import json
+import pstats
+import sys
 import os
-from typing import Dict, List, Tuple
+import random
+from typing import Dict, List, Optional
 
-from discogs_client import DiscogsClient
+from discogs_client import DEFAULT_PAGE_WORKERS, DEFAULT_POOL_SIZE, DISCOGS_API_URL, DiscogsClient
 from discogs_sync import (
+    DEFAULT_WORKERS,
     build_release_index_all,
-    save_release_index,
+    open_release_index,
+    repair_sync_state,
+    write_release_index_all,
+    write_release_index_incremental,
 )
 
 # Optional: only if you added it
@@ -15,12 +23,25 @@ try:
 except Exception:
     build_release_index_all = None
 
-from rekordbox_import import import_rekordbox_playlist_xml
-from engine import recommend
-from match import track_match_score
+from library_cache import load_rekordbox_library
+from engine import recommend, recommend_many
+from match_index import MatchIndex
+from planner import SetPlanner
+from compat_graph import DEFAULT_K, CompatGraph
+from bulk_map import DEFAULT_MARGIN, DEFAULT_THRESHOLD, map_all_releases
+from daemon_client import DEFAULT_SERVER_URL, DaemonClient
+from server import DEFAULT_HOST, DEFAULT_PORT, LibraryState, make_server
+from scan_pipeline import DEFAULT_P99_BUDGET_MS, ScanPipeline, load_mappings
+from mapping_file import MAPPING_FORMAT, load_mapping, mapped_tracks
+from tag_registry import DEFAULT_TAG_REGISTRY, TagRegistry
+from nfc_sim import simulate_tags
+from discogs_genres import apply_discogs_genres
+from map_release import pick_release
+import timings
 
 
 DEFAULT_USER_AGENT = "CrateLogic/0.1 (dev) +local"
+REBUILD_CACHE_HELP = "Reparse the Rekordbox XML instead of using its .snapshot cache"
 
 
 def _require_env(name: str) -> str:
@@ -30,9 +51,29 @@ def _require_env(name: str) -> str:
     return value
 
 
-def _load_json(path: str) -> Dict:
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+DISCOGS_GENRES_HELP = "Also use the Discogs genres/styles from the mapping_*.json files in this directory"
+PLAYLIST_HELP = (
+    "Rekordbox playlist name or path, e.g. 'Crates/Disco' (repeatable; folders include "
+    "everything below them; default: the whole collection)"
+)
+
+
+def _load_playlist(
+    xml_path: str,
+    playlists: Optional[List[str]],
+    rebuild_cache: bool = False,
+    discogs_genres: Optional[str] = None,
+):
+    library = load_rekordbox_library(xml_path, rebuild=rebuild_cache)
+    tracks = library.pool(playlists)
+    if discogs_genres:
+        changed = apply_discogs_genres(tracks, load_mappings(discogs_genres))
+        print(f"Added Discogs genres/styles to {changed} tracks")
+    return tracks
+
+
+def _pool_label(playlists: Optional[List[str]]) -> str:
+    return ", ".join(f"'{p}'" for p in playlists) if playlists else "the whole collection"
 
 
 def cmd_sync_discogs(args: argparse.Namespace) -> None:
@@ -47,75 +88,90 @@ def cmd_sync_discogs(args: argparse.Namespace) -> None:
     client = DiscogsClient(
         token=token,
         user_agent=args.user_agent or DEFAULT_USER_AGENT,
+        base_url=args.base_url,
+        # release fetches and collection pages share the session's pool
+        pool_size=max(DEFAULT_POOL_SIZE, args.workers + DEFAULT_PAGE_WORKERS),
     )
 
-    data = build_release_index_all(
-        client,
-        username=username,
-        folder_id=args.folder_id,
-    )
-
-    save_release_index(data, path=args.out)
+    repair_sync_state(args.out)
+    if args.incremental:
+        header = write_release_index_incremental(
+            client,
+            username=username,
+            path=args.out,
+            folder_id=args.folder_id,
+            workers=args.workers,
+        )
+    else:
+        header = write_release_index_all(
+            client,
+            username=username,
+            path=args.out,
+            folder_id=args.folder_id,
+            workers=args.workers,
+            refresh=args.refresh,
+            refresh_age_s=args.refresh_age_days * 86400,
+            resume=not args.restart,
+        )
 
+    if args.refresh:
+        r = header["refresh"]
+        print(
+            f"Revalidated {r.get('checked', 0)} cached releases: {r.get('not_modified', 0)} unchanged, "
+            f"{r.get('updated', 0)} updated, {r.get('failed', 0)} failed "
+            f"({r.get('skipped_recent', 0)} checked recently, skipped)"
+        )
     print(
-        f"Saved {len(data['releases'])} releases "
-        f"(of {data['count']} in collection) to {args.out}"
+        f"Saved {header['written']} releases "
+        f"(of {header['count']} in collection) to {args.out}"
     )
 
 
+def _open_release_cache(path: str):
+    reader = open_release_index(path)
+    if reader is None or not len(reader):
+        if reader is not None:
+            reader.close()
+        raise RuntimeError(f"No releases found in {path}")
+    return reader
+
+
 def cmd_import_rekordbox(args: argparse.Namespace) -> None:
-    tracks = import_rekordbox_playlist_xml(args.xml, args.playlist)
-    print(f"Imported {len(tracks)} tracks from playlist: {args.playlist}")
+    if args.list:
+        library = load_rekordbox_library(args.xml, rebuild=args.rebuild_cache)
+        for path in library.playlist_paths():
+            print(path)
+        return
+    tracks = _load_playlist(args.xml, args.playlist, args.rebuild_cache)
+    print(f"Imported {len(tracks)} tracks from {_pool_label(args.playlist)}")
     if args.show:
         for t in tracks[: args.show]:
             print(f"- {t.artist} - {t.title} | {t.bpm:.2f} | {t.key} | E{t.energy}")
 
 
-def _best_candidates(
-    discogs_artist: str, discogs_title: str, rb_tracks, top_n: int = 5
-) -> List[Tuple[float, object]]:
-    scored = []
-    for t in rb_tracks:
-        s = track_match_score(discogs_artist, discogs_title, t.artist, t.title)
-        scored.append((s, t))
-    scored.sort(key=lambda x: x[0], reverse=True)
-    return scored[:top_n]
-
-
 def cmd_map_release(args: argparse.Namespace) -> None:
-    rb_tracks = import_rekordbox_playlist_xml(args.rbxml, args.playlist)
-    discogs = _load_json(args.cache)
-
-    releases = discogs.get("releases", [])
-    if not releases:
-        raise RuntimeError(f"No releases found in {args.cache}")
-
-    # Choose release by id or list+pick
-    release = None
-    if args.release_id:
-        rid = str(args.release_id)
-        for r in releases:
-            if str(r.get("release_id")) == rid:
-                release = r
-                break
-        if not release:
-            raise RuntimeError(f"Release id {args.release_id} not found in cache.")
-    else:
-        print("\nDiscogs releases (cached):")
-        for i, r in enumerate(releases, start=1):
-            artists = ", ".join(r.get("artists") or [])
-            print(f"{i:>2}. {artists} - {r.get('title')} (id: {r.get('release_id')})")
-        idx = int(input("\nPick release number: "))
-        release = releases[idx - 1]
+    rb_tracks = _load_playlist(args.rbxml, args.playlist, args.rebuild_cache)
+    match_index = MatchIndex(rb_tracks)
+    with _open_release_cache(args.cache) as releases:
+        # Choose release by id or list+pick
+        if args.release_id:
+            release = releases.get(args.release_id)
+            if not release:
+                raise RuntimeError(f"Release id {args.release_id} not found in cache.")
+        else:
+            release = pick_release(releases)
 
     release_artist = (release.get("artists") or [""])[0]
     print(f"\nSelected: {release_artist} - {release.get('title')}")
     print(f"Release ID: {release.get('release_id')}\n")
 
     mapping = {
+        "format": MAPPING_FORMAT,
         "release_id": release.get("release_id"),
         "title": release.get("title"),
         "artists": release.get("artists"),
+        "genres": release.get("genres") or [],
+        "styles": release.get("styles") or [],
         "tracks": [],
     }
 
@@ -126,7 +182,7 @@ def cmd_map_release(args: argparse.Namespace) -> None:
             continue
 
         print(f"\n{pos} — {title}")
-        candidates = _best_candidates(release_artist, title, rb_tracks, top_n=args.top)
+        candidates = match_index.best_candidates(release_artist, title, top_n=args.top)
 
         for i, (score, t) in enumerate(candidates, start=1):
             print(
@@ -153,36 +209,70 @@ def cmd_map_release(args: argparse.Namespace) -> None:
     print(f"\nSaved mapping to {out_path}")
 
 
+def cmd_map_all(args: argparse.Namespace) -> None:
+    rb_tracks = _load_playlist(args.rbxml, args.playlist, args.rebuild_cache)
+    with _open_release_cache(args.cache) as releases:
+        stats = map_all_releases(
+            releases,
+            rb_tracks,
+            out_dir=args.out_dir,
+            review_path=args.review_out,
+            threshold=args.threshold,
+            margin=args.margin,
+            top_n=args.top,
+            workers=args.workers,
+            overwrite=args.overwrite,
+        )
+
+    print(
+        f"Mapped {stats['releases']} releases ({stats['skipped_existing']} already mapped, skipped): "
+        f"{stats['accepted']} tracks auto-accepted into {stats['mapping_files']} mapping files, "
+        f"{stats['review']} ambiguous and {stats['unmatched']} unmatched lines queued for review "
+        f"in {args.review_out} ({stats['review_kept']} kept from earlier runs)"
+    )
+
+
 def cmd_run_mapping(args: argparse.Namespace) -> None:
-    tracks = import_rekordbox_playlist_xml(args.rbxml, args.playlist)
+    tracks = _load_playlist(args.rbxml, args.playlist, args.rebuild_cache, args.discogs_genres)
     track_index = {t.id: t for t in tracks}
 
-    mapping = _load_json(args.mapping)
+    mapping = load_mapping(args.mapping)
+    if mapping is None:
+        return
     print(f"\nRelease: {', '.join(mapping.get('artists') or [])} - {mapping.get('title')}")
     print(f"Release ID: {mapping.get('release_id')}\n")
 
-    mapped_tracks = mapping.get("tracks", [])
-    if not mapped_tracks:
-        print("No mapped tracks in this file.")
+    mapped = mapped_tracks(mapping, track_index)
+    if not mapped:
+        print(f"None of the mapped tracks are in {_pool_label(args.playlist)}.")
         return
+    missing = len(mapping.get("tracks", [])) - len(mapped)
+    if missing:
+        print(f"({missing} mapped tracks are not in {_pool_label(args.playlist)})")
 
     print("Mapped tracks:")
-    for i, mt in enumerate(mapped_tracks, start=1):
-        rb = track_index.get(mt["rb_track_id"])
-        if rb:
-            print(
-                f"{i}. {mt.get('position')} — {mt.get('discogs_title')}  →  "
-                f"{rb.artist} - {rb.title} ({rb.bpm:.2f}, {rb.key}, E{rb.energy})"
-            )
+    for i, (mt, rb) in enumerate(mapped, start=1):
+        print(
+            f"{i}. {mt.get('position')} — {mt.get('discogs_title')}  →  "
+            f"{rb.artist} - {rb.title} ({rb.bpm:.2f}, {rb.key}, E{rb.energy})"
+        )
 
     choice = int(input("\nSelect number: "))
-    current = track_index[mapped_tracks[choice - 1]["rb_track_id"]]
+    if not 1 <= choice <= len(mapped):
+        raise RuntimeError(f"Pick a number from 1 to {len(mapped)}.")
+    current = mapped[choice - 1][1]
 
     print(f"\nCurrent: {current.artist} - {current.title}")
     print(f"BPM: {current.bpm:.2f} | Key: {current.key} | Energy: {current.energy}\n")
 
-    results = recommend(current, tracks)
-    for track, score, b in results[: args.n]:
+    graph = None
+    if args.graph:
+        graph = CompatGraph.load(args.graph, tracks)
+        if graph is None:
+            print(f"Warning: {args.graph} was built for a different library; scoring live.")
+
+    results = recommend(current, tracks, k=args.n, graph=graph)
+    for track, score, b in results:
         print(
             f"{track.artist} - {track.title} | "
             f"{track.bpm:.2f} | {track.key} | E{track.energy} | "
@@ -190,8 +280,199 @@ def cmd_run_mapping(args: argparse.Namespace) -> None:
         )
 
 
+def cmd_build_graph(args: argparse.Namespace) -> None:
+    tracks = _load_playlist(args.rbxml, args.playlist, args.rebuild_cache, args.discogs_genres)
+    graph = CompatGraph.build(tracks, k=args.k)
+    graph.save(args.out)
+    print(f"Saved top-{args.k} compatibility graph for {len(tracks)} tracks to {args.out}")
+
+
+def cmd_suggest_mapped(args: argparse.Namespace) -> None:
+    tracks = _load_playlist(args.rbxml, args.playlist, args.rebuild_cache, args.discogs_genres)
+    mappings = load_mappings(args.mappings_dir)
+    if not mappings:
+        raise RuntimeError(f"No mapping_*.json files in {args.mappings_dir}")
+
+    by_id = {t.id: t for t in tracks}
+    seeds = list({
+        track.id: track for m in mappings.values() for _, track in mapped_tracks(m, by_id)
+    }.values())
+
+    graph = CompatGraph.load(args.graph, tracks) if args.graph else None
+    results = recommend_many(seeds, tracks, k=args.n, graph=graph, workers=args.workers)
+
+    suggestions = {
+        str(seed.id): [
+            {"rb_track_id": t.id, "artist": t.artist, "title": t.title, "score": score, "breakdown": b}
+            for t, score, b in recs
+        ]
+        for seed, recs in zip(seeds, results)
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(suggestions, f, ensure_ascii=False, indent=2)
+    print(f"Saved top-{args.n} suggestions for {len(seeds)} mapped tracks to {args.out}")
+
+
+def cmd_plan_set(args: argparse.Namespace) -> None:
+    tracks = _load_playlist(args.rbxml, args.playlist, args.rebuild_cache, args.discogs_genres)
+
+    # "Artist - Title" or just a title; fuzzy-matched like map-release does
+    artist, _, title = args.seed.rpartition(" - ")
+    candidates = MatchIndex(tracks).best_candidates(artist, title, top_n=1)
+    if not candidates:
+        raise RuntimeError(f"No track in {_pool_label(args.playlist)} matches: {args.seed}")
+    seed = candidates[0][1]
+
+    energy_curve = [float(x) for x in args.energy.split(",")] if args.energy else None
+    plan = SetPlanner(tracks).plan(
+        seed,
+        length=args.n,
+        beam_width=args.beam,
+        energy_curve=energy_curve,
+        time_budget_s=args.time_budget,
+    )
+
+    print(f"\nSet of {len(plan)} tracks from: {seed.artist} - {seed.title}\n")
+    for i, step in enumerate(plan, start=1):
+        t = step.track
+        transition = f"{step.score}" if i > 1 else "seed"
+        print(f"{i:>3}. {t.artist} - {t.title} | {t.bpm:.2f} | {t.key} | E{t.energy} | {transition}")
+
+
+def cmd_serve(args: argparse.Namespace) -> None:
+    if args.rebuild_cache:
+        load_rekordbox_library(args.rbxml, rebuild=True)
+    state = LibraryState(
+        args.rbxml,
+        args.playlist,
+        mappings_dir=args.mappings_dir,
+        graph_path=args.graph,
+        tag_registry=args.tags,
+        discogs_genres=args.discogs_genres,
+    )
+    httpd = make_server(state, args.host, args.port)
+    print(
+        f"Serving {len(state.tracks)} tracks from {_pool_label(args.playlist)} "
+        f"({len(state.mappings)} mappings, {len(state.scans.registry)} tags) on http://{args.host}:{args.port}"
+    )
+    if args.watch:
+        state.watch(args.watch)
+        print(f"Watching {args.rbxml} for changes every {args.watch:g}s")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+
+
+def cmd_recommend(args: argparse.Namespace) -> None:
+    client = DaemonClient(args.server)
+    track_id = args.track_id
+    if track_id is None:
+        candidates = client.lookup(args.query, k=1)["candidates"]
+        if not candidates:
+            raise RuntimeError(f"No track matches: {args.query}")
+        track_id = candidates[0]["track"]["id"]
+
+    body = client.recommend(track_id, k=args.n)
+    current = body["current"]
+    print(f"\nCurrent: {current['artist']} - {current['title']}")
+    print(f"BPM: {current['bpm']:.2f} | Key: {current['key']} | Energy: {current['energy']}\n")
+    for r in body["results"]:
+        t, b = r["track"], r["breakdown"]
+        print(
+            f"{t['artist']} - {t['title']} | "
+            f"{t['bpm']:.2f} | {t['key']} | E{t['energy']} | "
+            f"{r['score']} (key {b['key']}, bpm {b['bpm']}, energy {b['energy']}, genre {b['genre']})"
+        )
+    print(f"\n({body['elapsed_ms']} ms server time)")
+
+
+def cmd_lookup(args: argparse.Namespace) -> None:
+    body = DaemonClient(args.server).lookup(args.query, k=args.n)
+    for c in body["candidates"]:
+        t = c["track"]
+        print(f"[{t['id']}] {t['artist']} - {t['title']} | {t['bpm']:.2f} | {t['key']} | match {c['match']:.3f}")
+    print(f"\n({body['elapsed_ms']} ms server time)")
+
+
+def cmd_refresh(args: argparse.Namespace) -> None:
+    body = DaemonClient(args.server, timeout_s=args.timeout).refresh()
+    if not (body["added"] or body["removed"] or body["changed"]):
+        print(f"No changes ({body['tracks']} tracks)")
+    else:
+        print(
+            f"Added {body['added']}, removed {body['removed']}, changed {body['changed']} "
+            f"({body['tracks']} tracks, graph {'in use' if body['graph'] else 'off'})"
+        )
+    print(f"\n({body['elapsed_ms']} ms server time)")
+
+
+def _print_scan(body: Dict) -> None:
+    print(f"\nRelease: {', '.join(body.get('artists') or [])} - {body.get('title')}")
+    print(f"Release ID: {body.get('release_id')}")
+    for side in body["sides"]:
+        print(f"\nSide {side['side'] or '?'}:")
+        for entry in side["tracks"]:
+            t = entry["track"]
+            print(f"  {entry['position']} — {t['artist']} - {t['title']} ({t['bpm']:.2f}, {t['key']}, E{t['energy']})")
+        print("  Next:")
+        for r in side["recommendations"]:
+            t = r["track"]
+            print(f"    {t['artist']} - {t['title']} | {t['bpm']:.2f} | {t['key']} | E{t['energy']} | {r['score']}")
+    print(f"\n({body['elapsed_ms']} ms server time)")
+
+
+def cmd_scan(args: argparse.Namespace) -> None:
+    _print_scan(DaemonClient(args.server).scan(args.uid, k=args.n))
+
+
+def cmd_tag_register(args: argparse.Namespace) -> None:
+    registry = TagRegistry(args.tags)
+    if args.remove:
+        if not registry.unregister(args.uid):
+            raise RuntimeError(f"Tag {args.uid} is not registered in {args.tags}")
+        print(f"Removed tag {args.uid}")
+    else:
+        if args.release_id is None:
+            raise RuntimeError("--release-id is required unless --remove is given")
+        registry.register(args.uid, args.release_id)
+        print(f"Tag {args.uid} -> release {args.release_id}")
+    registry.save()
+
+
+def cmd_simulate_scans(args: argparse.Namespace) -> None:
+    tracks = _load_playlist(args.rbxml, args.playlist, args.rebuild_cache, args.discogs_genres)
+    mappings = load_mappings(args.mappings_dir)
+    if not mappings:
+        raise RuntimeError(f"No mapping_*.json files in {args.mappings_dir}")
+
+    # In-memory registry: one simulated tag per mapped release
+    registry = TagRegistry(None)
+    uids = simulate_tags(registry, sorted(mappings), seed=args.seed)
+
+    graph = CompatGraph.load(args.graph, tracks) if args.graph else None
+    pipeline = ScanPipeline(tracks, mappings, registry, graph=graph, k=args.n, p99_budget_ms=args.budget_ms)
+
+    rng = random.Random(args.seed)
+    for _ in range(args.count):
+        if args.cold:
+            pipeline.drop_cached()
+        pipeline.scan(rng.choice(uids))
+
+    summary = pipeline.latency_summary()
+    print(json.dumps(summary, indent=2))
+    for kind, stats in summary.items():
+        if stats["count"] and not stats["within_budget"]:
+            print(f"{kind} p99 over budget ({stats['p99_ms']:.2f} ms > {args.budget_ms} ms)")
+
+
 def build_parser() -> argparse.ArgumentParser:
     p = argparse.ArgumentParser(prog="crate-logic")
+    p.add_argument("--timings", action="store_true", help="Print per-stage wall time, call counts and peak RSS")
+    p.add_argument("--timings-json", metavar="PATH", help="Also write the stage timings as JSON")
+    p.add_argument("--profile", metavar="PATH", help="Run under cProfile and dump stats to PATH")
     sub = p.add_subparsers(dest="cmd", required=True)
 
     # sync-discogs
@@ -201,40 +482,213 @@ def build_parser() -> argparse.ArgumentParser:
     s.add_argument("--user-agent", default=DEFAULT_USER_AGENT, help="Discogs User-Agent header")
     s.add_argument("--folder-id", type=int, default=0, help="Discogs folder id (0 is commonly All)")
     s.add_argument("--out", default="discogs_releases.json", help="Output JSON path")
+    s.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Concurrent release fetches")
+    mode = s.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Update the existing --out index: fetch only new items, drop removed ones",
+    )
+    mode.add_argument(
+        "--refresh",
+        action="store_true",
+        help="Revalidate cached releases (conditional requests; unchanged ones cost a 304) and rebuild the index",
+    )
+    s.add_argument(
+        "--refresh-age-days",
+        type=float,
+        default=0.0,
+        help="With --refresh, skip releases checked less than this many days ago",
+    )
+    s.add_argument(
+        "--restart",
+        action="store_true",
+        help="Ignore an interrupted sync's journal and start the full sync from page 1",
+    )
+    s.add_argument("--base-url", default=DISCOGS_API_URL, help="Discogs API base URL (e.g. a local fake server)")
     s.set_defaults(func=cmd_sync_discogs)
 
     # import-rekordbox
     r = sub.add_parser("import-rekordbox", help="Import a Rekordbox playlist from XML")
     r.add_argument("--xml", default="rekordbox.xml", help="Path to Rekordbox XML")
-    r.add_argument("--playlist", required=True, help="Playlist name to import")
+    r.add_argument("--playlist", action="append", help=PLAYLIST_HELP)
+    r.add_argument("--list", action="store_true", help="List every playlist/folder path and exit")
     r.add_argument("--show", type=int, default=0, help="Show first N imported tracks")
+    r.add_argument("--rebuild-cache", action="store_true", help=REBUILD_CACHE_HELP)
     r.set_defaults(func=cmd_import_rekordbox)
 
     # map-release
     m = sub.add_parser("map-release", help="Map Discogs release tracklist to Rekordbox tracks")
     m.add_argument("--cache", default="discogs_releases.json", help="Discogs cache JSON path")
     m.add_argument("--rbxml", default="rekordbox.xml", help="Path to Rekordbox XML")
-    m.add_argument("--playlist", required=True, help="Rekordbox playlist to use as match pool")
+    m.add_argument("--playlist", action="append", help=PLAYLIST_HELP)
     m.add_argument("--release-id", help="Discogs release id (optional)")
     m.add_argument("--top", type=int, default=5, help="Number of candidate matches to show per track")
     m.add_argument("--out", help="Output mapping json (default mapping_<release_id>.json)")
+    m.add_argument("--rebuild-cache", action="store_true", help=REBUILD_CACHE_HELP)
     m.set_defaults(func=cmd_map_release)
 
+    # map-all
+    ma = sub.add_parser("map-all", help="Auto-map every cached Discogs release to Rekordbox tracks")
+    ma.add_argument("--cache", default="discogs_releases.json", help="Discogs cache JSON path")
+    ma.add_argument("--rbxml", default="rekordbox.xml", help="Path to Rekordbox XML")
+    ma.add_argument("--playlist", action="append", help=PLAYLIST_HELP)
+    ma.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Auto-accept matches scoring at least this")
+    ma.add_argument("--margin", type=float, default=DEFAULT_MARGIN, help="Required lead over the runner-up to auto-accept")
+    ma.add_argument("--top", type=int, default=5, help="Candidates kept per review item")
+    ma.add_argument("--out-dir", default=".", help="Where to write mapping_<release_id>.json files")
+    ma.add_argument("--review-out", default="review_queue.json", help="Review queue JSON path")
+    ma.add_argument("--workers", type=int, help="Worker processes (default: CPU count)")
+    ma.add_argument("--overwrite", action="store_true", help="Replace existing mapping files")
+    ma.add_argument("--rebuild-cache", action="store_true", help=REBUILD_CACHE_HELP)
+    ma.set_defaults(func=cmd_map_all)
+
     # run-mapping
     rm = sub.add_parser("run-mapping", help="Run recommendations from a mapping_*.json file")
     rm.add_argument("--mapping", required=True, help="Path to mapping json")
     rm.add_argument("--rbxml", default="rekordbox.xml", help="Path to Rekordbox XML")
-    rm.add_argument("--playlist", required=True, help="Rekordbox playlist to recommend from")
+    rm.add_argument("--playlist", action="append", help=PLAYLIST_HELP)
     rm.add_argument("-n", type=int, default=10, help="How many recommendations to show")
+    rm.add_argument("--graph", help="Precomputed graph from build-graph (used when up to date)")
+    rm.add_argument("--discogs-genres", metavar="DIR", help=DISCOGS_GENRES_HELP)
+    rm.add_argument("--rebuild-cache", action="store_true", help=REBUILD_CACHE_HELP)
     rm.set_defaults(func=cmd_run_mapping)
 
+    # build-graph
+    bg = sub.add_parser("build-graph", help="Precompute top-K compatible neighbours for every track")
+    bg.add_argument("--rbxml", default="rekordbox.xml", help="Path to Rekordbox XML")
+    bg.add_argument("--playlist", action="append", help=PLAYLIST_HELP)
+    bg.add_argument("-k", type=int, default=DEFAULT_K, help="Neighbours kept per track")
+    bg.add_argument("--out", default="compat_graph.npz", help="Output graph path")
+    bg.add_argument("--discogs-genres", metavar="DIR", help=DISCOGS_GENRES_HELP)
+    bg.add_argument("--rebuild-cache", action="store_true", help=REBUILD_CACHE_HELP)
+    bg.set_defaults(func=cmd_build_graph)
+
+    # suggest-mapped
+    sm = sub.add_parser("suggest-mapped", help="Precompute recommendations for every mapped track")
+    sm.add_argument("--rbxml", default="rekordbox.xml", help="Path to Rekordbox XML")
+    sm.add_argument("--playlist", action="append", help=PLAYLIST_HELP)
+    sm.add_argument("--mappings-dir", default=".", help="Directory with mapping_*.json files")
+    sm.add_argument("--graph", help="Precomputed graph from build-graph (used when up to date)")
+    sm.add_argument("-n", type=int, default=10, help="Suggestions per track")
+    sm.add_argument("--workers", type=int, help="Worker processes for large batches (default: one process)")
+    sm.add_argument("--out", default="suggestions.json", help="Output JSON path")
+    sm.add_argument("--discogs-genres", metavar="DIR", help=DISCOGS_GENRES_HELP)
+    sm.add_argument("--rebuild-cache", action="store_true", help=REBUILD_CACHE_HELP)
+    sm.set_defaults(func=cmd_suggest_mapped)
+
+    # plan-set
+    ps = sub.add_parser("plan-set", help="Plan an N-track set from a seed track")
+    ps.add_argument("--seed", required=True, help='Seed track as "Artist - Title" (fuzzy matched)')
+    ps.add_argument("--rbxml", default="rekordbox.xml", help="Path to Rekordbox XML")
+    ps.add_argument("--playlist", action="append", help=PLAYLIST_HELP)
+    ps.add_argument("-n", type=int, default=20, help="Number of tracks in the set")
+    ps.add_argument("--beam", type=int, default=8, help="Beam width")
+    ps.add_argument("--energy", help='Energy curve control points, e.g. "4,7,9,6"')
+    ps.add_argument("--time-budget", type=float, help="Search time limit in seconds")
+    ps.add_argument("--discogs-genres", metavar="DIR", help=DISCOGS_GENRES_HELP)
+    ps.add_argument("--rebuild-cache", action="store_true", help=REBUILD_CACHE_HELP)
+    ps.set_defaults(func=cmd_plan_set)
+
+    # serve
+    sv = sub.add_parser("serve", help="Keep a playlist loaded and answer queries over local HTTP")
+    sv.add_argument("--rbxml", default="rekordbox.xml", help="Path to Rekordbox XML")
+    sv.add_argument("--playlist", action="append", help=PLAYLIST_HELP)
+    sv.add_argument("--mappings-dir", default=".", help="Directory with mapping_*.json files")
+    sv.add_argument("--graph", help="Precomputed graph from build-graph (used when up to date)")
+    sv.add_argument("--host", default=DEFAULT_HOST, help="Address to listen on")
+    sv.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port to listen on")
+    sv.add_argument("--tags", default=DEFAULT_TAG_REGISTRY, help="NFC tag registry JSON path")
+    sv.add_argument("--discogs-genres", metavar="DIR", help=DISCOGS_GENRES_HELP)
+    sv.add_argument("--rebuild-cache", action="store_true", help=REBUILD_CACHE_HELP)
+    sv.add_argument(
+        "--watch",
+        type=float,
+        default=0.0,
+        metavar="SECONDS",
+        help="Check the XML for a new export this often and refresh in place (0 = off)",
+    )
+    sv.set_defaults(func=cmd_serve)
+
+    # recommend (client)
+    rc = sub.add_parser("recommend", help="Ask a running server for recommendations")
+    which = rc.add_mutually_exclusive_group(required=True)
+    which.add_argument("--track-id", type=int, help="Rekordbox track id")
+    which.add_argument("--query", help='Track as "Artist - Title" (fuzzy matched)')
+    rc.add_argument("-n", type=int, default=10, help="How many recommendations to show")
+    rc.add_argument("--server", default=DEFAULT_SERVER_URL, help="Server URL")
+    rc.set_defaults(func=cmd_recommend)
+
+    # lookup (client)
+    lk = sub.add_parser("lookup", help="Fuzzy-search a running server's playlist")
+    lk.add_argument("--query", required=True, help='"Artist - Title" or just a title')
+    lk.add_argument("-n", type=int, default=5, help="How many candidates to show")
+    lk.add_argument("--server", default=DEFAULT_SERVER_URL, help="Server URL")
+    lk.set_defaults(func=cmd_lookup)
+
+    # refresh (client)
+    rf = sub.add_parser("refresh", help="Make a running server pick up a re-exported XML")
+    rf.add_argument("--server", default=DEFAULT_SERVER_URL, help="Server URL")
+    rf.add_argument("--timeout", type=float, default=60.0, help="Seconds to wait for the refresh")
+    rf.set_defaults(func=cmd_refresh)
+
+    # scan (client)
+    sc = sub.add_parser("scan", help="Send an NFC tag scan to a running server")
+    sc.add_argument("--uid", required=True, help="Tag UID, e.g. 04:A1:B2:C3:D4:E5:F6")
+    sc.add_argument("-n", type=int, default=10, help="Recommendations per side")
+    sc.add_argument("--server", default=DEFAULT_SERVER_URL, help="Server URL")
+    sc.set_defaults(func=cmd_scan)
+
+    # tag-register
+    tr = sub.add_parser("tag-register", help="Link an NFC tag to a Discogs release")
+    tr.add_argument("--uid", required=True, help="Tag UID")
+    tr.add_argument("--release-id", help="Discogs release id")
+    tr.add_argument("--remove", action="store_true", help="Forget the tag instead")
+    tr.add_argument("--tags", default=DEFAULT_TAG_REGISTRY, help="NFC tag registry JSON path")
+    tr.set_defaults(func=cmd_tag_register)
+
+    # simulate-scans
+    ss = sub.add_parser("simulate-scans", help="Measure scan latency with simulated tags for every mapped release")
+    ss.add_argument("--rbxml", default="rekordbox.xml", help="Path to Rekordbox XML")
+    ss.add_argument("--playlist", action="append", help=PLAYLIST_HELP)
+    ss.add_argument("--mappings-dir", default=".", help="Directory with mapping_*.json files")
+    ss.add_argument("--graph", help="Precomputed graph from build-graph (used when up to date)")
+    ss.add_argument("--count", type=int, default=1000, help="Number of scans")
+    ss.add_argument("-n", type=int, default=10, help="Recommendations per side")
+    ss.add_argument("--budget-ms", type=float, default=DEFAULT_P99_BUDGET_MS, help="p99 latency budget")
+    ss.add_argument("--cold", action="store_true", help="Drop cached results before every scan, so all are cold")
+    ss.add_argument("--seed", type=int, default=0, help="Random seed for tags and scan order")
+    ss.add_argument("--discogs-genres", metavar="DIR", help=DISCOGS_GENRES_HELP)
+    ss.add_argument("--rebuild-cache", action="store_true", help=REBUILD_CACHE_HELP)
+    ss.set_defaults(func=cmd_simulate_scans)
+
     return p
 
 
 def main() -> None:
     parser = build_parser()
     args = parser.parse_args()
-    args.func(args)
+
+    if args.timings or args.timings_json:
+        timings.enable()
+    profiler = cProfile.Profile() if args.profile else None
+
+    try:
+        if profiler:
+            profiler.runcall(args.func, args)
+        else:
+            args.func(args)
+    finally:
+        if profiler:
+            profiler.dump_stats(args.profile)
+            print(f"\nProfile written to {args.profile}; top functions by cumulative time:", file=sys.stderr)
+            pstats.Stats(profiler, stream=sys.stderr).sort_stats("cumulative").print_stats(15)
+        if timings.is_enabled():
+            rep = timings.report()
+            print("\n" + timings.format_report(rep), file=sys.stderr)
+            if args.timings_json:
+                with open(args.timings_json, "w", encoding="utf-8") as f:
+                    json.dump(dict(rep, command=args.cmd), f, indent=2)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,358 @@
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from models import Track, known_genre_mask, parse_camelot_key
+
+NO_KEY = -1       # track has no key at all (key_score -> 0)
+UNKNOWN_KEY = -2  # seed key that isn't in this library's key vocabulary
+
+_WORD = (1 << 64) - 1
+# Seeds x tracks cells scored per block by score_matrix (~32 MB of float64 temporaries)
+MATRIX_BLOCK_CELLS = 1 << 22
+
+
+def parse_key_parts(key: str) -> Tuple[int, int]:
+    """
+    Camelot key -> (number, letter code), same codes as Track.key_num/key_mode.
+    Returns (-1, -1) for keys that don't parse as Camelot.
+    """
+    return parse_camelot_key(key)
+
+
+def _popcount(words: np.ndarray) -> np.ndarray:
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(words)
+    # numpy < 2.0: count bits byte-by-byte
+    as_bytes = words.view(np.uint8).reshape(words.shape + (8,))
+    return np.unpackbits(as_bytes, axis=-1).sum(axis=-1)
+
+
+def _widen_words(bits: np.ndarray, words: int) -> np.ndarray:
+    # Extra high words are all zero: no genres from beyond the old vocabulary
+    return np.pad(bits, ((0, 0), (0, words - bits.shape[1])))
+
+
+class TrackColumns:
+    """
+    Column-oriented view of a track list for batched scoring.
+
+    BPM, key, energy and genres are held in NumPy arrays so one seed can be
+    scored against the whole library in a single vectorised pass. Scores are
+    identical to engine.key_score/bpm_score/genre_score/energy_score.
+    """
+
+    def __init__(self, tracks: Sequence[Track]):
+        self.tracks: List[Track] = list(tracks)
+        self._id_rows: Optional[Dict[int, List[int]]] = None
+
+        # Keys: exact-string code (for the 45-point "same key" rule) plus the
+        # parsed Camelot number/letter for relative and adjacent keys.
+        self.key_vocab: Dict[str, int] = {}
+        # (number, letter code) per key_vocab code
+        self.key_parts = np.empty((0, 2), dtype=np.int16)
+
+        for name, column in self._build_columns(self.tracks).items():
+            setattr(self, name, column)
+
+    def _build_columns(self, tracks: Sequence[Track]) -> Dict[str, np.ndarray]:
+        """
+        Column arrays for `tracks`, adding any keys not seen yet to key_vocab.
+        """
+        n = len(tracks)
+        columns = {
+            "ids": np.fromiter((t.id for t in tracks), dtype=np.int64, count=n),
+            "bpm": np.fromiter((t.bpm for t in tracks), dtype=np.float64, count=n),
+            "energy": np.fromiter((-1 if t.energy is None else t.energy for t in tracks), dtype=np.int16, count=n),
+        }
+
+        key_code = np.empty(n, dtype=np.int32)
+        key_parts: List[Tuple[int, int]] = []
+        for i, t in enumerate(tracks):
+            if not t.key:
+                key_code[i] = NO_KEY
+                continue
+            code = self.key_vocab.get(t.key)
+            if code is None:
+                code = len(self.key_vocab)
+                self.key_vocab[t.key] = code
+                key_parts.append((t.key_num, t.key_mode))
+            key_code[i] = code
+        if key_parts:
+            self.key_parts = np.concatenate([self.key_parts, np.array(key_parts, dtype=np.int16)])
+
+        parts = self.key_parts
+        has_key = key_code >= 0
+        key_num = np.full(n, -1, dtype=np.int16)
+        key_letter = np.full(n, -1, dtype=np.int16)
+        key_num[has_key] = parts[key_code[has_key], 0]
+        key_letter[has_key] = parts[key_code[has_key], 1]
+        columns.update(key_code=key_code, key_num=key_num, key_letter=key_letter)
+
+        # Genres: each Track.genre_mask (global vocabulary bits) split into
+        # uint64 words.
+        top_bit = max((t.genre_mask.bit_length() for t in tracks), default=0)
+        words = max(1, (top_bit + 63) // 64)
+        genre_bits = np.empty((n, words), dtype=np.uint64)
+        for w in range(words):
+            genre_bits[:, w] = np.fromiter(
+                ((t.genre_mask >> (64 * w)) & _WORD for t in tracks), dtype=np.uint64, count=n
+            )
+        columns["genre_bits"] = genre_bits
+        return columns
+
+    def update(self, tracks: Sequence[Track], changed: Iterable[Track] = ()) -> None:
+        """
+        Re-points the columns at a new version of the track list (e.g. after
+        refresh_rekordbox_library) without rebuilding them: rows of tracks
+        that were already here are copied over, and only new tracks and the
+        `changed` ones (updated in place since) are read again. Keys that
+        dropped out stay in key_vocab, matching nothing.
+        """
+        tracks = list(tracks)
+        old_rows = {id(t): r for r, t in enumerate(self.tracks)}
+        for t in changed:
+            old_rows.pop(id(t), None)
+        source = np.fromiter((old_rows.get(id(t), -1) for t in tracks), dtype=np.int64, count=len(tracks))
+        kept = np.flatnonzero(source >= 0)
+        fresh = np.flatnonzero(source < 0)
+
+        built = self._build_columns([tracks[i] for i in fresh])
+        # Genre words only ever widen (the global vocabulary only grows)
+        words = max(self.genre_bits.shape[1], built["genre_bits"].shape[1])
+        self.genre_bits = _widen_words(self.genre_bits, words)
+        built["genre_bits"] = _widen_words(built["genre_bits"], words)
+
+        for name, new_rows in built.items():
+            old = getattr(self, name)
+            column = np.empty((len(tracks),) + old.shape[1:], dtype=old.dtype)
+            column[kept] = old[source[kept]]
+            column[fresh] = new_rows
+            setattr(self, name, column)
+
+        self.tracks = tracks
+        self._id_rows = None
+
+    def __len__(self) -> int:
+        return len(self.tracks)
+
+    def _rows_of_id(self) -> Dict[int, List[int]]:
+        if self._id_rows is None:
+            self._id_rows = {}
+            for r, track_id in enumerate(self.ids.tolist()):
+                self._id_rows.setdefault(track_id, []).append(r)
+        return self._id_rows
+
+    def _mask_words(self, mask: int) -> np.ndarray:
+        # Bits beyond the library's words can't overlap anything, so they're dropped
+        words = self.genre_bits.shape[1]
+        return np.array([(mask >> (64 * w)) & _WORD for w in range(words)], dtype=np.uint64)
+
+    def genre_mask(self, genres: Iterable[str]) -> np.ndarray:
+        return self._mask_words(known_genre_mask(genres))
+
+    def breakdown(self, current: Track, rows: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+        """
+        Per-component scores of every track (or only `rows`) against `current`.
+        """
+        sel = slice(None) if rows is None else rows
+        key_code = self.key_code[sel]
+        key_num = self.key_num[sel]
+        key_letter = self.key_letter[sel]
+
+        # key_score
+        if current.key:
+            c_code = self.key_vocab.get(current.key, UNKNOWN_KEY)
+            c_num, c_letter = current.key_num, current.key_mode
+            parsed = (key_num >= 0) & (c_num >= 0)
+            same_num = parsed & (key_num == c_num)
+            same_letter = parsed & (key_letter == c_letter)
+            num_diff = np.abs(key_num - c_num)
+            wrap = ((key_num == 1) & (c_num == 12)) | ((key_num == 12) & (c_num == 1))
+            key = np.where(
+                key_code == c_code, 45,
+                np.where(
+                    same_num & ~same_letter, 35,
+                    np.where(same_letter & ((num_diff == 1) | wrap), 38, 0),
+                ),
+            )
+            key = np.where(key_code == NO_KEY, 0, key)
+        else:
+            key = np.zeros(len(key_code), dtype=np.int64)
+
+        # bpm_score
+        diff = np.abs(self.bpm[sel] - current.bpm)
+        bpm = np.select([diff <= 1, diff <= 2, diff <= 3], [35, 25, 15], 0)
+
+        # genre_score
+        shared = _popcount(self.genre_bits[sel] & self._mask_words(current.genre_mask)).sum(axis=1)
+        genre = shared.astype(np.int64) * 5
+
+        # energy_score
+        energy_col = self.energy[sel]
+        if current.energy is None:
+            energy = np.zeros(len(energy_col), dtype=np.int64)
+        else:
+            e_diff = np.abs(energy_col.astype(np.int64) - current.energy)
+            energy = np.select([e_diff == 0, e_diff == 1, e_diff == 2], [10, 7, 3], 0)
+            energy = np.where(energy_col < 0, 0, energy)
+
+        return {"key": key, "bpm": bpm, "genre": genre, "energy": energy}
+
+    def recommend(
+        self, current: Track, k: Optional[int] = None, rows: Optional[np.ndarray] = None
+    ) -> List[Tuple[Track, int, Dict[str, int]]]:
+        """
+        Top-k (or all) tracks by compatibility with `current`, best first.
+        Ties keep library order, matching a stable sort on score.
+        """
+        if rows is None:
+            rows = np.arange(len(self.tracks))
+        rows = rows[self.ids[rows] != current.id]
+
+        b = self.breakdown(current, rows)
+        total = b["key"] + b["bpm"] + b["genre"] + b["energy"]
+
+        order = _top_k_order(total, k)
+        return [
+            (
+                self.tracks[rows[i]],
+                int(total[i]),
+                {name: int(col[i]) for name, col in b.items()},
+            )
+            for i in order
+        ]
+
+    def score_matrix(self, seeds: Sequence[Track]) -> np.ndarray:
+        """
+        Total compatibility of every seed against every track as one
+        (len(seeds), len(self)) int16 matrix - the same numbers as breakdown().
+        Key and energy scores only depend on (seed, key code) and (seed,
+        energy level), so they're scored once per seed against the small key
+        and energy vocabularies and then gathered into the matrix. Seeds are
+        scored against themselves too; callers drop those cells.
+        """
+        n = len(self.tracks)
+        s = len(seeds)
+        if not s or not n:
+            return np.zeros((s, n), dtype=np.int16)
+
+        # key_score: (seeds, key vocab + 1) table; the extra last column is NO_KEY
+        v_num, v_letter = self.key_parts[None, :, 0], self.key_parts[None, :, 1]
+        c_code = np.array([self.key_vocab.get(t.key, UNKNOWN_KEY) for t in seeds], dtype=np.int32)[:, None]
+        c_num = np.array([t.key_num for t in seeds], dtype=np.int16)[:, None]
+        c_letter = np.array([t.key_mode for t in seeds], dtype=np.int16)[:, None]
+        parsed = (v_num >= 0) & (c_num >= 0)
+        same_num = parsed & (v_num == c_num)
+        same_letter = parsed & (v_letter == c_letter)
+        wrap = ((v_num == 1) & (c_num == 12)) | ((v_num == 12) & (c_num == 1))
+        vocab_codes = np.arange(len(self.key_vocab))[None, :]
+        key_table = np.zeros((s, len(self.key_vocab) + 1), dtype=np.int16)
+        key_table[:, :-1] = np.where(
+            vocab_codes == c_code, 45,
+            np.where(
+                same_num & ~same_letter, 35,
+                np.where(same_letter & ((np.abs(v_num - c_num) == 1) | wrap), 38, 0),
+            ),
+        )
+        key_table[[i for i, t in enumerate(seeds) if not t.key], :] = 0
+        total = key_table[:, np.where(self.key_code == NO_KEY, len(self.key_vocab), self.key_code)]
+
+        # energy_score: (seeds, energy levels in the library) table; -1 is "none"
+        lo = int(self.energy.min())
+        levels = np.arange(lo, int(self.energy.max()) + 1, dtype=np.int64)[None, :]
+        c_energy = np.array([-1 if t.energy is None else t.energy for t in seeds], dtype=np.int64)[:, None]
+        e_diff = np.abs(levels - c_energy)
+        energy_table = np.select([e_diff == 0, e_diff == 1, e_diff == 2], [10, 7, 3], 0).astype(np.int16)
+        energy_table[(levels < 0) | (c_energy < 0)] = 0
+        total += energy_table[:, self.energy - lo]
+
+        # bpm_score: 35/25/15/0 by how many of the 1/2/3 thresholds diff exceeds
+        diff = np.abs(self.bpm[None, :] - np.array([t.bpm for t in seeds], dtype=np.float64)[:, None])
+        steps = (diff > 1).view(np.int8) + (diff > 2).view(np.int8) + (diff > 3).view(np.int8)
+        del diff
+        total += np.array([35, 25, 15, 0], dtype=np.int16)[steps]
+
+        # genre_score
+        seed_words = np.stack([self._mask_words(t.genre_mask) for t in seeds])
+        for w in range(self.genre_bits.shape[1]):
+            words = self.genre_bits[None, :, w] & seed_words[:, w, None]
+            if words.any():
+                total += _popcount(words).astype(np.int16) * 5
+
+        return total
+
+    def recommend_many(
+        self, seeds: Sequence[Track], k: Optional[int] = None
+    ) -> List[List[Tuple[Track, int, Dict[str, int]]]]:
+        """
+        recommend() for a batch of seeds: one list per seed, same results and
+        order as calling recommend(seed, k) for each. Totals come from
+        score_matrix in blocks of seeds; only the selected top-k get a
+        per-component breakdown.
+        """
+        n = len(self.tracks)
+        block = max(1, MATRIX_BLOCK_CELLS // max(1, n))
+        results: List[List[Tuple[Track, int, Dict[str, int]]]] = []
+
+        for start in range(0, len(seeds), block):
+            chunk = seeds[start:start + block]
+            matrix = self.score_matrix(chunk)
+            for seed, total in zip(chunk, matrix):
+                picked = _top_k_rows(total, k, self._rows_of_id().get(seed.id, []))
+                b = self.breakdown(seed, picked)
+                scores = b["key"] + b["bpm"] + b["genre"] + b["energy"]
+                results.append([
+                    (
+                        self.tracks[r],
+                        int(scores[i]),
+                        {name: int(col[i]) for name, col in b.items()},
+                    )
+                    for i, r in enumerate(picked)
+                ])
+        return results
+
+
+def _top_k_rows(scores: np.ndarray, k: Optional[int], exclude: List[int]) -> np.ndarray:
+    """
+    _top_k_order for a row of score_matrix, leaving out the `exclude` rows.
+    Scores are small non-negative ints, so the k-th best score comes from a
+    histogram instead of an argpartition over the whole row.
+    """
+    n = len(scores)
+    if k is None or k >= n - len(exclude) or k <= 0:
+        rows = np.delete(np.arange(n), exclude) if exclude else np.arange(n)
+        return rows[_top_k_order(scores[rows], k)]
+
+    counts = np.bincount(scores, minlength=1)
+    for r in exclude:
+        counts[scores[r]] -= 1
+    # highest score with at least k tracks at or above it
+    at_or_above = np.cumsum(counts[::-1])
+    threshold = len(counts) - 1 - int(np.searchsorted(at_or_above, k))
+    candidates = np.flatnonzero(scores >= threshold)
+    if exclude:
+        candidates = candidates[~np.isin(candidates, exclude)]
+    return candidates[np.lexsort((candidates, -scores[candidates].astype(np.int64)))][:k]
+
+
+def _top_k_order(scores: np.ndarray, k: Optional[int]) -> np.ndarray:
+    """
+    Positions of the k highest scores, descending, ties by position.
+    Uses argpartition so only the selected slice is fully sorted.
+    """
+    n = len(scores)
+    if k is None or k >= n:
+        candidates = np.arange(n)
+    elif k <= 0:
+        return np.empty(0, dtype=np.int64)
+    else:
+        # kth-largest value; take everything strictly above it plus the
+        # earliest ties so boundary ties resolve the same way sorted() would.
+        threshold = scores[np.argpartition(scores, n - k)[n - k]]
+        above = np.flatnonzero(scores > threshold)
+        ties = np.flatnonzero(scores == threshold)[: k - len(above)]
+        candidates = np.concatenate([above, ties])
+
+    # lexsort: last key is primary -> score desc, then position asc
+    return candidates[np.lexsort((candidates, -scores[candidates]))]
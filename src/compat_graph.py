@@ -0,0 +1,154 @@
+import hashlib
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from models import Track
+from query import TrackIndex
+
+DEFAULT_K = 50
+COMPONENTS = ("key", "bpm", "genre", "energy")
+
+# Best possible score for a track that misses on key or BPM, before genres:
+# the better of key-only (45) and bpm-only (35), plus the maximum energy (10).
+_NON_COMPATIBLE_MAX = 45 + 10
+
+
+def library_fingerprint(tracks: Sequence[Track]) -> str:
+    """
+    Version of a track list as far as scoring is concerned: any change to
+    membership, order or scored fields gives a different fingerprint.
+    """
+    h = hashlib.sha1()
+    for t in tracks:
+        h.update(f"{t.id}|{t.bpm!r}|{t.key}|{','.join(t.genres)}|{t.energy}\n".encode("utf-8"))
+    return h.hexdigest()
+
+
+def _top_k_exact(index: TrackIndex, track: Track, k: int) -> List[Tuple[Track, int, Dict[str, int]]]:
+    """
+    Same result as TrackColumns.recommend(track, k), usually without scoring
+    the whole library: if the k-th best BPM+key-compatible track already
+    beats anything an incompatible track could score, the pruned list is exact.
+    """
+    pruned = index.recommend(track, k=k)
+    bound = _NON_COMPATIBLE_MAX + 5 * track.genre_mask.bit_count()
+    if len(pruned) == k and pruned[-1][1] > bound:
+        return pruned
+    return index.columns.recommend(track, k=k)
+
+
+class CompatGraph:
+    """
+    Top-K compatible neighbours of every track, as CSR-style arrays.
+
+    Row r's neighbours are indices[indptr[r]:indptr[r+1]] (row numbers in
+    library order), best first, with per-component scores alongside. The
+    graph records the library fingerprint it was built for and refuses to
+    answer for any other version.
+    """
+
+    def __init__(
+        self,
+        fingerprint: str,
+        k: int,
+        ids: np.ndarray,
+        indptr: np.ndarray,
+        indices: np.ndarray,
+        components: Dict[str, np.ndarray],
+    ):
+        self.fingerprint = fingerprint
+        self.k = k
+        self.ids = ids
+        self.indptr = indptr
+        self.indices = indices
+        self.components = components
+        self.tracks: Optional[List[Track]] = None
+        self._row_of: Dict[int, int] = {}
+
+    @classmethod
+    def build(cls, tracks: Sequence[Track], k: int = DEFAULT_K) -> "CompatGraph":
+        tracks = list(tracks)
+        index = TrackIndex(tracks)
+        row_of = {t.id: r for r, t in enumerate(tracks)}
+
+        indptr = np.zeros(len(tracks) + 1, dtype=np.int64)
+        indices: List[int] = []
+        comps: Dict[str, List[int]] = {name: [] for name in COMPONENTS}
+
+        for r, t in enumerate(tracks):
+            for neighbour, _, breakdown in _top_k_exact(index, t, k):
+                indices.append(row_of[neighbour.id])
+                for name in COMPONENTS:
+                    comps[name].append(breakdown[name])
+            indptr[r + 1] = len(indices)
+
+        graph = cls(
+            fingerprint=library_fingerprint(tracks),
+            k=k,
+            ids=index.columns.ids,
+            indptr=indptr,
+            indices=np.array(indices, dtype=np.int32),
+            components={name: np.array(v, dtype=np.int16) for name, v in comps.items()},
+        )
+        graph.bind(tracks)
+        return graph
+
+    def save(self, path: str) -> None:
+        np.savez(
+            path,
+            fingerprint=np.array(self.fingerprint),
+            k=np.array(self.k),
+            ids=self.ids,
+            indptr=self.indptr,
+            indices=self.indices,
+            **{f"score_{name}": self.components[name] for name in COMPONENTS},
+        )
+
+    @classmethod
+    def load(cls, path: str, tracks: Optional[Sequence[Track]] = None) -> Optional["CompatGraph"]:
+        """
+        Loads a saved graph. With `tracks`, returns None if the graph was built
+        for a different library version, otherwise binds it to those tracks.
+        """
+        with np.load(path) as data:
+            graph = cls(
+                fingerprint=str(data["fingerprint"]),
+                k=int(data["k"]),
+                ids=data["ids"],
+                indptr=data["indptr"],
+                indices=data["indices"],
+                components={name: data[f"score_{name}"] for name in COMPONENTS},
+            )
+        if tracks is not None:
+            tracks = list(tracks)
+            if library_fingerprint(tracks) != graph.fingerprint:
+                return None
+            graph.bind(tracks)
+        return graph
+
+    def bind(self, tracks: List[Track]) -> None:
+        self.tracks = tracks
+        self._row_of = {t.id: r for r, t in enumerate(tracks)}
+
+    def can_answer(self, current: Track, k: Optional[int]) -> bool:
+        return (
+            self.tracks is not None
+            and k is not None
+            and k <= self.k
+            and current.id in self._row_of
+        )
+
+    def recommend(self, current: Track, k: Optional[int] = None) -> List[Tuple[Track, int, Dict[str, int]]]:
+        """
+        Stored neighbours of `current`, best first - an O(k) slice.
+        """
+        r = self._row_of[current.id]
+        start = self.indptr[r]
+        stop = min(self.indptr[r + 1], start + (self.k if k is None else k))
+
+        results = []
+        for i in range(start, stop):
+            breakdown = {name: int(self.components[name][i]) for name in COMPONENTS}
+            results.append((self.tracks[self.indices[i]], sum(breakdown.values()), breakdown))
+        return results
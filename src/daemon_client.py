@@ -0,0 +1,46 @@
+import json
+from typing import Any, Dict
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+# Stdlib only, so thin clients start fast
+DEFAULT_SERVER_URL = "http://127.0.0.1:8765"
+
+
+class DaemonClient:
+    def __init__(self, base_url: str = DEFAULT_SERVER_URL, timeout_s: float = 5.0):
+        self.base_url = base_url.rstrip("/")
+        self.timeout_s = timeout_s
+
+    def get(self, path: str, **params: Any) -> Dict[str, Any]:
+        return self._call("GET", path, params)
+
+    def post(self, path: str, **params: Any) -> Dict[str, Any]:
+        return self._call("POST", path, params)
+
+    def _call(self, method: str, path: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        query = urlencode({k: v for k, v in params.items() if v is not None})
+        url = f"{self.base_url}{path}" + (f"?{query}" if query else "")
+        request = Request(url, data=b"" if method == "POST" else None, method=method)
+        try:
+            with urlopen(request, timeout=self.timeout_s) as r:
+                return json.loads(r.read())
+        except HTTPError as e:
+            detail = json.loads(e.read() or b"{}").get("error", e.reason)
+            raise RuntimeError(f"Server error {e.code}: {detail}") from None
+
+    def health(self) -> Dict[str, Any]:
+        return self.get("/health")
+
+    def recommend(self, track_id: int, k: int = 10) -> Dict[str, Any]:
+        return self.get("/recommend", track_id=track_id, k=k)
+
+    def lookup(self, query: str, k: int = 5) -> Dict[str, Any]:
+        return self.get("/lookup", q=query, k=k)
+
+    def scan(self, tag_uid: str, k: int = 10) -> Dict[str, Any]:
+        return self.get("/scan", uid=tag_uid, k=k)
+
+    def refresh(self) -> Dict[str, Any]:
+        return self.post("/refresh")
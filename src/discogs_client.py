@@ -1,29 +1,267 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Deque, Dict, Iterator, Mapping, Optional, Tuple
+
 import requests
-from typing import Any, Dict, Optional
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DISCOGS_API_URL = "https://api.discogs.com"
+# Keep-alive connections kept open to the API; at least the number of
+# concurrent workers, or extra connections get opened and thrown away
+DEFAULT_POOL_SIZE = 8
+# Concurrent collection page requests after the first page
+DEFAULT_PAGE_WORKERS = 4
+
+
+class RateLimiter:
+    """
+    Thread-safe moving-window limiter driven by Discogs' rate limit headers.
+
+    Discogs allows `X-Discogs-Ratelimit` requests per 60s moving window and
+    reports what's left in `X-Discogs-Ratelimit-Remaining`. Workers call
+    acquire() before each request and hand its ticket to update() with the
+    response; acquire() only blocks once the budget is spent, then releases
+    slots as our own requests age out of the window.
+    """
+
+    def __init__(self, limit: int = 60, window_s: float = 60.0, slack_s: float = 1.0):
+        self.limit = limit
+        self.window_s = window_s
+        # our send time is a little earlier than the server's arrival time
+        self.slack_s = slack_s
+        self._remaining = limit
+        self._in_flight = 0
+        self._sent: Deque[float] = deque()
+        self._next_ticket = 0
+        # Ticket of the most recently sent request whose response set the budget
+        self._newest = -1
+        self._pause_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> int:
+        """
+        Blocks until a request may be sent; returns its ticket for update().
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                while self._sent and now - self._sent[0] >= self.window_s + self.slack_s:
+                    self._sent.popleft()
+                    self._remaining = min(self.limit, self._remaining + 1)
+
+                if now >= self._pause_until and self._remaining > 0:
+                    self._remaining -= 1
+                    self._in_flight += 1
+                    self._sent.append(now)
+                    self._next_ticket += 1
+                    return self._next_ticket - 1
+
+                if now < self._pause_until:
+                    wait = self._pause_until - now
+                elif self._sent:
+                    wait = self._sent[0] + self.window_s + self.slack_s - now
+                else:
+                    # Budget used up by someone else: probe again after one slot's worth
+                    wait = self.window_s / self.limit
+                    self._pause_until = now + wait
+                    self._remaining = 1
+            time.sleep(max(wait, 0.0))
+
+    def update(self, headers: Mapping[str, str], ticket: Optional[int] = None) -> None:
+        """
+        Syncs the budget with the server's view after each response (call with
+        empty headers if the request failed). Requests still in flight may not
+        be counted by the server yet, so they're held back from the budget.
+        Responses can arrive out of order, so only the response to the most
+        recently sent request seen so far (by `ticket`) may raise the budget,
+        e.g. to a higher limit than we started with; older ones only lower it.
+        """
+        with self._lock:
+            self._in_flight = max(0, self._in_flight - 1)
+            limit = headers.get("X-Discogs-Ratelimit")
+            if limit and limit.isdigit():
+                self.limit = int(limit)
+            remaining = headers.get("X-Discogs-Ratelimit-Remaining")
+            used = headers.get("X-Discogs-Ratelimit-Used")
+            if remaining and remaining.isdigit():
+                server_remaining = int(remaining)
+            elif used and used.isdigit():
+                server_remaining = self.limit - int(used)
+            else:
+                return
+            available = server_remaining - self._in_flight
+            if ticket is not None and ticket > self._newest:
+                self._newest = ticket
+                self._remaining = max(0, min(self.limit, available))
+            else:
+                self._remaining = max(0, min(self._remaining, available))
+
+    def backoff(self, delay_s: float) -> None:
+        """
+        Pauses every worker for delay_s (e.g. after a 429).
+        """
+        with self._lock:
+            self._pause_until = max(self._pause_until, time.monotonic() + delay_s)
+            self._remaining = 0
 
 
 class DiscogsClient:
-    def __init__(self, token: str, user_agent: str):
-        self.base_url = "https://api.discogs.com"
+    def __init__(
+        self,
+        token: str,
+        user_agent: str,
+        base_url: str = DISCOGS_API_URL,
+        rate_limiter: Optional[RateLimiter] = None,
+        max_retries: int = 5,
+        pool_size: int = DEFAULT_POOL_SIZE,
+    ):
+        # base_url can point at a local fake server for tests
+        self.base_url = base_url.rstrip("/")
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.max_retries = max_retries
         self.session = requests.Session()
         # Discogs PAT header format used widely: "Discogs token=..."
         self.session.headers.update({
             "Authorization": f"Discogs token={token}",
             "User-Agent": user_agent,
             "Accept": "application/vnd.discogs.v2+json",
+            "Accept-Encoding": "gzip, deflate",
         })
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=max(1, pool_size),
+            max_retries=self._transport_retry(),
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    @staticmethod
+    def _transport_retry() -> Retry:
+        """
+        Retries dropped connections and transient 5xx responses below the
+        rate limiter. 429s are left to get(), which shares the back-off with
+        every worker; the last 5xx response is returned so raise_for_status()
+        reports it as before.
+        """
+        return Retry(
+            total=3,
+            connect=3,
+            read=2,
+            status=3,
+            backoff_factor=0.5,
+            status_forcelist=(500, 502, 503, 504),
+            allowed_methods=frozenset({"GET"}),
+            respect_retry_after_header=False,
+            raise_on_status=False,
+        )
 
     def get(self, path: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        return self._request(path, params).json()
+
+    def _request(
+        self,
+        path: str,
+        params: Optional[Dict[str, Any]] = None,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> requests.Response:
         url = f"{self.base_url}{path}"
-        r = self.session.get(url, params=params, timeout=30)
+        for attempt in range(self.max_retries + 1):
+            ticket = self.rate_limiter.acquire()
+            try:
+                r = self.session.get(url, params=params, headers=headers, timeout=30)
+            except requests.RequestException:
+                self.rate_limiter.update({})
+                raise
+            self.rate_limiter.update(r.headers, ticket)
+
+            if r.status_code != 429 or attempt == self.max_retries:
+                break
+
+            # Rate limited: honour Retry-After, doubling on repeated 429s
+            retry_after = r.headers.get("Retry-After", "")
+            delay = max(float(retry_after) if retry_after.isdigit() else 0.0, 2.0 * 2 ** attempt)
+            print(f"[Discogs] Rate limited (429). Backing off {delay:.0f}s...")
+            self.rate_limiter.backoff(delay)
+
         r.raise_for_status()
-        return r.json()
+        return r
 
-    def get_collection_releases(self, username: str, folder_id: int = 0, page: int = 1, per_page: int = 100) -> Dict[str, Any]:
+    def get_collection_releases(
+        self,
+        username: str,
+        folder_id: int = 0,
+        page: int = 1,
+        per_page: int = 100,
+        sort: Optional[str] = None,
+        sort_order: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        params: Dict[str, Any] = {"page": page, "per_page": per_page}
+        if sort:
+            params["sort"] = sort
+        if sort_order:
+            params["sort_order"] = sort_order
         return self.get(
             f"/users/{username}/collection/folders/{folder_id}/releases",
-            params={"page": page, "per_page": per_page},
+            params=params,
         )
 
+    def iter_collection_pages(
+        self,
+        username: str,
+        folder_id: int = 0,
+        per_page: int = 100,
+        workers: int = DEFAULT_PAGE_WORKERS,
+        start_page: int = 1,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Yields a collection folder's pages (get_collection_releases responses)
+        in page order, starting at start_page.
+
+        The first page requested reports how many pages there are; the rest
+        are then requested `workers` at a time over the pooled session, all
+        drawing on the same rate limiter, and handed back in order as they
+        complete.
+        """
+        first = self.get_collection_releases(username, folder_id=folder_id, page=start_page, per_page=per_page)
+        yield first
+
+        pages = first.get("pagination", {}).get("pages", start_page)
+        if pages <= start_page:
+            return
+
+        def fetch(page: int) -> Dict[str, Any]:
+            return self.get_collection_releases(username, folder_id=folder_id, page=page, per_page=per_page)
+
+        pool = ThreadPoolExecutor(max_workers=max(1, workers))
+        try:
+            yield from pool.map(fetch, range(start_page + 1, pages + 1))
+        finally:
+            # Stopping early (or an error) shouldn't wait on pages nobody will read
+            pool.shutdown(wait=True, cancel_futures=True)
+
     def get_release(self, release_id: int) -> Dict[str, Any]:
         return self.get(f"/releases/{release_id}")
+
+    def get_release_conditional(
+        self,
+        release_id: int,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[str], Optional[str]]:
+        """
+        Release fetch that also returns the response's validators:
+        (payload, ETag, Last-Modified). With validators from an earlier
+        response it's a conditional request, and payload is None on a 304 -
+        there's no body to download or parse.
+        """
+        headers: Dict[str, str] = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        r = self._request(f"/releases/{release_id}", headers=headers or None)
+        payload = None if r.status_code == 304 else r.json()
+        return payload, r.headers.get("ETag"), r.headers.get("Last-Modified")
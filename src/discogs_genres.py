@@ -0,0 +1,37 @@
+from typing import Dict, Iterable
+
+from models import Track
+
+
+def apply_discogs_genres(tracks: Iterable[Track], mappings: Dict[str, Dict], include_styles: bool = True) -> int:
+    """
+    Adds each mapped release's Discogs genres (and styles) to the Rekordbox
+    tracks it maps to, after any genres the track already has. Mapping files
+    written before genres were recorded contribute nothing.
+    Returns how many tracks changed.
+    """
+    by_id = {t.id: t for t in tracks}
+    extra: Dict[int, list] = {}
+    for mapping in mappings.values():
+        names = list(mapping.get("genres") or [])
+        if include_styles:
+            names += mapping.get("styles") or []
+        if not names:
+            continue
+        for mt in mapping.get("tracks", []):
+            if mt.get("rb_track_id") in by_id:
+                extra.setdefault(mt["rb_track_id"], []).extend(names)
+
+    changed = 0
+    for track_id, names in extra.items():
+        track = by_id[track_id]
+        seen = set(track.genres)
+        added = []
+        for name in names:
+            if name not in seen:
+                seen.add(name)
+                added.append(name)
+        if added:
+            track.set_genres(list(track.genres) + added)
+            changed += 1
+    return changed
@@ -2,117 +2,573 @@ import json
 import os
 import time
 import requests
-from typing import Dict, List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Set, Tuple
 
-from discogs_client import DiscogsClient
+from discogs_client import DEFAULT_PAGE_WORKERS, DiscogsClient
+from release_index import ReleaseIndexReader, ReleaseIndexWriter, discard_partial
+from release_store import ReleaseStore, default_release_store
+from sync_journal import SyncJournal, journal_path
+import timings
 
+# Concurrent release fetches; the rate limiter, not the pool size, sets the pace
+DEFAULT_WORKERS = 4
+# Releases fetched (and held as full JSON) at a time by the streaming writers
+DEFAULT_BATCH_SIZE = 100
+# Collection items per listing page (the Discogs maximum)
+COLLECTION_PAGE_SIZE = 100
 
-def fetch_all_collection_releases(client: DiscogsClient, username: str, folder_id: int = 0) -> List[Dict]:
+
+@timings.timed("discogs.collection_pages")
+def fetch_all_collection_releases(
+    client: DiscogsClient, username: str, folder_id: int = 0, workers: int = DEFAULT_PAGE_WORKERS
+) -> List[Dict]:
     """
-    Fetches ALL items in a user's Discogs collection folder, handling pagination.
+    Fetches ALL items in a user's Discogs collection folder, handling pagination
+    (pages after the first are requested concurrently, see
+    DiscogsClient.iter_collection_pages).
     """
     items: List[Dict] = []
-    page = 1
+    for page in client.iter_collection_pages(username, folder_id=folder_id, workers=workers):
+        items.extend(page.get("releases", []))
+    return items
 
-    while True:
-        data = client.get_collection_releases(username, folder_id=folder_id, page=page, per_page=100)
-        items.extend(data.get("releases", []))
 
-        pagination = data.get("pagination", {})
-        pages = pagination.get("pages", page)
-        if page >= pages:
-            break
-        page += 1
+@timings.timed("discogs.save_index")
+def save_release_index(data: Dict, path: str = "discogs_releases.json") -> None:
+    """
+    Writes an in-memory compact index in the release_index on-disk format.
+    """
+    with ReleaseIndexWriter(path, data) as writer:
+        for release in data.get("releases", []):
+            writer.write(release)
 
-    return items
 
+def open_release_index(path: str = "discogs_releases.json") -> Optional[ReleaseIndexReader]:
+    """
+    Streaming/indexed view of a saved index (None if there isn't one yet).
+    Close it when done, or use it as a context manager.
+    """
+    if not os.path.exists(path):
+        return None
+    return ReleaseIndexReader(path)
 
-def save_release_index(data: Dict, path: str = "discogs_releases.json") -> None:
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
 
+def load_release_index(path: str = "discogs_releases.json") -> Optional[Dict]:
+    """
+    The whole saved index as one dict. Prefer open_release_index for big
+    collections.
+    """
+    reader = open_release_index(path)
+    if reader is None:
+        return None
+    with reader:
+        return reader.to_dict()
 
-def _cache_path(release_id: int) -> str:
-    os.makedirs("cache", exist_ok=True)
-    return os.path.join("cache", f"discogs_release_{release_id}.json")
+
+def repair_sync_state(path: str = "discogs_releases.json", store: Optional[ReleaseStore] = None) -> None:
+    """
+    Run before a sync: drops corrupt release payloads from the store (they're
+    refetched on demand) and removes partial index files that no journal
+    can resume.
+    """
+    store = store or default_release_store()
+    dropped = store.repair()
+    if dropped:
+        print(f"[Discogs] Dropped {dropped} unreadable cached releases; they'll be refetched.")
+    if not os.path.exists(journal_path(path)):
+        for leftover in discard_partial(path):
+            print(f"[Discogs] Removed partial file {leftover}")
 
 
-def get_release_cached(client: DiscogsClient, release_id: int, min_delay_s: float = 1.1) -> Dict:
+@timings.timed("discogs.get_release")
+def get_release_cached(client: DiscogsClient, release_id: int, store: Optional[ReleaseStore] = None) -> Dict:
     """
-    Fetch release JSON with disk cache. Adds a small delay to respect Discogs rate limits.
+    Fetch release JSON through the local release store. Pacing and 429 back-off
+    are handled by the client's rate limiter.
     Returns {} if the release cannot be fetched (e.g. 404), so callers can skip gracefully.
     """
-    path = _cache_path(release_id)
-    if os.path.exists(path):
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
-
-    time.sleep(min_delay_s)
+    store = store or default_release_store()
+    cached = store.get(release_id)
+    if cached is not None:
+        return cached
 
     try:
-        data = client.get_release(release_id)
+        data, etag, last_modified = client.get_release_conditional(release_id)
     except requests.HTTPError as e:
         status = getattr(e.response, "status_code", None)
         if status == 404:
             print(f"[Discogs] Skipping release {release_id}: 404 Not Found")
-            # write a small tombstone so we don't keep retrying
-            tombstone = {"_error": "404_not_found", "release_id": release_id}
-            with open(path, "w", encoding="utf-8") as f:
-                json.dump(tombstone, f, ensure_ascii=False, indent=2)
+            # store a small tombstone so we don't keep retrying
+            store.put_tombstone(release_id, "404_not_found")
             return {}
         if status == 429:
-            # Rate limited: back off and retry once
-            retry_after = int(e.response.headers.get("Retry-After", "5"))
-            print(f"[Discogs] Rate limited (429). Sleeping {retry_after}s then retrying...")
-            time.sleep(retry_after)
-            data = client.get_release(release_id)
+            print(f"[Discogs] Still rate limited for release {release_id} after retries. Skipping.")
         else:
             print(f"[Discogs] HTTP error for release {release_id}: {status}. Skipping.")
-            return {}
-
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+        return {}
 
+    store.put(release_id, data, etag=etag, last_modified=last_modified)
     return data
 
 
-def build_release_index_all(client: DiscogsClient, username: str, folder_id: int = 0) -> Dict:
+def revalidate_release(
+    client: DiscogsClient,
+    release_id: int,
+    etag: Optional[str],
+    last_modified: Optional[str],
+    store: ReleaseStore,
+) -> str:
+    """
+    Conditional refetch of one stored release. Returns "not_modified" (304:
+    nothing downloaded, payload untouched), "updated" (new payload stored) or
+    "failed" (the cached payload is kept as it is).
+    """
+    try:
+        data, new_etag, new_last_modified = client.get_release_conditional(release_id, etag, last_modified)
+    except requests.RequestException as e:
+        status = getattr(getattr(e, "response", None), "status_code", None)
+        print(f"[Discogs] Couldn't revalidate release {release_id} ({status or e}); keeping cached copy.")
+        return "failed"
+
+    if data is None:
+        store.mark_fresh(release_id, new_etag, new_last_modified)
+        return "not_modified"
+    store.put(release_id, data, etag=new_etag, last_modified=new_last_modified)
+    return "updated"
+
+
+@timings.timed("discogs.refresh_releases")
+def refresh_releases_cached(
+    client: DiscogsClient,
+    release_ids: List[int],
+    workers: int = DEFAULT_WORKERS,
+    store: Optional[ReleaseStore] = None,
+    max_age_s: float = 0.0,
+) -> Dict[str, int]:
+    """
+    Revalidates stored releases with If-None-Match / If-Modified-Since, so
+    unchanged ones cost a bodyless 304 and corrected ones are replaced.
+    Releases checked within the last max_age_s seconds are skipped, as are
+    ids that aren't stored (or are tombstones) - fetch_releases_cached
+    deals with those. Returns counts per outcome.
+    """
+    store = store or default_release_store()
+    validators = store.validators_many(release_ids)
+    cutoff = time.time() - max_age_s
+    due = [
+        (rid, etag, last_modified)
+        for rid, (etag, last_modified, checked_at) in validators.items()
+        if not max_age_s or checked_at is None or checked_at < cutoff
+    ]
+
+    counts = {"checked": len(due), "not_modified": 0, "updated": 0, "failed": 0,
+              "skipped_recent": len(validators) - len(due)}
+    if due:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            for outcome in pool.map(lambda v: revalidate_release(client, *v, store), due):
+                counts[outcome] += 1
+    return counts
+
+
+@timings.timed("discogs.fetch_releases")
+def fetch_releases_cached(
+    client: DiscogsClient,
+    release_ids: List[int],
+    workers: int = DEFAULT_WORKERS,
+    store: Optional[ReleaseStore] = None,
+) -> Dict[int, Dict]:
+    """
+    Fetches many releases: everything already in the store comes back from one
+    bulk read, and only the misses go through a bounded thread pool. Misses
+    share the client's rate limiter, so the pool uses the whole Discogs budget
+    without exceeding it.
+    """
+    store = store or default_release_store()
+    unique_ids = list(dict.fromkeys(release_ids))
+
+    fetched = store.get_many(unique_ids)
+    missing = [rid for rid in unique_ids if rid not in fetched]
+    if missing:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            fetched.update(zip(missing, pool.map(lambda rid: get_release_cached(client, rid, store), missing)))
+
+    return fetched
+
+
+@timings.timed("discogs.build_index")
+def build_release_index_all(
+    client: DiscogsClient, username: str, folder_id: int = 0, workers: int = DEFAULT_WORKERS
+) -> Dict:
     """
     Builds a compact index for ALL releases in the user's collection.
     Uses cached release JSON per release id to avoid re-fetching.
     """
     collection_items = fetch_all_collection_releases(client, username, folder_id=folder_id)
 
+    fetched = fetch_releases_cached(client, _release_ids(collection_items), workers=workers)
+
+    return _compact_index(username, folder_id, len(collection_items), collection_items, fetched)
+
+
+def _compact_index(
+    username: str, folder_id: int, count: int, items: List[Dict], fetched: Dict[int, Dict]
+) -> Dict:
     compact = {
         "username": username,
         "folder_id": folder_id,
-        "count": len(collection_items),
+        "count": count,
         "releases": [],
+        # collection items whose release couldn't be fetched (404 etc.), so an
+        # incremental sync can tell them apart from items it has never seen
+        "skipped_instance_ids": [],
+    }
+
+    for item in items:
+        entry = _compact_release(item, fetched)
+        if entry:
+            compact["releases"].append(entry)
+        elif item.get("instance_id") is not None:
+            compact["skipped_instance_ids"].append(item["instance_id"])
+
+    return compact
+
+
+def _compact_release(item: Dict, fetched: Dict[int, Dict]) -> Optional[Dict]:
+    """
+    Compact index entry for one collection item, or None if its release
+    couldn't be fetched.
+    """
+    basic = item.get("basic_information", {})
+    release_id = basic.get("id")
+    if not release_id:
+        return None
+
+    release = fetched.get(int(release_id))
+    if not release or release.get("_error"):
+        return None
+
+    tracklist = [
+        {"position": t.get("position"), "title": t.get("title"), "duration": t.get("duration")}
+        for t in release.get("tracklist", [])
+        if t.get("title")
+    ]
+
+    return {
+        "release_id": release_id,
+        "instance_id": item.get("instance_id"),
+        "date_added": item.get("date_added"),
+        "title": basic.get("title"),
+        "artists": [a.get("name") for a in (basic.get("artists") or []) if a.get("name")],
+        "year": basic.get("year"),
+        "formats": basic.get("formats"),
+        "genres": release.get("genres") or basic.get("genres") or [],
+        "styles": release.get("styles") or basic.get("styles") or [],
+        "tracklist": tracklist,
     }
 
-    for item in collection_items:
-        basic = item.get("basic_information", {})
-        release_id = basic.get("id")
-        if not release_id:
-            continue
-
-        release = get_release_cached(client, int(release_id))
-        if not release or release.get("_error"):
-            continue
-
-        tracklist = [
-            {"position": t.get("position"), "title": t.get("title"), "duration": t.get("duration")}
-            for t in release.get("tracklist", [])
-            if t.get("title")
-        ]
-
-        compact["releases"].append({
-            "release_id": release_id,
-            "title": basic.get("title"),
-            "artists": [a.get("name") for a in (basic.get("artists") or []) if a.get("name")],
-            "year": basic.get("year"),
-            "formats": basic.get("formats"),
-            "tracklist": tracklist,
-        })
 
+def _release_ids(items: List[Dict]) -> List[int]:
+    return [
+        int(item.get("basic_information", {}).get("id"))
+        for item in items
+        if item.get("basic_information", {}).get("id")
+    ]
+
+
+def _write_items(
+    writer: ReleaseIndexWriter,
+    client: DiscogsClient,
+    items: List[Dict],
+    workers: int,
+    batch_size: int,
+    refresh: Optional[Callable[[List[int]], None]] = None,
+) -> None:
+    """
+    Fetches the items' releases a batch at a time and appends their compact
+    entries, so only one batch of full release JSON is held at once.
+    `refresh`, if given, runs on each batch's release ids before they're read.
+    """
+    for start in range(0, len(items), batch_size):
+        batch = items[start:start + batch_size]
+        ids = _release_ids(batch)
+        if refresh is not None:
+            refresh(ids)
+        fetched = fetch_releases_cached(client, ids, workers=workers)
+        for item in batch:
+            entry = _compact_release(item, fetched)
+            if entry:
+                writer.write(entry)
+            else:
+                writer.skip(item.get("instance_id"))
+
+
+class _CollectionChanged(Exception):
+    pass
+
+
+def _page_edges(items: List[Dict]) -> List:
+    """
+    First and last instance_id on a collection page, as a cheap check that
+    the page still holds what was synced from it.
+    """
+    return [items[0].get("instance_id"), items[-1].get("instance_id")] if items else []
+
+
+@timings.timed("discogs.build_index")
+def write_release_index_all(
+    client: DiscogsClient,
+    username: str,
+    path: str = "discogs_releases.json",
+    folder_id: int = 0,
+    workers: int = DEFAULT_WORKERS,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    refresh: bool = False,
+    refresh_age_s: float = 0.0,
+    resume: bool = True,
+) -> Dict:
+    """
+    Streaming build_release_index_all: each collection page is fetched and
+    written straight to `path`, so the collection never sits in memory.
+    With refresh=True, already-cached releases are revalidated first (see
+    refresh_releases_cached), so tracklist corrections make it into the index.
+
+    Progress is checkpointed after every page in <path>.journal. If a run is
+    interrupted, the next one (with resume=True) re-reads the last
+    checkpointed page and picks up after it, unless the collection's size or
+    that page's first and last instance_ids changed in between - then pages
+    may have shifted and it starts over. The old index at `path` stays in
+    place until the new one is complete.
+
+    Returns the index header (username, folder_id, count, ...), plus the
+    refresh counts under "refresh".
+    """
+    refreshed: Dict[str, int] = {}
+
+    def refresh_batch(ids: List[int]) -> None:
+        counts = refresh_releases_cached(client, ids, workers=workers, max_age_s=refresh_age_s)
+        for outcome, n in counts.items():
+            refreshed[outcome] = refreshed.get(outcome, 0) + n
+
+    journal = SyncJournal(journal_path(path))
+    meta = {"username": username, "folder_id": folder_id, "per_page": COLLECTION_PAGE_SIZE}
+    header = {"username": username, "folder_id": folder_id}
+
+    state = journal.load(meta) if resume else None
+    writer = None
+    if state is not None:
+        try:
+            writer = ReleaseIndexWriter(path, header, resume=state["writer"])
+            print(f"[Discogs] Resuming sync after page {state['page']} ({writer.count} releases written).")
+        except (OSError, ValueError, KeyError) as e:
+            print(f"[Discogs] Can't resume the interrupted sync ({e}); starting over.")
+            state = None
+    if writer is None:
+        discard_partial(path)
+        journal.start(meta)
+        writer = ReleaseIndexWriter(path, header)
+
+    # A resumed run starts by re-reading the last checkpointed page: items
+    # added and removed in between can leave the total unchanged but still
+    # shift the pages, which shows up as different edges on that page.
+    page_no = state["page"] if state else 1
+    listed = state["listed"] if state else 0
+    total = state["total"] if state else None
+    try:
+        for page in client.iter_collection_pages(
+            username, folder_id=folder_id, per_page=COLLECTION_PAGE_SIZE, start_page=page_no
+        ):
+            page_total = page.get("pagination", {}).get("items")
+            if total is not None and page_total != total:
+                raise _CollectionChanged()
+            total = page_total
+            items = page.get("releases", [])
+            edges = _page_edges(items)
+            if state is not None and page_no == state["page"]:
+                if edges != state.get("edges"):
+                    raise _CollectionChanged()
+                page_no += 1
+                continue
+            _write_items(writer, client, items, workers, batch_size, refresh_batch if refresh else None)
+            listed += len(items)
+            journal.checkpoint({
+                "page": page_no,
+                "listed": listed,
+                "total": total,
+                "edges": edges,
+                "writer": writer.checkpoint(),
+            })
+            page_no += 1
+    except _CollectionChanged:
+        writer.abort()
+        journal.clear()
+        print("[Discogs] Collection changed since the interrupted sync; starting over.")
+        return write_release_index_all(
+            client, username, path, folder_id, workers, batch_size, refresh, refresh_age_s, resume=False
+        )
+    except BaseException:
+        # Keep the spool and journal so the next run can resume
+        writer.suspend()
+        raise
+
+    writer.header["count"] = listed
+    writer.close()
+    journal.clear()
+    return dict(writer.header, written=writer.count, refresh=refreshed)
+
+
+def _list_new_items(
+    client: DiscogsClient, username: str, folder_id: int, known: Set
+) -> Tuple[List[Dict], Optional[Set], int, int]:
+    """
+    Pages the collection newest-first (sort=added, desc) and stops after the
+    page where an already-indexed instance_id shows up, unless the item count
+    then doesn't add up (something was removed, or the old index lacks
+    instance ids) - in that case the listing is walked to the end.
+
+    Returns (new items, known instance ids still in the collection - None if
+    the listing stopped early and everything known is kept, items listed,
+    collection total).
+    """
+    new_items: List[Dict] = []
+    seen_known: Set = set()
+    listed = 0
+    total = 0
+    page = 1
+
+    while True:
+        data = client.get_collection_releases(
+            username, folder_id=folder_id, page=page, per_page=COLLECTION_PAGE_SIZE, sort="added", sort_order="desc"
+        )
+        items = data.get("releases", [])
+        listed += len(items)
+        page_known = False
+        for item in items:
+            iid = item.get("instance_id")
+            if iid in known:
+                seen_known.add(iid)
+                page_known = True
+            else:
+                new_items.append(item)
+
+        pagination = data.get("pagination", {})
+        total = pagination.get("items", listed)
+        pages = pagination.get("pages", page)
+        if page >= pages:
+            break
+
+        # Every known instance is still there, so nothing older is new
+        if page_known and len(new_items) + len(known) == total:
+            break
+        page += 1
+
+    kept = seen_known if listed >= total else None
+    return new_items, kept, listed, total
+
+
+@timings.timed("discogs.sync_incremental")
+def sync_release_index_incremental(
+    client: DiscogsClient,
+    username: str,
+    existing: Optional[Dict],
+    folder_id: int = 0,
+    workers: int = DEFAULT_WORKERS,
+) -> Dict:
+    """
+    Updates an existing compact index instead of rebuilding it.
+
+    Only releases of items added since the index was built are fetched (see
+    _list_new_items for how far the listing goes); removed items are dropped
+    without refetching releases that are already indexed. New releases come
+    first in the result.
+    """
+    if not existing or existing.get("username") != username or existing.get("folder_id") != folder_id:
+        print("[Discogs] No matching index to update; doing a full sync.")
+        return build_release_index_all(client, username, folder_id=folder_id, workers=workers)
+
+    old_releases = existing.get("releases", [])
+    known = {r["instance_id"] for r in old_releases if r.get("instance_id") is not None}
+    known.update(existing.get("skipped_instance_ids", []))
+
+    new_items, kept, listed, total = _list_new_items(client, username, folder_id, known)
+    if kept is None:
+        kept = known
+
+    fetched = fetch_releases_cached(client, _release_ids(new_items), workers=workers)
+    compact = _compact_index(username, folder_id, total, new_items, fetched)
+
+    # Releases we already had keep their old order, after the new ones
+    compact["releases"].extend(r for r in old_releases if r.get("instance_id") in kept)
+    compact["skipped_instance_ids"].extend(
+        iid for iid in existing.get("skipped_instance_ids", []) if iid in kept
+    )
+
+    print(
+        f"[Discogs] Incremental sync: {len(new_items)} new, {len(known) - len(kept)} removed, "
+        f"{listed} of {total} items listed."
+    )
     return compact
+
+
+@timings.timed("discogs.sync_incremental")
+def write_release_index_incremental(
+    client: DiscogsClient,
+    username: str,
+    path: str = "discogs_releases.json",
+    folder_id: int = 0,
+    workers: int = DEFAULT_WORKERS,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> Dict:
+    """
+    Streaming sync_release_index_incremental against the index saved at
+    `path`: new entries are written first, then the old index's kept lines
+    are copied across without being decoded into a collection-sized list.
+    Returns the new index header.
+    """
+    reader = open_release_index(path)
+    if reader is None or reader.header.get("username") != username or reader.header.get("folder_id") != folder_id:
+        if reader is not None:
+            reader.close()
+        print("[Discogs] No matching index to update; doing a full sync.")
+        return write_release_index_all(
+            client, username, path, folder_id=folder_id, workers=workers, batch_size=batch_size
+        )
+
+    # An interrupted full sync's spool is about to be overwritten
+    SyncJournal(journal_path(path)).clear()
+    writer = None
+    try:
+        old_skipped = reader.header.get("skipped_instance_ids") or []
+        known = set(old_skipped)
+        for r in reader:
+            if r.get("instance_id") is not None:
+                known.add(r["instance_id"])
+
+        new_items, kept, listed, total = _list_new_items(client, username, folder_id, known)
+        if kept is None:
+            kept = known
+
+        writer = ReleaseIndexWriter(path, {"username": username, "folder_id": folder_id, "count": total})
+        _write_items(writer, client, new_items, workers, batch_size)
+
+        # Releases we already had keep their old order, after the new ones
+        for line in reader.raw_lines():
+            r = json.loads(line)
+            if r.get("instance_id") in kept:
+                writer.write_raw(r.get("release_id"), line)
+        for iid in old_skipped:
+            if iid in kept:
+                writer.skip(iid)
+    except BaseException:
+        if writer is not None:
+            writer.abort()
+        raise
+    finally:
+        reader.close()
+    writer.close()
+
+    print(
+        f"[Discogs] Incremental sync: {len(new_items)} new, {len(known) - len(kept)} removed, "
+        f"{listed} of {total} items listed."
+    )
+    return dict(writer.header, written=writer.count)
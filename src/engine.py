@@ -1,10 +1,10 @@
-from typing import Dict, List, Tuple
+import operator
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple, Union
 from models import Track
-
-def parse_camelot(key: str):
-    number = int(key[:-1])
-    letter = key[-1]
-    return number, letter
+from columnar import TrackColumns
+from compat_graph import CompatGraph
+import timings
 
 def key_score(current: Track, candidate: Track) -> int:
     if not current.key or not candidate.key:
@@ -13,15 +13,18 @@ def key_score(current: Track, candidate: Track) -> int:
     if current.key == candidate.key:
         return 45
 
-    c_num, c_letter = parse_camelot(current.key)
-    t_num, t_letter = parse_camelot(candidate.key)
+    # pre-parsed at Track creation (see models.parse_camelot_key)
+    c_num, c_mode = current.key_num, current.key_mode
+    t_num, t_mode = candidate.key_num, candidate.key_mode
+    if c_num < 0 or t_num < 0:
+        return 0
 
     # relative major/minor (8A <-> 8B)
-    if c_num == t_num and c_letter != t_letter:
+    if c_num == t_num and c_mode != t_mode:
         return 35
 
     # adjacent number, same letter (8A <-> 7A/9A) + wrap (1 <-> 12)
-    if c_letter == t_letter and (abs(c_num - t_num) == 1 or {c_num, t_num} == {1, 12}):
+    if c_mode == t_mode and (abs(c_num - t_num) == 1 or {c_num, t_num} == {1, 12}):
         return 38
 
     return 0
@@ -37,8 +40,7 @@ def bpm_score(current: Track, candidate: Track) -> int:
     return 0
 
 def genre_score(current: Track, candidate: Track) -> int:
-    shared = set(current.genres) & set(candidate.genres)
-    return len(shared) * 5
+    return (current.genre_mask & candidate.genre_mask).bit_count() * 5
 
 def energy_score(current: Track, candidate: Track) -> int:
     if current.energy is None or candidate.energy is None:
@@ -64,7 +66,11 @@ def compatibility_score(current: Track, candidate: Track) -> int:
     b = score_breakdown(current, candidate)
     return sum(b.values())
 
-def recommend(current: Track, library: List[Track]) -> List[Tuple[Track, int, Dict[str, int]]]:
+@timings.timed("engine.recommend_python")
+def recommend_python(current: Track, library: List[Track]) -> List[Tuple[Track, int, Dict[str, int]]]:
+    """
+    Reference implementation: scores every track one at a time in Python.
+    """
     scored = []
     for track in library:
         if track.id == current.id:
@@ -73,3 +79,110 @@ def recommend(current: Track, library: List[Track]) -> List[Tuple[Track, int, Di
         score = sum(breakdown.values())
         scored.append((track, score, breakdown))
     return sorted(scored, key=lambda x: x[1], reverse=True)
+
+# Columns for the last plain track list recommend()/recommend_many() scored,
+# so calling them in a loop with the same list doesn't rebuild the columns
+_last_columns: Optional[TrackColumns] = None
+
+def _columns_for(library: Union[List[Track], TrackColumns]) -> TrackColumns:
+    """
+    Reuses the cached columns while `library` holds the same Track objects in
+    the same order. Like any prebuilt TrackColumns they don't see edits made
+    to those tracks afterwards (see Track.set_genres).
+    """
+    global _last_columns
+    if isinstance(library, TrackColumns):
+        return library
+    cached = _last_columns
+    if cached is None or len(cached.tracks) != len(library) or not all(map(operator.is_, cached.tracks, library)):
+        cached = _last_columns = TrackColumns(library)
+    return cached
+
+@timings.timed("engine.recommend")
+def recommend(
+    current: Track,
+    library: Union[List[Track], TrackColumns],
+    k: Optional[int] = None,
+    graph: Optional[CompatGraph] = None,
+) -> List[Tuple[Track, int, Dict[str, int]]]:
+    """
+    Scores the whole library against `current` in one batched pass and returns
+    the top-k (or everything when k is None), best first.
+    Columns for a plain list are built on first use and reused while the
+    same tracks are passed again; pass a prebuilt TrackColumns to manage
+    them yourself. With a CompatGraph loaded for this library, top-k is read
+    straight from the graph when it holds at least k neighbours; otherwise
+    it's scored live.
+    """
+    if graph is not None and graph.can_answer(current, k):
+        return graph.recommend(current, k)
+
+    columns = _columns_for(library)
+    return columns.recommend(current, k=k)
+
+# Seeds per process-pool task in recommend_many
+POOL_CHUNK = 256
+
+# Per-worker columns (and object -> row map), set once by _init_worker so
+# tasks only ship seeds
+_worker_columns: Optional[TrackColumns] = None
+_worker_rows: Dict[int, int] = {}
+
+def _init_worker(tracks: List[Track]) -> None:
+    global _worker_columns, _worker_rows
+    _worker_columns = TrackColumns(tracks)
+    _worker_rows = {id(t): r for r, t in enumerate(_worker_columns.tracks)}
+
+def _recommend_rows(args: Tuple[List[Track], Optional[int]]) -> List[List[Tuple[int, int, Dict[str, int]]]]:
+    # Rows instead of Tracks, so results don't pickle the worker's track copies back
+    seeds, k = args
+    return [
+        [(_worker_rows[id(t)], score, b) for t, score, b in results]
+        for results in _worker_columns.recommend_many(seeds, k=k)
+    ]
+
+@timings.timed("engine.recommend_many")
+def recommend_many(
+    seeds: Sequence[Track],
+    library: Union[List[Track], TrackColumns],
+    k: Optional[int] = None,
+    graph: Optional[CompatGraph] = None,
+    workers: Optional[int] = None,
+) -> List[List[Tuple[Track, int, Dict[str, int]]]]:
+    """
+    recommend() for a batch of seeds, one result list per seed in seed order.
+
+    Seeds the graph can answer are read from it; the rest are scored as
+    seed x library matrices (TrackColumns.recommend_many). With workers > 1
+    and more than one chunk of seeds, chunks are spread over a process pool,
+    each worker building its own columns once.
+    """
+    results: List[Optional[List[Tuple[Track, int, Dict[str, int]]]]] = [None] * len(seeds)
+    live: List[int] = []
+    for i, seed in enumerate(seeds):
+        if graph is not None and graph.can_answer(seed, k):
+            results[i] = graph.recommend(seed, k)
+        else:
+            live.append(i)
+    if not live:
+        return results
+
+    columns = _columns_for(library)
+    live_seeds = [seeds[i] for i in live]
+
+    workers = workers or 1
+    if workers > 1 and len(live_seeds) > POOL_CHUNK:
+        chunks = [live_seeds[i:i + POOL_CHUNK] for i in range(0, len(live_seeds), POOL_CHUNK)]
+        scored: List[List[Tuple[Track, int, Dict[str, int]]]] = []
+        with ProcessPoolExecutor(
+            max_workers=min(workers, len(chunks)), initializer=_init_worker, initargs=(columns.tracks,)
+        ) as pool:
+            for chunk in pool.map(_recommend_rows, ((c, k) for c in chunks)):
+                scored.extend([(columns.tracks[r], score, b) for r, score, b in rows] for rows in chunk)
+    else:
+        scored = columns.recommend_many(live_seeds, k=k)
+
+    for i, res in zip(live, scored):
+        results[i] = res
+    return results
+
@@ -0,0 +1,173 @@
+import gc
+import hashlib
+import os
+import pickle
+from inspect import signature
+from typing import Dict, Optional
+
+from models import Track
+from rekordbox_import import LibraryDiff, PlaylistNode, RekordboxLibrary, parse_rekordbox_library
+import timings
+
+# Bump when the pickled RekordboxLibrary/Track layout changes
+# (3: Track.id is the Rekordbox TrackID; per-track attribute fingerprints;
+#  4: genres differing only in case are no longer merged on import)
+SNAPSHOT_VERSION = 4
+
+
+def snapshot_path(xml_path: str) -> str:
+    """
+    Snapshot lives next to the XML, e.g. rekordbox.xml -> rekordbox.xml.snapshot
+    """
+    return f"{xml_path}.snapshot"
+
+
+def _file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _read_header(path: str) -> Optional[Dict]:
+    try:
+        with open(path, "rb") as f:
+            header = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return None
+    if not isinstance(header, dict) or header.get("version") != SNAPSHOT_VERSION:
+        return None
+    return header
+
+
+def _track_fields():
+    return list(signature(Track).parameters)
+
+
+def _pack_library(library: RekordboxLibrary) -> Dict:
+    """
+    Column layout: one list per Track field plus plain tuples for the playlist
+    tree. Unpickling lists of primitives is far cheaper than one object per track.
+    """
+    names = _track_fields()
+    tracks = list(library.collection.values())
+    return {
+        "track_fields": names,
+        "collection_ids": list(library.collection.keys()),
+        "fingerprints": [library.fingerprints.get(track_id) for track_id in library.collection],
+        "columns": [[getattr(t, name) for t in tracks] for name in names],
+        "nodes": [(n.name, n.depth, n.track_ids) for n in library.nodes],
+    }
+
+
+def _unpack_library(payload: Dict) -> Optional[RekordboxLibrary]:
+    if payload.get("track_fields") != _track_fields():
+        return None
+    tracks = map(Track, *payload["columns"])
+    ids = payload["collection_ids"]
+    return RekordboxLibrary(
+        collection=dict(zip(ids, tracks)),
+        nodes=[PlaylistNode(name, depth, track_ids) for name, depth, track_ids in payload["nodes"]],
+        fingerprints={
+            track_id: fingerprint
+            for track_id, fingerprint in zip(ids, payload["fingerprints"])
+            if fingerprint is not None
+        },
+    )
+
+
+def _read_library(path: str) -> Optional[RekordboxLibrary]:
+    # The payload is a few big lists of small objects; cyclic GC passes
+    # triggered mid-load would dominate the warm-start time.
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        with open(path, "rb") as f:
+            pickle.load(f)  # header
+            return _unpack_library(pickle.load(f))
+    except (OSError, pickle.UnpicklingError, EOFError, KeyError, TypeError):
+        return None
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+
+def _write_snapshot(path: str, header: Dict, library: RekordboxLibrary) -> None:
+    tmp = f"{path}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            # Header first so validation never has to unpickle the library
+            pickle.dump(header, f, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(_pack_library(library), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"Warning: could not write library snapshot {path}: {e}")
+
+
+@timings.timed("library_cache.load")
+def load_rekordbox_library(xml_path: str, rebuild: bool = False) -> RekordboxLibrary:
+    """
+    Returns the parsed COLLECTION and playlist tree for xml_path, from the
+    snapshot next to it when that still matches the XML.
+
+    The snapshot is reused when the XML's size and mtime are unchanged. If
+    either differs, the XML's SHA-256 is compared before reparsing, so a
+    touched-but-identical export only costs a hash. A reparse still reuses
+    the stale snapshot's tracks wherever the export left them unchanged.
+    rebuild=True always reparses from scratch.
+    """
+    snap = snapshot_path(xml_path)
+    st = os.stat(xml_path)
+    source = (st.st_size, st.st_mtime_ns)
+
+    header = None if rebuild else _read_header(snap)
+    if header and header["size"] == st.st_size and header["mtime_ns"] == st.st_mtime_ns:
+        library = _read_library(snap)
+        if library is not None:
+            library.source = source
+            return library
+
+    digest = _file_sha256(xml_path)
+    previous = _read_library(snap) if header else None
+    if previous is not None and header["sha256"] == digest:
+        header.update(size=st.st_size, mtime_ns=st.st_mtime_ns)
+        _write_snapshot(snap, header, previous)
+        previous.source = source
+        return previous
+
+    library = parse_rekordbox_library(xml_path, previous=previous)
+    library.source = source
+    _write_snapshot(
+        snap,
+        {
+            "version": SNAPSHOT_VERSION,
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "sha256": digest,
+        },
+        library,
+    )
+    return library
+
+
+@timings.timed("library_cache.refresh")
+def refresh_rekordbox_library(library: RekordboxLibrary, xml_path: str) -> LibraryDiff:
+    """
+    Brings an already loaded library up to date with xml_path in place and
+    returns what changed (empty when the XML hasn't been touched since the
+    library was read). Unchanged tracks are not rebuilt and changed ones
+    keep their Track objects; see RekordboxLibrary.update_from.
+
+    The snapshot is left alone: tracks in a long-lived library may carry
+    in-memory extras (e.g. Discogs genres), and the next load_rekordbox_library
+    brings the snapshot up to date from the XML anyway.
+    """
+    st = os.stat(xml_path)
+    source = (st.st_size, st.st_mtime_ns)
+    if library.source == source:
+        return LibraryDiff()
+
+    new = parse_rekordbox_library(xml_path, previous=library)
+    new.source = source
+    return library.update_from(new)
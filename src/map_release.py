@@ -1,49 +1,49 @@
 import json
-from typing import Dict, List, Tuple
+from typing import Dict, List
 
 from rekordbox_import import import_rekordbox_playlist_xml
-from match import track_match_score
+from match_index import MatchIndex
+from mapping_file import MAPPING_FORMAT
+from release_index import ReleaseIndexReader
 
 
-def load_discogs_cache(path: str = "discogs_releases.json") -> Dict:
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+def load_discogs_cache(path: str = "discogs_releases.json") -> ReleaseIndexReader:
+    return ReleaseIndexReader(path)
 
 
-def pick_release(releases: List[Dict]) -> Dict:
+def pick_release(releases: ReleaseIndexReader) -> Dict:
+    """
+    Lists the cached releases as they stream past, then fetches the chosen
+    one by id, so only the ids are kept.
+    """
     print("\nDiscogs releases (cached):")
+    ids: List = []
     for i, r in enumerate(releases, start=1):
         artists = ", ".join(r.get("artists") or [])
         print(f"{i:>2}. {artists} - {r.get('title')} (id: {r.get('release_id')})")
+        ids.append(r.get("release_id"))
 
     idx = int(input("\nPick release number: "))
-    return releases[idx - 1]
-
-
-def best_candidates(d_artist: str, d_title: str, rb_tracks, top_n: int = 5) -> List[Tuple[float, object]]:
-    scored = []
-    for t in rb_tracks:
-        s = track_match_score(d_artist, d_title, t.artist, t.title)
-        scored.append((s, t))
-    scored.sort(key=lambda x: x[0], reverse=True)
-    return scored[:top_n]
+    return releases.get(ids[idx - 1])
 
 
 def main():
     rb_tracks = import_rekordbox_playlist_xml("rekordbox.xml", "My Vinyl Collection")
-    discogs = load_discogs_cache()
-    releases = discogs["releases"]
-
-    release = pick_release(releases)
+    match_index = MatchIndex(rb_tracks)
+    with load_discogs_cache() as releases:
+        release = pick_release(releases)
 
     release_artist = (release.get("artists") or [""])[0]
     print(f"\nSelected: {release_artist} - {release.get('title')}")
     print(f"Release ID: {release.get('release_id')}\n")
 
     mapping = {
+        "format": MAPPING_FORMAT,
         "release_id": release.get("release_id"),
         "title": release.get("title"),
         "artists": release.get("artists"),
+        "genres": release.get("genres") or [],
+        "styles": release.get("styles") or [],
         "tracks": []
     }
 
@@ -55,7 +55,7 @@ def main():
             continue
 
         print(f"\n{pos} — {title}")
-        candidates = best_candidates(release_artist, title, rb_tracks, top_n=5)
+        candidates = match_index.best_candidates(release_artist, title, top_n=5)
 
         for i, (score, t) in enumerate(candidates, start=1):
             print(f"  {i}. {t.artist} - {t.title} | {t.bpm:.2f} | {t.key} | E{t.energy} | match {score:.2f}")
@@ -0,0 +1,47 @@
+import json
+from typing import Dict, List, Optional, Tuple
+
+from models import Track
+
+# Written into every mapping_*.json as "format". Files without it predate
+# Track.id being the Rekordbox TrackID: their rb_track_ids are positions in
+# the imported playlist, so they either miss or point at the wrong track.
+MAPPING_FORMAT = 2
+
+
+def load_mapping(path: str) -> Optional[Dict]:
+    """
+    A mapping file as written by map-release or map-all, or None (with a
+    warning) if it is in an older format and needs mapping again.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        mapping = json.load(f)
+    if mapping.get("format") != MAPPING_FORMAT:
+        print(
+            f"Warning: {path} was written by an older version (track ids have changed since); "
+            f"skipping it. Map release {mapping.get('release_id')} again to use it."
+        )
+        return None
+    return mapping
+
+
+def mapped_tracks(mapping: Dict, by_id: Dict[int, Track]) -> List[Tuple[Dict, Track]]:
+    """
+    (mapping entry, Track) for each entry of `mapping` whose rb_track_id is
+    in by_id, in file order; the rest are left out. A warning names entries
+    whose track no longer has the recorded rb_artist/rb_title (renamed in
+    Rekordbox, or a different track).
+    """
+    pairs: List[Tuple[Dict, Track]] = []
+    for mt in mapping.get("tracks", []):
+        track = by_id.get(mt.get("rb_track_id"))
+        if track is None:
+            continue
+        expected = (mt.get("rb_artist"), mt.get("rb_title"))
+        if None not in expected and expected != (track.artist, track.title):
+            print(
+                f"Warning: release {mapping.get('release_id')} {mt.get('position')} was mapped to "
+                f"{expected[0]} - {expected[1]}, but track {track.id} is now {track.artist} - {track.title}."
+            )
+        pairs.append((mt, track))
+    return pairs
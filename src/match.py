@@ -1,18 +1,79 @@
 import re
 from difflib import SequenceMatcher
+from functools import lru_cache
+from typing import List, Sequence, Tuple
+
+import timings
+
+# Bound on memoised Discogs-side strings (artist names repeat across releases)
+NORMALISE_CACHE_SIZE = 65536
+
+_BRACKETS_RE = re.compile(r"\(.*?\)")
+_PUNCT_RE = re.compile(r"[^a-z0-9\s]")
+_SPACE_RE = re.compile(r"\s+")
+
 
 def normalise(text: str) -> str:
     text = (text or "").lower()
-    text = re.sub(r"\(.*?\)", "", text)          # remove bracketed mix info
-    text = re.sub(r"[^a-z0-9\s]", " ", text)     # drop punctuation
-    text = re.sub(r"\s+", " ", text).strip()
+    text = _BRACKETS_RE.sub("", text)       # remove bracketed mix info
+    text = _PUNCT_RE.sub(" ", text)         # drop punctuation
+    text = _SPACE_RE.sub(" ", text).strip()
     return text
 
+@lru_cache(maxsize=NORMALISE_CACHE_SIZE)
+def normalise_cached(text: str) -> str:
+    return normalise(text)
+
+def track_norms(track) -> Tuple[str, str]:
+    """
+    (normalised artist, normalised title), using the values stored at import when present.
+    """
+    artist = getattr(track, "norm_artist", None)
+    title = getattr(track, "norm_title", None)
+    if artist is None:
+        artist = normalise(track.artist)
+    if title is None:
+        title = normalise(track.title)
+    return artist, title
+
+def similarity_normalised(a: str, b: str) -> float:
+    return SequenceMatcher(None, a, b).ratio()
+
 def similarity(a: str, b: str) -> float:
-    return SequenceMatcher(None, normalise(a), normalise(b)).ratio()
+    return similarity_normalised(normalise(a), normalise(b))
 
-def track_match_score(discogs_artist: str, discogs_title: str, rb_artist: str, rb_title: str) -> float:
+def match_score_normalised(discogs_artist: str, discogs_title: str, rb_artist: str, rb_title: str) -> float:
+    """
+    track_match_score for strings that have already been through normalise().
+    """
     # weighted: title matters more than artist
-    title_score = similarity(discogs_title, rb_title)
-    artist_score = similarity(discogs_artist, rb_artist)
+    title_score = similarity_normalised(discogs_title, rb_title)
+    artist_score = similarity_normalised(discogs_artist, rb_artist)
     return (0.7 * title_score) + (0.3 * artist_score)
+
+def track_match_score(discogs_artist: str, discogs_title: str, rb_artist: str, rb_title: str) -> float:
+    return match_score_normalised(
+        normalise_cached(discogs_artist),
+        normalise_cached(discogs_title),
+        normalise(rb_artist),
+        normalise(rb_title),
+    )
+
+
+@timings.timed("match.rank_candidates")
+def rank_candidates(
+    discogs_artist: str, discogs_title: str, rb_tracks: Sequence, top_n: int = 5
+) -> List[Tuple[float, object]]:
+    """
+    Exact ranking: track_match_score against every track, best first.
+    The Discogs side is normalised once; tracks use their stored normalised text.
+    """
+    d_artist = normalise_cached(discogs_artist)
+    d_title = normalise_cached(discogs_title)
+    scored = []
+    for t in rb_tracks:
+        rb_artist, rb_title = track_norms(t)
+        s = match_score_normalised(d_artist, d_title, rb_artist, rb_title)
+        scored.append((s, t))
+    scored.sort(key=lambda x: x[0], reverse=True)
+    return scored[:top_n]
@@ -0,0 +1,153 @@
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+import timings
+from match import normalise_cached, rank_candidates, track_norms
+
+# Same weighting as match.track_match_score
+TITLE_WEIGHT = 0.7
+ARTIST_WEIGHT = 0.3
+
+# How many trigram-ranked tracks get the exact SequenceMatcher score
+DEFAULT_SHORTLIST = 200
+
+
+def trigrams(text: str) -> List[str]:
+    """
+    Distinct character trigrams of an already-normalised string, padded so
+    short strings and word boundaries still produce grams.
+    """
+    if not text:
+        return []
+    padded = f"  {text} "
+    return list(dict.fromkeys(padded[i:i + 3] for i in range(len(padded) - 2)))
+
+
+class _FieldIndex:
+    """
+    Trigram -> track positions for one text field (artist or title).
+    """
+
+    def __init__(self, texts: Sequence[str]):
+        self.gram_counts = np.zeros(0, dtype=np.float64)
+        self.postings: Dict[str, np.ndarray] = {}
+        self.update(np.zeros(0, dtype=np.int32), len(texts), list(enumerate(texts)))
+
+    def update(self, remap: np.ndarray, size: int, fresh: Sequence[Tuple[int, str]]) -> None:
+        """
+        Moves indexed strings to new positions and indexes new ones:
+        remap[old position] is the string's new position (-1 drops it),
+        `fresh` holds (position, text) for strings to (re)index, and there
+        are `size` positions afterwards.
+        """
+        gram_counts = np.zeros(size, dtype=np.float64)
+        kept = remap >= 0
+        gram_counts[remap[kept]] = self.gram_counts[kept]
+
+        added: Dict[str, List[int]] = {}
+        for pos, text in fresh:
+            grams = trigrams(text)
+            gram_counts[pos] = len(grams)
+            for g in grams:
+                added.setdefault(g, []).append(pos)
+
+        postings: Dict[str, np.ndarray] = {}
+        for g, posting in self.postings.items():
+            posting = remap[posting]
+            posting = posting[posting >= 0]
+            extra = added.pop(g, None)
+            if extra:
+                posting = np.concatenate([posting, np.array(extra, dtype=np.int32)])
+            if len(posting):
+                postings[g] = posting
+        for g, extra in added.items():
+            postings[g] = np.array(extra, dtype=np.int32)
+
+        self.gram_counts = gram_counts
+        self.postings = postings
+
+    def dice(self, text: str, size: int) -> np.ndarray:
+        """
+        Trigram Dice coefficient of `text` against every indexed string - a
+        cheap stand-in for SequenceMatcher.ratio().
+        """
+        grams = trigrams(text)
+        if not grams:
+            return np.zeros(size)
+        hits = [self.postings[g] for g in grams if g in self.postings]
+        if not hits:
+            return np.zeros(size)
+        shared = np.bincount(np.concatenate(hits), minlength=size)
+        return 2.0 * shared / (len(grams) + self.gram_counts)
+
+
+class MatchIndex:
+    """
+    Character-trigram inverted index over normalised Rekordbox artist/title.
+
+    best_candidates() ranks the whole library by trigram overlap (vectorised),
+    keeps a shortlist, and runs the exact track_match_score only on that
+    shortlist - instead of two SequenceMatcher runs per library track.
+    """
+
+    @timings.timed("match_index.build")
+    def __init__(self, rb_tracks: Sequence):
+        self.tracks = list(rb_tracks)
+        norms = [track_norms(t) for t in self.tracks]
+        self._artists = _FieldIndex([artist for artist, _ in norms])
+        self._titles = _FieldIndex([title for _, title in norms])
+
+    @timings.timed("match_index.update")
+    def update(self, rb_tracks: Sequence, changed: Iterable = ()) -> None:
+        """
+        Follows a new version of the track list without re-indexing it: only
+        new tracks and the `changed` ones (updated in place) are split into
+        trigrams again; everyone else's postings are just renumbered.
+        """
+        tracks = list(rb_tracks)
+        old_rows = {id(t): r for r, t in enumerate(self.tracks)}
+        for t in changed:
+            old_rows.pop(id(t), None)
+        source = np.fromiter((old_rows.get(id(t), -1) for t in tracks), dtype=np.int64, count=len(tracks))
+        kept = np.flatnonzero(source >= 0)
+        remap = np.full(len(self.tracks), -1, dtype=np.int32)
+        remap[source[kept]] = kept
+
+        fresh = [(int(pos), track_norms(tracks[pos])) for pos in np.flatnonzero(source < 0)]
+        self._artists.update(remap, len(tracks), [(pos, artist) for pos, (artist, _) in fresh])
+        self._titles.update(remap, len(tracks), [(pos, title) for pos, (_, title) in fresh])
+        self.tracks = tracks
+
+    def __len__(self) -> int:
+        return len(self.tracks)
+
+    def shortlist(self, discogs_artist: str, discogs_title: str, size: int = DEFAULT_SHORTLIST) -> List:
+        """
+        Up to `size` likely matches, in library order.
+        """
+        n = len(self.tracks)
+        if size >= n:
+            return list(self.tracks)
+
+        approx = (
+            TITLE_WEIGHT * self._titles.dice(normalise_cached(discogs_title), n)
+            + ARTIST_WEIGHT * self._artists.dice(normalise_cached(discogs_artist), n)
+        )
+        if not approx.any():
+            # Nothing to go on (e.g. empty or punctuation-only query): exact scan
+            return list(self.tracks)
+
+        top = np.sort(np.argpartition(-approx, size)[:size])
+        return [self.tracks[i] for i in top]
+
+    @timings.timed("match_index.best_candidates")
+    def best_candidates(
+        self,
+        discogs_artist: str,
+        discogs_title: str,
+        top_n: int = 5,
+        shortlist_size: int = DEFAULT_SHORTLIST,
+    ) -> List[Tuple[float, object]]:
+        candidates = self.shortlist(discogs_artist, discogs_title, max(shortlist_size, top_n))
+        return rank_candidates(discogs_artist, discogs_title, candidates, top_n=top_n)
@@ -1,13 +1,192 @@
-from dataclasses import dataclass
-from typing import List, Optional
+import sys
+from typing import Dict, Iterable, Optional, Tuple
+
+# Parsed Camelot keys and genre tuples, shared by every Track that uses them
+_KEYS: Dict[str, Tuple[str, int, int]] = {}
+_GENRES: Dict[Tuple[str, ...], Tuple[Tuple[str, ...], int]] = {}
+# Global genre vocabulary: name -> bit in Track.genre_mask
+_GENRE_BITS: Dict[str, int] = {}
+
+
+def _key_entry(key: str) -> Tuple[str, int, int]:
+    entry = _KEYS.get(key)
+    if entry is None:
+        try:
+            num, mode = int(key[:-1]), ord(key[-1]) - ord("A")
+        except (ValueError, IndexError):
+            num, mode = -1, -1
+        key = sys.intern(key)
+        entry = _KEYS[key] = (key, num, mode)
+    return entry
+
+
+def parse_camelot_key(key: str) -> Tuple[int, int]:
+    """
+    Camelot key -> (number, mode) with mode 0 for "A", 1 for "B" (other
+    letters get their own codes). (-1, -1) for keys that don't parse.
+    """
+    _, num, mode = _key_entry(key)
+    return num, mode
+
+
+def genre_bit(name: str) -> int:
+    """
+    Bit for a genre in the global vocabulary, added on first sight.
+    Names are compared exactly, like the genre sets they replace: "Disco"
+    and "disco" are different genres.
+    """
+    bit = _GENRE_BITS.get(name)
+    if bit is None:
+        bit = _GENRE_BITS[name] = len(_GENRE_BITS)
+    return bit
+
+
+def genre_mask(genres: Iterable[str]) -> int:
+    mask = 0
+    for g in genres:
+        mask |= 1 << genre_bit(g)
+    return mask
+
+
+def known_genre_mask(genres: Iterable[str]) -> int:
+    """
+    genre_mask() for query terms: read-only, so arbitrary input doesn't grow
+    the global vocabulary. Names no track has ever had can't match anything
+    and are left out.
+    """
+    mask = 0
+    for g in genres:
+        bit = _GENRE_BITS.get(g)
+        if bit is not None:
+            mask |= 1 << bit
+    return mask
+
+
+def genre_vocabulary() -> Dict[str, int]:
+    return dict(_GENRE_BITS)
+
+
+def _genre_entry(genres: Iterable[str]) -> Tuple[Tuple[str, ...], int]:
+    if not genres:
+        return (), 0
+    genres = tuple(genres)
+    entry = _GENRES.get(genres)
+    if entry is None:
+        shared = tuple(sys.intern(g) for g in genres)
+        entry = _GENRES[genres] = (shared, genre_mask(shared))
+    return entry
+
+
+def intern_genres(genres: Iterable[str]) -> Tuple[str, ...]:
+    """
+    One shared tuple per distinct genre list, so a 100k-track library holds a
+    handful of genre tuples instead of 100k lists.
+    """
+    return _genre_entry(genres)[0]
 
 
-@dataclass
 class Track:
-    id: int
-    title: str
-    artist: str
-    bpm: float
-    key: str  # Camelot format e.g. "8A"
-    genres: List[str]
-    energy: Optional[int] = None  # 1–10 from Mixed In Key
+    """
+    One library track. `key` and `genres` are properties over the _key and
+    _genres slots, so every assignment (the constructor's included) keeps
+    key_num/key_mode and genre_mask in step. The key is interned and genres
+    (any iterable of names) are stored as one shared tuple per distinct list.
+    """
+
+    __slots__ = (
+        "id",
+        "title",
+        "artist",
+        "bpm",
+        "_key",
+        "_genres",
+        "energy",
+        # match.normalise(artist/title), filled in once at import so matching
+        # doesn't redo the regex work for every tracklist line
+        "norm_artist",
+        "norm_title",
+        # parse_camelot_key(key), so scoring never re-parses the key string
+        "key_num",
+        "key_mode",
+        # genre_mask(genres): one bit per genre, so overlap is a popcount
+        "genre_mask",
+    )
+
+    def __init__(
+        self,
+        id: int,
+        title: str,
+        artist: str,
+        bpm: float,
+        key: str,  # Camelot format e.g. "8A"
+        genres: Iterable[str],
+        energy: Optional[int] = None,  # 1–10 from Mixed In Key
+        norm_artist: Optional[str] = None,
+        norm_title: Optional[str] = None,
+    ) -> None:
+        self.id = id
+        self.title = title
+        self.artist = artist
+        self.bpm = bpm
+        # The key/genres setters, inlined: this runs for every track imported
+        if key:
+            self._key, self.key_num, self.key_mode = _key_entry(key)
+        else:
+            self._key, self.key_num, self.key_mode = key, -1, -1
+        self._genres, self.genre_mask = _genre_entry(genres)
+        self.energy = energy
+        self.norm_artist = norm_artist
+        self.norm_title = norm_title
+
+    @property
+    def key(self) -> str:
+        return self._key
+
+    @key.setter
+    def key(self, key: str) -> None:
+        if key:
+            key, self.key_num, self.key_mode = _key_entry(key)
+        else:
+            self.key_num = self.key_mode = -1
+        self._key = key
+
+    @property
+    def genres(self) -> Tuple[str, ...]:
+        return self._genres
+
+    @genres.setter
+    def genres(self, genres: Iterable[str]) -> None:
+        self._genres, self.genre_mask = _genre_entry(genres)
+
+    def set_genres(self, genres: Iterable[str]) -> None:
+        """
+        Replaces the genres (same as assigning `genres`). Indexes built from
+        the track beforehand (TrackColumns etc.) need rebuilding.
+        """
+        self.genres = genres
+
+    def assign(self, other: "Track") -> None:
+        """
+        Takes every field (derived ones included) from `other`, so a track
+        re-read from an updated export keeps its identity for anything that
+        holds a reference to it. Indexes built from it need updating, as with
+        set_genres().
+        """
+        for name in self.__slots__:
+            setattr(self, name, getattr(other, name))
+
+    def _compared(self) -> tuple:
+        return (self.id, self.title, self.artist, self.bpm, self._key, self._genres, self.energy)
+
+    def __eq__(self, other: object) -> bool:
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return self._compared() == other._compared()
+
+    __hash__ = None  # mutable
+
+    def __repr__(self) -> str:
+        return (
+            f"Track(id={self.id!r}, title={self.title!r}, artist={self.artist!r}, bpm={self.bpm!r}, "
+            f"key={self._key!r}, genres={self._genres!r}, energy={self.energy!r})"
+        )
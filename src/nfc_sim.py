@@ -1,6 +1,35 @@
+import random
+from typing import Iterable, List, Optional
+
+from tag_registry import TagRegistry
+
+# Kept for the original demo tag; real tags live in the TagRegistry file
 TAG_TO_RELEASE = {
     "TAG-STEPH": "784629",
 }
 
-def resolve_release_id(tag_uid: str):
+
+def resolve_release_id(tag_uid: str, registry: Optional[TagRegistry] = None):
+    if registry is not None:
+        release_id = registry.resolve(tag_uid)
+        if release_id is not None:
+            return release_id
     return TAG_TO_RELEASE.get(tag_uid)
+
+
+def simulated_uid(rng: random.Random) -> str:
+    # 7-byte UID as printed by NTAG21x readers, e.g. "04:A1:B2:C3:D4:E5:F6"
+    return ":".join(["04"] + [f"{rng.randrange(256):02X}" for _ in range(6)])
+
+
+def simulate_tags(registry: TagRegistry, release_ids: Iterable, seed: int = 0) -> List[str]:
+    """
+    Registers one simulated tag per release and returns the UIDs, in order.
+    """
+    rng = random.Random(seed)
+    uids = []
+    for release_id in release_ids:
+        uid = simulated_uid(rng)
+        registry.register(uid, release_id)
+        uids.append(uid)
+    return uids
@@ -0,0 +1,153 @@
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Set, Union
+
+import numpy as np
+
+from models import Track
+from query import TrackIndex
+
+# Points lost per unit of distance from the energy curve at each position
+DEFAULT_ENERGY_WEIGHT = 5.0
+# Penalty (in energy units) for tracks without an energy value when a curve is set
+MISSING_ENERGY_DISTANCE = 3.0
+
+
+@dataclass
+class PlanStep:
+    track: Track
+    score: int                    # compatibility with the previous track (0 for the seed)
+    breakdown: Dict[str, int]
+
+
+@dataclass
+class _Beam:
+    value: float
+    steps: List[PlanStep]
+    used: Set[int] = field(default_factory=set)
+
+
+def energy_targets(curve: Optional[Sequence[float]], length: int) -> Optional[np.ndarray]:
+    """
+    Per-position target energy. `curve` is a list of control points spread
+    evenly over the set, e.g. [4, 8, 6] builds up to the middle then eases off.
+    """
+    if not curve:
+        return None
+    if len(curve) == 1 or length <= 1:
+        return np.full(length, float(curve[0]))
+    points = np.linspace(0, len(curve) - 1, length)
+    return np.interp(points, np.arange(len(curve)), np.asarray(curve, dtype=float))
+
+
+class SetPlanner:
+    """
+    Beam search for an N-track path through the compatibility graph.
+
+    Each track's outgoing edges are its compatible neighbours from the
+    TrackIndex (BPM window x key set, scored once) and are cached, so a
+    track reached by several beams or steps is only scored once. A beam
+    whose cached edges are all used up falls back to the best unused tracks
+    from a full scan, so it isn't cut short while the library has tracks.
+    """
+
+    def __init__(self, library: Union[Sequence[Track], TrackIndex], neighbours: int = 100):
+        self.index = library if isinstance(library, TrackIndex) else TrackIndex(library)
+        self.neighbours = neighbours
+        self._edges: Dict[int, list] = {}
+
+    def edges(self, track: Track) -> list:
+        edges = self._edges.get(track.id)
+        if edges is None:
+            edges = self.index.recommend(track, k=self.neighbours)
+            if not edges:
+                # Nothing mixable by BPM and key: fall back to the best of the rest
+                edges = self.index.columns.recommend(track, k=self.neighbours)
+            self._edges[track.id] = edges
+        return edges
+
+    def _unused_edges(self, track: Track, used: Set[int], branch: int) -> list:
+        """
+        edges(track) minus used tracks; when none are left, the best `branch`
+        unused tracks of the whole library instead.
+        """
+        edges = [e for e in self.edges(track) if e[0].id not in used]
+        if not edges:
+            # Top len(used) + branch always holds `branch` unused tracks if there are that many
+            edges = [
+                e for e in self.index.columns.recommend(track, k=len(used) + branch)
+                if e[0].id not in used
+            ]
+        return edges[:branch]
+
+    def _expand(
+        self,
+        beams: List[_Beam],
+        pos: int,
+        width: int,
+        branch: int,
+        targets: Optional[np.ndarray],
+        energy_weight: float,
+    ) -> List[_Beam]:
+        expanded = []
+        for beam in beams:
+            for track, score, breakdown in self._unused_edges(beam.steps[-1].track, beam.used, branch):
+                value = beam.value + score
+                if targets is not None:
+                    distance = (
+                        MISSING_ENERGY_DISTANCE if track.energy is None
+                        else abs(track.energy - targets[pos])
+                    )
+                    value -= energy_weight * distance
+                expanded.append((value, beam, PlanStep(track, score, breakdown)))
+
+        expanded.sort(key=lambda x: x[0], reverse=True)
+        return [
+            _Beam(value, beam.steps + [step], beam.used | {step.track.id})
+            for value, beam, step in expanded[:width]
+        ]
+
+    def plan(
+        self,
+        seed: Track,
+        length: int = 20,
+        beam_width: int = 8,
+        branch: int = 12,
+        energy_curve: Optional[Sequence[float]] = None,
+        energy_weight: float = DEFAULT_ENERGY_WEIGHT,
+        time_budget_s: Optional[float] = None,
+    ) -> List[PlanStep]:
+        """
+        Best path of up to `length` tracks starting at `seed`, with no repeats.
+
+        If time_budget_s runs out, the best beam so far is finished greedily
+        (beam width 1), so a full-length plan still comes back promptly.
+        The plan is shorter than `length` only if the library runs out of tracks.
+        """
+        targets = energy_targets(energy_curve, length)
+        deadline = None if time_budget_s is None else time.monotonic() + time_budget_s
+
+        beams = [_Beam(0.0, [PlanStep(seed, 0, {})], {seed.id})]
+        for pos in range(1, length):
+            width = beam_width
+            if deadline is not None and time.monotonic() >= deadline:
+                beams = beams[:1]
+                width = 1
+            expanded = self._expand(beams, pos, width, branch, targets, energy_weight)
+            if not expanded:
+                break
+            beams = expanded
+
+        return max(beams, key=lambda b: b.value).steps
+
+
+def plan_set(
+    seed: Track,
+    library: Union[Sequence[Track], TrackIndex],
+    length: int = 20,
+    **kwargs,
+) -> List[PlanStep]:
+    """
+    One-off convenience wrapper around SetPlanner.plan.
+    """
+    return SetPlanner(library).plan(seed, length=length, **kwargs)
@@ -0,0 +1,159 @@
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from models import Track
+from columnar import TrackColumns, parse_key_parts
+
+# bpm_score is 0 beyond this many BPM either side of the current track
+BPM_TOLERANCE = 3
+# float slack so the window never drops a track that abs(diff) <= 3 would keep
+_BPM_EPS = 1e-9
+
+
+@dataclass
+class Query:
+    """
+    Candidate filters. Every field is optional; unset fields don't filter.
+    """
+    bpm_min: Optional[float] = None
+    bpm_max: Optional[float] = None
+    keys: Optional[Iterable[str]] = None       # Camelot keys, e.g. ["08A", "09A"]
+    min_energy: Optional[int] = None           # tracks without energy are excluded
+    genres: Optional[Iterable[str]] = None     # match any of these
+
+
+def compatible_keys(key: str, vocab: Iterable[str]) -> List[str]:
+    """
+    Keys from `vocab` that key_score rates above 0 against `key`:
+    same key, relative major/minor and adjacent numbers (with 12 <-> 1 wrap).
+    """
+    if not key:
+        return []
+    c_num, c_letter = parse_key_parts(key)
+    out = []
+    for k in vocab:
+        if k == key:
+            out.append(k)
+            continue
+        num, letter = parse_key_parts(k)
+        if num < 0 or c_num < 0:
+            continue
+        if num == c_num and letter != c_letter:
+            out.append(k)
+        elif letter == c_letter and (abs(num - c_num) == 1 or {num, c_num} == {1, 12}):
+            out.append(k)
+    return out
+
+
+class TrackIndex:
+    """
+    BPM-sorted index with per-key posting lists over a TrackColumns.
+
+    Filters are applied before any scoring: the BPM window is a binary search
+    on the sorted BPM column, and each key's posting list holds positions in
+    that same sorted order, so a window x key-set lookup is a handful of
+    searchsorted calls. Cost follows the number of surviving tracks.
+    """
+
+    def __init__(self, library: Union[Sequence[Track], TrackColumns]):
+        self.columns = library if isinstance(library, TrackColumns) else TrackColumns(library)
+        self._build()
+
+    def _build(self) -> None:
+        cols = self.columns
+
+        self.order = np.argsort(cols.bpm, kind="stable")
+        self.sorted_bpm = cols.bpm[self.order]
+
+        sorted_keys = cols.key_code[self.order]
+        by_key = np.argsort(sorted_keys, kind="stable")
+        bounds = np.searchsorted(sorted_keys[by_key], np.arange(len(cols.key_vocab) + 1))
+        self.key_postings: Dict[str, np.ndarray] = {
+            key: by_key[bounds[code]:bounds[code + 1]]
+            for key, code in cols.key_vocab.items()
+        }
+
+    def update(self, tracks: Sequence[Track], changed: Iterable[Track] = ()) -> None:
+        """
+        Follows a new version of the track list: the columns are updated in
+        place (TrackColumns.update) and the sort order and postings, which
+        are plain array operations, are redone over them.
+        """
+        self.columns.update(tracks, changed)
+        self._build()
+
+    def __len__(self) -> int:
+        return len(self.columns)
+
+    def _bpm_bounds(self, q: Query) -> Tuple[int, int]:
+        lo = 0 if q.bpm_min is None else int(np.searchsorted(self.sorted_bpm, q.bpm_min, side="left"))
+        hi = len(self.sorted_bpm) if q.bpm_max is None else int(
+            np.searchsorted(self.sorted_bpm, q.bpm_max, side="right")
+        )
+        return lo, max(lo, hi)
+
+    def select(self, q: Query) -> np.ndarray:
+        """
+        Row numbers (library order) of tracks passing every filter in `q`.
+        """
+        lo, hi = self._bpm_bounds(q)
+
+        if q.keys is None:
+            positions = np.arange(lo, hi)
+        else:
+            parts = []
+            for key in set(q.keys):
+                posting = self.key_postings.get(key)
+                if posting is None:
+                    continue
+                a, b = np.searchsorted(posting, [lo, hi])
+                parts.append(posting[a:b])
+            positions = np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+        rows = self.order[positions]
+
+        if q.min_energy is not None:
+            rows = rows[self.columns.energy[rows] >= q.min_energy]
+
+        if q.genres is not None:
+            mask = self.columns.genre_mask(q.genres)
+            if not mask.any():
+                # Only genres no track has: nothing can match
+                return np.empty(0, dtype=np.int64)
+            rows = rows[(self.columns.genre_bits[rows] & mask).any(axis=1)]
+
+        return np.sort(rows)
+
+    def search(
+        self, current: Track, q: Query, k: Optional[int] = None
+    ) -> List[Tuple[Track, int, Dict[str, int]]]:
+        """
+        Scores only the tracks selected by `q` against `current`.
+        """
+        return self.columns.recommend(current, k=k, rows=self.select(q))
+
+    def compatible_query(self, current: Track, **filters) -> Query:
+        """
+        Query for tracks that can score on both BPM and key against `current`.
+        Extra filters (min_energy, genres) are passed through.
+        """
+        return Query(
+            bpm_min=current.bpm - BPM_TOLERANCE - _BPM_EPS,
+            bpm_max=current.bpm + BPM_TOLERANCE + _BPM_EPS,
+            keys=compatible_keys(current.key, self.columns.key_vocab),
+            **filters,
+        )
+
+    def recommend(
+        self, current: Track, k: Optional[int] = None, **filters
+    ) -> List[Tuple[Track, int, Dict[str, int]]]:
+        """
+        Like engine.recommend, restricted to tracks within the BPM tolerance
+        and a compatible key. Scores match engine.recommend for those tracks.
+        """
+        rows = self.select(self.compatible_query(current, **filters))
+        # drop window-edge tracks that bpm_score's own abs(diff) rounds past 3
+        rows = rows[np.abs(self.columns.bpm[rows] - current.bpm) <= BPM_TOLERANCE]
+        return self.columns.recommend(current, k=k, rows=rows)
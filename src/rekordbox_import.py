@@ -1,8 +1,20 @@
+import hashlib
+import re
 import xml.etree.ElementTree as ET
-from typing import Dict, List, Optional
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
 
 from models import Track
 from energy import extract_energy
+from match import normalise
+import timings
+
+_GENRE_SPLIT_RE = re.compile(r"[,;|]")
+# COLLECTION/TRACK attributes a Track is built from; a track whose values
+# for these are unchanged is reused as-is on re-import
+_TRACK_ATTRS = ("Name", "Artist", "AverageBpm", "Tonality", "Comments", "Genre")
+# Ids for non-numeric TrackIDs are hashed into this range, clear of numeric ones
+_HASHED_ID_BASE = 1 << 62
 
 
 def _safe_float(x: Optional[str]) -> Optional[float]:
@@ -24,93 +36,403 @@ def _normalise_camelot(key: str) -> str:
     return key
 
 
-def _build_collection_lookup(root: ET.Element) -> Dict[str, Track]:
+def _parse_genres(genre: Optional[str]) -> List[str]:
     """
-    Builds TrackID -> Track from COLLECTION.
+    Rekordbox keeps genres in one free-text field; "Disco, Boogie" and
+    "Disco; Boogie" both mean two genres. "/" is left alone, since single
+    genres like "Indie Dance / Nu Disco" use it.
     """
-    lookup: Dict[str, Track] = {}
-    next_id = 1
-
-    for t in root.findall(".//COLLECTION/TRACK"):
-        track_id = t.attrib.get("TrackID") or t.attrib.get("TrackId") or t.attrib.get("ID")
-        if not track_id:
-            continue
-
-        title = t.attrib.get("Name") or ""
-        artist = t.attrib.get("Artist") or ""
-        bpm = _safe_float(t.attrib.get("AverageBpm"))
-        key = _normalise_camelot(t.attrib.get("Tonality") or "")
-        comments = t.attrib.get("Comments", "") or ""
-        energy = extract_energy(comments)
+    if not genre:
+        return []
+    genres: Dict[str, None] = {}
+    for g in _GENRE_SPLIT_RE.split(genre):
+        g = g.strip()
+        if g:
+            genres[g] = None
+    return list(genres)
 
-        # Keep only tracks with the core fields you need for recommendations
-        if not title or not artist or bpm is None or not key:
-            continue
-
-        lookup[track_id] = Track(
-            id=next_id,  # internal id for our app run
-            title=title,
-            artist=artist,
-            bpm=bpm,
-            key=key,
-            genres=[],      # add later (Genre attribute exists but not always useful)
-            energy=energy,
-        )
-        next_id += 1
 
-    return lookup
+def rekordbox_track_id(track_id: str) -> int:
+    """
+    Track.id for a Rekordbox TrackID: the TrackID itself when it's numeric
+    (it always is in Rekordbox exports), else a stable hash of it. The same
+    export, or a later one, always gives a track the same id, so ids stored
+    elsewhere (mapping files' rb_track_id) stay valid across re-exports.
+    """
+    if track_id.isdigit() and int(track_id) < _HASHED_ID_BASE:
+        return int(track_id)
+    digest = hashlib.blake2b(track_id.encode("utf-8"), digest_size=8).digest()
+    return _HASHED_ID_BASE | (int.from_bytes(digest, "big") & (_HASHED_ID_BASE - 1))
 
 
-def _find_playlist_node(root: ET.Element, playlist_name: str) -> Optional[ET.Element]:
+def _attrib_fingerprint(attrib: Dict[str, str]) -> int:
     """
-    Finds the first PLAYLIST NODE where Name matches playlist_name.
-    Rekordbox uses nested NODEs for folders/playlists.
+    Hash of the attributes a Track is built from, to spot changed tracks
+    without building them.
     """
-    # Common structure: PLAYLISTS/NODE/NODE/... where leaf playlists contain TRACK refs
-    for node in root.findall(".//PLAYLISTS//NODE"):
-        if (node.attrib.get("Name") or "").strip() == playlist_name:
-            return node
-    return None
+    text = "\x1f".join(attrib.get(name) or "" for name in _TRACK_ATTRS)
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "big")
 
 
-def _extract_playlist_track_ids(playlist_node: ET.Element) -> List[str]:
+def _track_from_attrib(attrib: Dict[str, str], track_id: int) -> Optional[Track]:
     """
-    Extract Track IDs referenced inside a playlist node.
-    In Rekordbox XML, playlist content is typically <TRACK Key="123"/> or similar.
+    Builds a Track from a COLLECTION/TRACK element's attributes.
+    Returns None if the track lacks the core fields needed for recommendations.
     """
-    ids: List[str] = []
+    title = attrib.get("Name") or ""
+    artist = attrib.get("Artist") or ""
+    bpm = _safe_float(attrib.get("AverageBpm"))
+    key = _normalise_camelot(attrib.get("Tonality") or "")
+    comments = attrib.get("Comments", "") or ""
+    energy = extract_energy(comments)
+
+    # Keep only tracks with the core fields you need for recommendations
+    if not title or not artist or bpm is None or not key:
+        return None
+
+    return Track(
+        id=track_id,
+        title=title,
+        artist=artist,
+        bpm=bpm,
+        key=key,
+        genres=_parse_genres(attrib.get("Genre")),
+        energy=energy,
+        norm_artist=normalise(artist),
+        norm_title=normalise(title),
+    )
+
+
+def _collection_track_id(attrib: Dict[str, str]) -> Optional[str]:
+    return attrib.get("TrackID") or attrib.get("TrackId") or attrib.get("ID")
 
-    for tr in playlist_node.findall(".//TRACK"):
-        # Most common: Key="TrackID"
-        key = tr.attrib.get("Key") or tr.attrib.get("TrackID") or tr.attrib.get("TrackId")
-        if key:
-            ids.append(key)
 
-    # De-dupe while preserving order
+def _playlist_track_ref(attrib: Dict[str, str]) -> Optional[str]:
+    # In Rekordbox XML, playlist content is typically <TRACK Key="123"/> or similar.
+    return attrib.get("Key") or attrib.get("TrackID") or attrib.get("TrackId")
+
+
+def _unique(ids: List[str]) -> List[str]:
+    """
+    De-dupe while preserving order.
+    """
     seen = set()
     unique_ids = []
     for x in ids:
         if x not in seen:
             seen.add(x)
             unique_ids.append(x)
-
     return unique_ids
 
 
-def import_rekordbox_playlist_xml(path: str, playlist_name: str) -> List[Track]:
+@dataclass
+class PlaylistNode:
+    name: str
+    depth: int              # nesting below PLAYLISTS; the ROOT node is 1
+    track_ids: List[str]    # direct <TRACK> refs, in document order
+
+
+@dataclass
+class LibraryDiff:
     """
-    Imports only the tracks from a named playlist.
+    What changed between two versions of a track list. Changed tracks are
+    the original Track objects, already updated with the new values.
+    """
+    added: List[Track] = field(default_factory=list)
+    removed: List[Track] = field(default_factory=list)
+    changed: List[Track] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed or self.changed)
+
+    def summary(self) -> Dict[str, int]:
+        return {"added": len(self.added), "removed": len(self.removed), "changed": len(self.changed)}
+
+    def for_pool(self, old_pool: Sequence[Track], new_pool: Sequence[Track]) -> "LibraryDiff":
+        """
+        This diff as seen by a pool drawn from the library (e.g. a playlist):
+        tracks joining or leaving the pool count as added or removed.
+        """
+        old_ids = {id(t) for t in old_pool}
+        new_ids = {id(t) for t in new_pool}
+        changed_ids = {id(t) for t in self.changed}
+        return LibraryDiff(
+            added=[t for t in new_pool if id(t) not in old_ids],
+            removed=[t for t in old_pool if id(t) not in new_ids],
+            changed=[t for t in new_pool if id(t) in changed_ids and id(t) in old_ids],
+        )
+
+
+@dataclass
+class RekordboxLibrary:
+    """
+    Parsed COLLECTION plus the PLAYLISTS tree, flattened in document order.
+
+    Parse once, then pull any number of playlists, folders or the whole
+    collection from it. Playlists are addressed by name or by path below
+    ROOT ("Crates/Disco/Disco 1"); see resolve().
+    """
+    collection: Dict[str, Track]   # Rekordbox TrackID -> Track
+    nodes: List[PlaylistNode]
+    # Rekordbox TrackID -> _attrib_fingerprint of its COLLECTION entry
+    fingerprints: Dict[str, int] = field(default_factory=dict, repr=False, compare=False)
+    # (size, mtime_ns) of the XML this was read from, when known
+    source: Optional[Tuple[int, int]] = field(default=None, repr=False, compare=False)
+    # Lazily built name/path index over `nodes`
+    _paths: List[str] = field(default_factory=list, init=False, repr=False, compare=False)
+    _by_name: Dict[str, List[int]] = field(default_factory=dict, init=False, repr=False, compare=False)
+    _by_path: Dict[str, List[int]] = field(default_factory=dict, init=False, repr=False, compare=False)
+
+    def update_from(self, new: "RekordboxLibrary") -> LibraryDiff:
+        """
+        Takes over a newer parse of the same export in place and returns
+        what changed. `new` should come from parse_rekordbox_library(path,
+        previous=self), so unchanged tracks are already this library's own
+        Track objects; changed tracks are updated in place (Track.assign)
+        rather than replaced, so references held elsewhere see the new values.
+        """
+        diff = LibraryDiff()
+        collection: Dict[str, Track] = {}
+        for track_id, track in new.collection.items():
+            old = self.collection.get(track_id)
+            if old is None:
+                diff.added.append(track)
+            elif old is not track:
+                old.assign(track)
+                track = old
+                diff.changed.append(track)
+            collection[track_id] = track
+        diff.removed = [t for track_id, t in self.collection.items() if track_id not in collection]
+
+        self.collection = collection
+        self.nodes = new.nodes
+        self.fingerprints = new.fingerprints
+        self.source = new.source
+        self._paths, self._by_name, self._by_path = [], {}, {}
+        return diff
+
+    def _build_index(self) -> None:
+        if self._paths or not self.nodes:
+            return
+        stack: List[str] = []
+        for i, node in enumerate(self.nodes):
+            del stack[node.depth - 1:]
+            stack.append(node.name)
+            # The ROOT node isn't part of anyone's path
+            parts = stack[1:] if stack[0] == "ROOT" else stack
+            path = "/".join(parts)
+            self._paths.append(path)
+            self._by_name.setdefault(node.name, []).append(i)
+            self._by_path.setdefault(path, []).append(i)
+
+    def playlist_paths(self) -> List[str]:
+        """
+        Path of every playlist and folder, in document order.
+        """
+        self._build_index()
+        return [p for p in self._paths if p]
+
+    def resolve(self, spec: str, first_match: bool = False) -> int:
+        """
+        Index into `nodes` of the playlist or folder `spec` refers to. A plain
+        name matches that name anywhere in the tree. A spec with "/" is an
+        exact path, else a name containing "/", else a path suffix
+        ("Disco/Disco 1"); with a leading "/" it is an exact path only.
+        Raises ValueError if nothing matches or the match is ambiguous. With
+        first_match, a plain name matching several NODEs resolves to the first
+        in document order, as single-playlist imports always have.
+        """
+        self._build_index()
+        if "/" not in spec:
+            matches = self._by_name.get(spec)
+        elif spec.startswith("/"):
+            # "/Name" pins a top-level playlist (or any absolute path)
+            matches = self._by_path.get(spec[1:])
+        else:
+            matches = self._by_path.get(spec) or self._by_name.get(spec)
+            if not matches:
+                suffix = "/" + spec.strip("/")
+                matches = [i for i, p in enumerate(self._paths) if p.endswith(suffix)]
+        if not matches:
+            raise ValueError(f"Playlist '{spec}' not found in XML.")
+        if len(matches) > 1 and not (first_match and "/" not in spec):
+            paths = ", ".join(f"'/{self._paths[i]}'" for i in matches)
+            raise ValueError(f"Playlist '{spec}' is ambiguous; use one of the paths: {paths}")
+        return matches[0]
+
+    def _subtree_track_ids(self, i: int) -> List[str]:
+        node = self.nodes[i]
+        ids = list(node.track_ids)
+        for child in self.nodes[i + 1:]:
+            if child.depth <= node.depth:
+                break
+            ids.extend(child.track_ids)
+        return ids
+
+    def playlist_track_ids(self, playlist_name: str) -> Optional[List[str]]:
+        """
+        Track refs of the first NODE named playlist_name, including nested NODEs
+        (Rekordbox folders are NODEs too). None if no such NODE exists.
+        """
+        for i, node in enumerate(self.nodes):
+            if node.name == playlist_name:
+                return self._subtree_track_ids(i)
+        return None
+
+    def playlist_tracks(self, playlist: str, first_match: bool = False) -> List[Track]:
+        """
+        Tracks of one playlist, or of everything below a folder. See resolve()
+        for `first_match`.
+        """
+        i = self.resolve(playlist, first_match)
+        return _resolve_playlist(self.collection, playlist, self._subtree_track_ids(i))
+
+    def playlists_tracks(self, playlists: Iterable[str]) -> Dict[str, List[Track]]:
+        return {p: self.playlist_tracks(p) for p in playlists}
+
+    def union_tracks(self, playlists: Iterable[str]) -> List[Track]:
+        """
+        Every track in any of the playlists/folders, once, in first-seen order.
+        """
+        playlists = list(playlists)
+        ids: List[str] = []
+        for p in playlists:
+            ids.extend(self._subtree_track_ids(self.resolve(p)))
+        return _resolve_playlist(self.collection, ", ".join(playlists), ids)
+
+    def collection_tracks(self) -> List[Track]:
+        return list(self.collection.values())
+
+    def pool(self, playlists: Optional[Iterable[str]] = None) -> List[Track]:
+        """
+        Recommendation/matching pool: the union of `playlists`, or the whole
+        COLLECTION when none are given. A single playlist name picks the first
+        NODE with that name; names in a union must be unambiguous.
+        """
+        playlists = list(playlists or [])
+        if not playlists:
+            return self.collection_tracks()
+        if len(playlists) == 1:
+            return self.playlist_tracks(playlists[0], first_match=True)
+        return self.union_tracks(playlists)
+
+
+@timings.timed("rekordbox.parse_xml")
+def _stream_rekordbox(
+    path: str, playlist_name: Optional[str] = None, previous: Optional[RekordboxLibrary] = None
+) -> RekordboxLibrary:
+    """
+    Single iterparse pass over the XML that builds TrackID -> Track from
+    COLLECTION and records the PLAYLISTS NODEs. With playlist_name, only the
+    first NODE of that name (and anything nested in it) is kept and parsing
+    stops as soon as both it and COLLECTION are done.
+
+    Elements are cleared as soon as they end, so memory stays proportional to
+    the Track objects kept rather than the size of the document.
+
+    With `previous` (an earlier parse of the same export), COLLECTION entries
+    whose attributes haven't changed reuse its Track objects instead of
+    building new ones.
+    """
+    lookup: Dict[str, Track] = {}
+    fingerprints: Dict[str, int] = {}
+    old_tracks = previous.collection if previous is not None else {}
+    old_fingerprints = previous.fingerprints if previous is not None else {}
+
+    nodes: List[PlaylistNode] = []
+    open_nodes: List[PlaylistNode] = []   # recorded NODEs we're currently inside
+    found_depth: Optional[int] = None     # depth of the named NODE while inside it
+    playlist_done = False
+    collection_done = False
+
+    tags: List[str] = []
+    elems: List[ET.Element] = []
+    # Reading COLLECTION into the TrackID -> Track lookup, reported on its
+    # own within rekordbox.parse_xml
+    collection_stage = timings.stage("rekordbox.collection_lookup")
+
+    for event, elem in ET.iterparse(path, events=("start", "end")):
+        if event == "start":
+            parent = tags[-1] if tags else None
+            tags.append(elem.tag)
+            elems.append(elem)
+
+            # Attributes are complete on "start"; read everything here because
+            # children ending later clear their parent.
+            if elem.tag == "TRACK" and parent == "COLLECTION":
+                track_id = _collection_track_id(elem.attrib)
+                if track_id:
+                    fingerprint = _attrib_fingerprint(elem.attrib)
+                    track = None
+                    if old_fingerprints.get(track_id) == fingerprint:
+                        track = old_tracks.get(track_id)
+                    if track is None:
+                        track = _track_from_attrib(elem.attrib, rekordbox_track_id(track_id))
+                    if track:
+                        lookup[track_id] = track
+                        fingerprints[track_id] = fingerprint
+
+            elif elem.tag == "TRACK" and parent == "NODE" and open_nodes:
+                ref = _playlist_track_ref(elem.attrib)
+                if ref:
+                    open_nodes[-1].track_ids.append(ref)
+
+            elif elem.tag == "NODE" and "PLAYLISTS" in tags:
+                depth = len(tags) - tags.index("PLAYLISTS") - 1
+                name = (elem.attrib.get("Name") or "").strip()
+                record = playlist_name is None or found_depth is not None
+                if not record and not playlist_done and name == playlist_name:
+                    found_depth = depth
+                    record = True
+                if record:
+                    node = PlaylistNode(name=name, depth=depth, track_ids=[])
+                    nodes.append(node)
+                    open_nodes.append(node)
+
+            elif elem.tag == "COLLECTION":
+                collection_stage.__enter__()
+            continue
+
+        tags.pop()
+        elems.pop()
+        if elem.tag == "COLLECTION":
+            collection_stage.__exit__(None, None, None)
+            collection_done = True
+        elif elem.tag == "NODE" and open_nodes and "PLAYLISTS" in tags:
+            if open_nodes[-1].depth == len(tags) - tags.index("PLAYLISTS"):
+                open_nodes.pop()
+            if found_depth is not None and not open_nodes:
+                found_depth = None
+                playlist_done = True
+
+        # Drop the finished element and detach it from its parent
+        elem.clear()
+        if elems:
+            del elems[-1][:]
+
+        if collection_done and playlist_done:
+            break
+
+    return RekordboxLibrary(collection=lookup, nodes=nodes, fingerprints=fingerprints)
+
+
+def parse_rekordbox_library(path: str, previous: Optional[RekordboxLibrary] = None) -> RekordboxLibrary:
+    """
+    Parses the whole COLLECTION and every playlist NODE in one streaming pass.
+    Pass the library from an earlier parse as `previous` to reuse its
+    unchanged tracks (see RekordboxLibrary.update_from).
     """
-    tree = ET.parse(path)
-    root = tree.getroot()
+    return _stream_rekordbox(path, previous=previous)
 
-    collection_lookup = _build_collection_lookup(root)
 
-    playlist_node = _find_playlist_node(root, playlist_name)
-    if playlist_node is None:
+@timings.timed("rekordbox.resolve_playlist")
+def _resolve_playlist(
+    collection_lookup: Dict[str, Track], playlist_name: str, track_ids: Optional[List[str]]
+) -> List[Track]:
+    if track_ids is None:
         raise ValueError(f"Playlist '{playlist_name}' not found in XML.")
 
-    track_ids = _extract_playlist_track_ids(playlist_node)
+    track_ids = _unique(track_ids)
     if not track_ids:
         raise ValueError(
             f"Playlist '{playlist_name}' found, but no track references were detected."
@@ -136,3 +458,17 @@ def import_rekordbox_playlist_xml(path: str, playlist_name: str) -> List[Track]:
         print(f"Warning: {missing} tracks in playlist were not matched in COLLECTION.")
 
     return tracks
+
+
+def import_rekordbox_playlist_xml(path: str, playlist_name: str) -> List[Track]:
+    """
+    Imports only the tracks from a named playlist.
+    Streams the XML once and stops after that playlist; the full tree is never
+    held in memory. Paths ("Folder/Playlist") need the whole tree, so those
+    fall back to a full parse - use parse_rekordbox_library() directly to pull
+    several playlists from one parse.
+    """
+    library = _stream_rekordbox(path, playlist_name)
+    if library.playlist_track_ids(playlist_name) is None and "/" in playlist_name:
+        library = parse_rekordbox_library(path)
+    return library.playlist_tracks(playlist_name, first_match=True)
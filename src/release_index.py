@@ -0,0 +1,284 @@
+import json
+import os
+import shutil
+from typing import Dict, Iterator, List, Optional
+
+FORMAT = "crate-logic/release-index"
+FORMAT_VERSION = 1
+
+# Header fields carried over from the compact index dict
+_HEADER_FIELDS = ("username", "folder_id", "count", "skipped_instance_ids")
+
+
+def _dumps(data: Dict) -> str:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+def offsets_path(path: str) -> str:
+    return f"{path}.idx"
+
+
+def spool_path(path: str) -> str:
+    return f"{path}.body.tmp"
+
+
+def discard_partial(path: str) -> List[str]:
+    """
+    Removes what an interrupted ReleaseIndexWriter leaves next to `path`
+    (the spool and a half-copied final file). Returns the paths removed.
+    """
+    removed = []
+    for p in (spool_path(path), f"{path}.tmp", f"{offsets_path(path)}.tmp"):
+        if os.path.exists(p):
+            os.remove(p)
+            removed.append(p)
+    return removed
+
+
+def _file_stamp(path: str) -> Dict:
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+class ReleaseIndexWriter:
+    """
+    Streams a compact Discogs index to disk: a header line, then one release
+    per line as compact JSON, with a release_id -> byte offset sidecar
+    (<path>.idx) alongside. Nothing shows up at `path` until close(), so a
+    failed sync leaves the previous index in place.
+
+        with ReleaseIndexWriter(path, {"username": ..., "folder_id": 0}) as w:
+            for release in releases:
+                w.write(release)
+            w.header["count"] = total
+
+    Header fields (count, skipped_instance_ids) may be updated until close:
+    releases are spooled to a side file and the header goes in front of them
+    when the index is finalised.
+
+    For long runs, checkpoint() makes everything written so far durable and
+    returns a state dict; a later writer built with resume=<that state>
+    carries on from exactly that point (anything written after the
+    checkpoint is dropped). suspend() closes the writer but keeps the spool
+    for that.
+    """
+
+    def __init__(self, path: str, header: Optional[Dict] = None, resume: Optional[Dict] = None):
+        header = header or {}
+        self.path = path
+        self.header = {k: header.get(k) for k in _HEADER_FIELDS}
+        self.header["skipped_instance_ids"] = list(self.header["skipped_instance_ids"] or [])
+        self.count = 0
+        self._offsets: Dict[str, int] = {}
+        self._tmp = f"{path}.tmp"
+        self._body_path = spool_path(path)
+        if resume is None:
+            self._body = open(self._body_path, "wb")
+        else:
+            self._resume(resume)
+
+    def _resume(self, state: Dict) -> None:
+        size = state["body_bytes"]
+        if os.path.getsize(self._body_path) < size:
+            raise ValueError(f"{self._body_path} is shorter than its checkpoint; can't resume")
+        self._body = open(self._body_path, "r+b")
+        self._body.truncate(size)
+        offset = 0
+        for line in self._body:
+            self._offsets.setdefault(str(json.loads(line).get("release_id")), offset)
+            offset += len(line)
+            self.count += 1
+        self._body.seek(size)
+        self.header["skipped_instance_ids"] = list(state.get("skipped_instance_ids") or [])
+
+    def write(self, release: Dict) -> None:
+        self.write_raw(release.get("release_id"), _dumps(release).encode("utf-8"))
+
+    def write_raw(self, release_id, line: bytes) -> None:
+        """
+        Adds an already-encoded release line (e.g. from
+        ReleaseIndexReader.raw_lines) without decoding it again.
+        """
+        offset = self._body.tell()
+        self._body.write(line if line.endswith(b"\n") else line + b"\n")
+        self._offsets.setdefault(str(release_id), offset)
+        self.count += 1
+
+    def skip(self, instance_id) -> None:
+        if instance_id is not None:
+            self.header["skipped_instance_ids"].append(instance_id)
+
+    def checkpoint(self) -> Dict:
+        """
+        Flushes and fsyncs the spool; the returned state can resume a writer.
+        """
+        self._body.flush()
+        os.fsync(self._body.fileno())
+        return {
+            "body_bytes": self._body.tell(),
+            "count": self.count,
+            "skipped_instance_ids": list(self.header["skipped_instance_ids"]),
+        }
+
+    def suspend(self) -> None:
+        """
+        Closes without finalising or deleting anything, for a later resume.
+        """
+        self._body.close()
+
+    def close(self) -> None:
+        if self._body.closed:
+            return
+        self._body.close()
+        if self.header["count"] is None:
+            self.header["count"] = self.count
+        head = _dumps(dict(format=FORMAT, version=FORMAT_VERSION, **self.header)).encode("utf-8") + b"\n"
+        with open(self._tmp, "wb") as out, open(self._body_path, "rb") as body:
+            out.write(head)
+            shutil.copyfileobj(body, out, 1 << 20)
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(self._tmp, self.path)
+        os.remove(self._body_path)
+        _write_offsets(self.path, {rid: off + len(head) for rid, off in self._offsets.items()})
+
+    def abort(self) -> None:
+        self._body.close()
+        discard_partial(self.path)
+
+    def __enter__(self) -> "ReleaseIndexWriter":
+        return self
+
+    def __exit__(self, exc_type, *exc) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def _write_offsets(path: str, offsets: Dict[str, int]) -> None:
+    tmp = f"{offsets_path(path)}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(dict(_file_stamp(path), offsets=offsets), f, separators=(",", ":"))
+    os.replace(tmp, offsets_path(path))
+
+
+class ReleaseIndexReader:
+    """
+    Read side of ReleaseIndexWriter: the header is read up front, releases
+    are streamed on iteration, and get(release_id) seeks straight to the
+    release via the offset sidecar (rebuilt by one scan if missing or stale).
+
+    Older pretty-printed discogs_releases.json files are still readable;
+    those are loaded whole, since there is no way to seek into them.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._f = open(path, "rb")
+        self._legacy: Optional[Dict] = None
+        self._offsets: Optional[Dict[str, int]] = None
+
+        first = self._f.readline()
+        header = None
+        try:
+            header = json.loads(first)
+        except ValueError:
+            pass
+        if isinstance(header, dict) and header.get("format") == FORMAT:
+            self.header = {k: header.get(k) for k in _HEADER_FIELDS}
+            self._data_start = self._f.tell()
+        else:
+            self._f.seek(0)
+            self._legacy = json.load(self._f)
+            self.header = {k: self._legacy.get(k) for k in _HEADER_FIELDS}
+        self.header["skipped_instance_ids"] = self.header.get("skipped_instance_ids") or []
+
+    def close(self) -> None:
+        self._f.close()
+
+    def __enter__(self) -> "ReleaseIndexReader":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def raw_lines(self) -> Iterator[bytes]:
+        """
+        Encoded release lines, in file order (new format only).
+        """
+        if self._legacy is not None:
+            for r in self._legacy.get("releases", []):
+                yield _dumps(r).encode("utf-8") + b"\n"
+            return
+        # Separate handle, so get() can seek while a scan is in progress
+        with open(self.path, "rb") as f:
+            f.seek(self._data_start)
+            for line in f:
+                if line.strip():
+                    yield line
+
+    def __iter__(self) -> Iterator[Dict]:
+        if self._legacy is not None:
+            yield from self._legacy.get("releases", [])
+            return
+        for line in self.raw_lines():
+            yield json.loads(line)
+
+    def _load_offsets(self) -> Dict[str, int]:
+        if self._offsets is not None:
+            return self._offsets
+        if self._legacy is not None:
+            self._offsets = {}
+            for i, r in enumerate(self._legacy.get("releases", [])):
+                self._offsets.setdefault(str(r.get("release_id")), i)
+            return self._offsets
+
+        try:
+            with open(offsets_path(self.path), "r", encoding="utf-8") as f:
+                stored = json.load(f)
+            if {k: stored.get(k) for k in ("size", "mtime_ns")} == _file_stamp(self.path):
+                self._offsets = stored["offsets"]
+                return self._offsets
+        except (OSError, ValueError, KeyError):
+            pass
+
+        # Missing or stale: one scan to rebuild it
+        offsets: Dict[str, int] = {}
+        with open(self.path, "rb") as f:
+            f.seek(self._data_start)
+            offset = self._data_start
+            for line in f:
+                if line.strip():
+                    offsets.setdefault(str(json.loads(line).get("release_id")), offset)
+                offset += len(line)
+        try:
+            _write_offsets(self.path, offsets)
+        except OSError:
+            pass
+        self._offsets = offsets
+        return offsets
+
+    def release_ids(self) -> List[str]:
+        return list(self._load_offsets())
+
+    def __len__(self) -> int:
+        return len(self._load_offsets())
+
+    def __contains__(self, release_id) -> bool:
+        return str(release_id) in self._load_offsets()
+
+    def get(self, release_id) -> Optional[Dict]:
+        offset = self._load_offsets().get(str(release_id))
+        if offset is None:
+            return None
+        if self._legacy is not None:
+            return self._legacy["releases"][offset]
+        self._f.seek(offset)
+        return json.loads(self._f.readline())
+
+    def to_dict(self) -> Dict:
+        """
+        The whole index as the in-memory dict sync-discogs used to produce.
+        """
+        return dict(self.header, releases=list(self))
@@ -0,0 +1,246 @@
+import glob
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+DEFAULT_CACHE_DIR = "cache"
+DEFAULT_STORE_PATH = os.path.join(DEFAULT_CACHE_DIR, "discogs_releases.sqlite")
+
+_LEGACY_FILE_RE = re.compile(r"discogs_release_(\d+)\.json$")
+
+# SQLite caps bound parameters per statement; stay well under it
+_BATCH = 500
+
+# (ETag, Last-Modified, unix time the payload was last fetched or revalidated)
+Validators = Tuple[Optional[str], Optional[str], Optional[float]]
+
+
+def _dumps(data: Dict) -> str:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+class ReleaseStore:
+    """
+    Single-file SQLite store for Discogs release payloads, keyed by release_id.
+
+    Replaces the one-JSON-file-per-release cache directory. Tombstones (e.g.
+    404s) are stored as payloads carrying "_error", same as the old files, with
+    the error also kept in its own column. Each payload also keeps the HTTP
+    validators (ETag / Last-Modified) it was served with, so it can be
+    revalidated with a conditional request. Safe to share across worker threads.
+    """
+
+    def __init__(self, path: str = DEFAULT_STORE_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS releases ("
+            " release_id INTEGER PRIMARY KEY,"
+            " payload TEXT NOT NULL,"
+            " error TEXT,"
+            " etag TEXT,"
+            " last_modified TEXT,"
+            " checked_at REAL"
+            ")"
+        )
+        # Stores created before validators were kept
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(releases)")}
+        for column, kind in (("etag", "TEXT"), ("last_modified", "TEXT"), ("checked_at", "REAL")):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE releases ADD COLUMN {column} {kind}")
+        self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM releases").fetchone()[0]
+
+    def __contains__(self, release_id: int) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM releases WHERE release_id = ?", (int(release_id),)
+            ).fetchone()
+        return row is not None
+
+    def get(self, release_id: int) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload FROM releases WHERE release_id = ?", (int(release_id),)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_many(self, release_ids: Iterable[int]) -> Dict[int, Dict]:
+        """
+        Payloads for every stored id in release_ids (missing ids are omitted).
+        """
+        ids = list(dict.fromkeys(int(r) for r in release_ids))
+        found: Dict[int, Dict] = {}
+        with self._lock:
+            for i in range(0, len(ids), _BATCH):
+                batch = ids[i:i + _BATCH]
+                marks = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT release_id, payload FROM releases WHERE release_id IN ({marks})", batch
+                )
+                for release_id, payload in rows:
+                    found[release_id] = json.loads(payload)
+        return found
+
+    def put(
+        self,
+        release_id: int,
+        data: Dict,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ) -> None:
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO releases"
+                    " (release_id, payload, error, etag, last_modified, checked_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    (int(release_id), _dumps(data), data.get("_error"), etag, last_modified, time.time()),
+                )
+
+    def put_many(self, releases: Dict[int, Dict]) -> None:
+        """
+        Bulk insert without validators (e.g. migrated files); the first
+        revalidation of these is an unconditional fetch.
+        """
+        rows = [(int(rid), _dumps(data), data.get("_error")) for rid, data in releases.items()]
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO releases (release_id, payload, error) VALUES (?, ?, ?)",
+                    rows,
+                )
+
+    def put_tombstone(self, release_id: int, error: str) -> None:
+        self.put(release_id, {"_error": error, "release_id": release_id})
+
+    def repair(self) -> int:
+        """
+        Startup check after a possible crash: runs SQLite's quick_check and
+        drops any row whose payload isn't valid JSON, so it gets refetched
+        instead of breaking a later read. Returns the number of rows dropped.
+        """
+        with self._lock:
+            problems = [row[0] for row in self._conn.execute("PRAGMA quick_check")]
+            if problems != ["ok"]:
+                print(f"Warning: {self.path} failed its integrity check: {'; '.join(problems[:5])}")
+            try:
+                with self._conn:
+                    return self._conn.execute("DELETE FROM releases WHERE NOT json_valid(payload)").rowcount
+            except sqlite3.OperationalError:
+                # SQLite built without JSON support: check in Python
+                bad = []
+                for release_id, payload in self._conn.execute("SELECT release_id, payload FROM releases"):
+                    try:
+                        json.loads(payload)
+                    except ValueError:
+                        bad.append((release_id,))
+                with self._conn:
+                    self._conn.executemany("DELETE FROM releases WHERE release_id = ?", bad)
+                return len(bad)
+
+    def validators_many(self, release_ids: Iterable[int]) -> Dict[int, Validators]:
+        """
+        Validators for every stored, non-tombstone id in release_ids. Payloads
+        aren't read, so this is cheap even for a big cache.
+        """
+        ids = list(dict.fromkeys(int(r) for r in release_ids))
+        found: Dict[int, Validators] = {}
+        with self._lock:
+            for i in range(0, len(ids), _BATCH):
+                batch = ids[i:i + _BATCH]
+                marks = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    "SELECT release_id, etag, last_modified, checked_at FROM releases"
+                    f" WHERE error IS NULL AND release_id IN ({marks})",
+                    batch,
+                )
+                for release_id, etag, last_modified, checked_at in rows:
+                    found[release_id] = (etag, last_modified, checked_at)
+        return found
+
+    def mark_fresh(
+        self, release_id: int, etag: Optional[str] = None, last_modified: Optional[str] = None
+    ) -> None:
+        """
+        Records a 304 for release_id: the payload stays as it is, only the
+        check time (and any validators the server sent along) move on.
+        """
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "UPDATE releases SET checked_at = ?,"
+                    " etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified)"
+                    " WHERE release_id = ?",
+                    (time.time(), etag, last_modified, int(release_id)),
+                )
+
+
+def migrate_cache_dir(store: ReleaseStore, cache_dir: str = DEFAULT_CACHE_DIR) -> int:
+    """
+    Imports legacy cache/discogs_release_<id>.json files into the store.
+    Unreadable (e.g. truncated) files are skipped. Returns the number imported.
+    """
+    imported = 0
+    batch: Dict[int, Dict] = {}
+
+    for path in glob.glob(os.path.join(cache_dir, "discogs_release_*.json")):
+        m = _LEGACY_FILE_RE.search(os.path.basename(path))
+        if not m:
+            continue
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                batch[int(m.group(1))] = json.load(f)
+        except (OSError, ValueError):
+            print(f"Warning: skipping unreadable cache file {path}")
+            continue
+
+        if len(batch) >= _BATCH:
+            store.put_many(batch)
+            imported += len(batch)
+            batch = {}
+
+    if batch:
+        store.put_many(batch)
+        imported += len(batch)
+
+    return imported
+
+
+_default_store: Optional[ReleaseStore] = None
+_default_store_lock = threading.Lock()
+
+
+def default_release_store() -> ReleaseStore:
+    """
+    Process-wide store at DEFAULT_STORE_PATH. The first time the store file is
+    created, any legacy per-release JSON files in cache/ are imported into it.
+    """
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            is_new = not os.path.exists(DEFAULT_STORE_PATH)
+            _default_store = ReleaseStore(DEFAULT_STORE_PATH)
+            if is_new:
+                imported = migrate_cache_dir(_default_store)
+                if imported:
+                    print(f"Migrated {imported} cached releases into {DEFAULT_STORE_PATH}")
+        return _default_store
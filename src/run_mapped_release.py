@@ -1,13 +1,8 @@
-import json
 from typing import Dict, List
 
 from rekordbox_import import import_rekordbox_playlist_xml
 from engine import recommend
-
-
-def load_mapping(path: str) -> Dict:
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+from mapping_file import load_mapping
 
 
 def main():
@@ -17,6 +12,8 @@ def main():
 
     # 2) Load Discogs↔RB mapping file
     mapping = load_mapping("mapping_784629.json")
+    if mapping is None:
+        return
 
     print(f"\nRelease: {', '.join(mapping.get('artists') or [])} - {mapping.get('title')}")
     print(f"Release ID: {mapping.get('release_id')}\n")
@@ -37,14 +34,17 @@ def main():
 
     choice = int(input("\nSelect number: "))
     chosen = mapped_tracks[choice - 1]
-    current = track_index[chosen["rb_track_id"]]
+    current = track_index.get(chosen["rb_track_id"])
+    if current is None:
+        print("That track isn't in the playlist.")
+        return
 
     print(f"\nCurrent: {current.artist} - {current.title}")
     print(f"BPM: {current.bpm:.2f} | Key: {current.key} | Energy: {current.energy}\n")
 
     # 4) Recommend
-    results = recommend(current, tracks)
-    for track, score, b in results[:10]:
+    results = recommend(current, tracks, k=10)
+    for track, score, b in results:
         print(
             f"{track.artist} - {track.title} | "
             f"{track.bpm:.2f} | {track.key} | E{track.energy} | "
@@ -0,0 +1,226 @@
+import glob
+import math
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from compat_graph import CompatGraph
+from engine import recommend_many
+from mapping_file import load_mapping, mapped_tracks
+from models import Track
+from query import TrackIndex
+from tag_registry import TagRegistry
+
+# Target for a full scan -> recommendations round trip
+DEFAULT_P99_BUDGET_MS = 50.0
+# How many scan latencies are kept for the percentiles
+LATENCY_WINDOW = 10000
+
+_SIDE_RE = re.compile(r"^[A-Za-z]+")
+
+
+def side_of(position: str) -> str:
+    """
+    Vinyl side from a Discogs position: "A1" -> "A", "B" -> "B", "AA2" -> "AA".
+    Positions without a letter (CDs, "1-3") all land on side "".
+    """
+    m = _SIDE_RE.match(position or "")
+    return m.group(0).upper() if m else ""
+
+
+def load_mappings(mappings_dir: str) -> Dict[str, Dict]:
+    """
+    Every current-format mapping_*.json in mappings_dir, keyed by
+    str(release_id); older files are skipped with a warning.
+    """
+    mappings: Dict[str, Dict] = {}
+    for path in glob.glob(os.path.join(mappings_dir, "mapping_*.json")):
+        mapping = load_mapping(path)
+        if mapping is not None:
+            mappings[str(mapping.get("release_id"))] = mapping
+    return mappings
+
+
+class LatencyStats:
+    """
+    Rolling window of durations (ms) with nearest-rank percentiles.
+    """
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.window = window
+        self.samples: List[float] = []
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def record(self, ms: float) -> None:
+        with self._lock:
+            self.samples.append(ms)
+            if len(self.samples) > self.window:
+                del self.samples[: len(self.samples) - self.window]
+            self.count += 1
+
+    def percentile(self, p: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        rank = max(1, math.ceil(p / 100 * len(ordered)))
+        return ordered[rank - 1]
+
+    def summary(self, budget_ms: Optional[float] = None) -> Dict:
+        out = {
+            "count": self.count,
+            "p50_ms": self.percentile(50),
+            "p99_ms": self.percentile(99),
+            "max_ms": max(self.samples) if self.samples else None,
+        }
+        if budget_ms is not None:
+            out["p99_budget_ms"] = budget_ms
+            out["within_budget"] = out["p99_ms"] is not None and out["p99_ms"] <= budget_ms
+        return out
+
+
+@dataclass
+class ReleaseSides:
+    release_id: str
+    title: Optional[str]
+    artists: List[str]
+    # side -> [(mapping entry, Rekordbox track)], in tracklist order
+    sides: Dict[str, List[Tuple[Dict, Track]]]
+
+
+class ScanPipeline:
+    """
+    NFC tag -> release -> mapped tracks + recommendations, all in memory.
+
+    Mapping files are resolved to Track objects once up front, and each
+    release's per-side recommendations are cached after the first scan, so a
+    repeat scan is two dict lookups. Latency is tracked separately for cold
+    scans (recommendations computed) and warm ones (served from the cache),
+    so the cheap repeats don't hide the real cost in the percentiles.
+    """
+
+    def __init__(
+        self,
+        tracks: Sequence[Track],
+        mappings: Dict[str, Dict],
+        registry: TagRegistry,
+        index: Optional[TrackIndex] = None,
+        graph: Optional[CompatGraph] = None,
+        k: int = 10,
+        p99_budget_ms: float = DEFAULT_P99_BUDGET_MS,
+    ):
+        self.tracks = list(tracks)
+        # An index passed in belongs to the caller, who keeps it up to date
+        self._owns_index = index is None
+        self.index = index or TrackIndex(self.tracks)
+        self.registry = registry
+        self.graph = graph
+        self.k = k
+        self.p99_budget_ms = p99_budget_ms
+        self.cold_latency = LatencyStats()
+        self.warm_latency = LatencyStats()
+        self.mappings = mappings
+        self._cache: Dict[Tuple[str, int], Dict] = {}
+        self.releases: Dict[str, ReleaseSides] = {}
+        self._resolve_releases()
+
+    def _resolve_releases(self) -> None:
+        by_id = {t.id: t for t in self.tracks}
+        self.releases = {}
+        for release_id, mapping in self.mappings.items():
+            sides: Dict[str, List[Tuple[Dict, Track]]] = {}
+            for mt, rb in mapped_tracks(mapping, by_id):
+                sides.setdefault(side_of(mt.get("position")), []).append((mt, rb))
+            self.releases[release_id] = ReleaseSides(
+                release_id, mapping.get("title"), mapping.get("artists") or [], sides
+            )
+
+    def update(
+        self, tracks: Sequence[Track], changed: Sequence[Track] = (), graph: Optional[CompatGraph] = None
+    ) -> None:
+        """
+        Follows a new version of the track list: mapping files are resolved
+        against it again and cached results dropped. `graph` replaces the
+        current one (pass None once it no longer matches the tracks).
+        """
+        self.tracks = list(tracks)
+        if self._owns_index:
+            self.index.update(self.tracks, changed)
+        self.graph = graph
+        self.drop_cached()
+        self._resolve_releases()
+
+    def drop_cached(self) -> None:
+        """
+        Forgets the cached per-release results, so the next scans are cold.
+        """
+        self._cache = {}
+
+    def _side_recommendations(self, seeds: List[Track], exclude: set, k: int) -> List[Tuple[Track, int, Dict]]:
+        """
+        Best next tracks for a side: each candidate keeps its best score against
+        any track on the side; tracks from the release itself are left out.
+        """
+        best: Dict[int, Tuple[Track, int, Dict]] = {}
+        for results in recommend_many(seeds, self.index.columns, k=k + len(exclude), graph=self.graph):
+            for track, score, b in results:
+                if track.id in exclude:
+                    continue
+                if track.id not in best or score > best[track.id][1]:
+                    best[track.id] = (track, score, b)
+        return sorted(best.values(), key=lambda x: x[1], reverse=True)[:k]
+
+    def release_result(self, release_id: str, k: Optional[int] = None) -> Optional[Dict]:
+        k = self.k if k is None else k
+        cached = self._cache.get((release_id, k))
+        if cached is not None:
+            return cached
+
+        release = self.releases.get(release_id)
+        if release is None:
+            return None
+
+        exclude = {rb.id for side in release.sides.values() for _, rb in side}
+        result = {
+            "release_id": release.release_id,
+            "title": release.title,
+            "artists": release.artists,
+            "sides": [
+                {
+                    "side": side,
+                    "tracks": list(entries),
+                    "recommendations": self._side_recommendations([rb for _, rb in entries], exclude, k),
+                }
+                for side, entries in sorted(release.sides.items())
+            ],
+        }
+        self._cache[(release_id, k)] = result
+        return result
+
+    def scan(self, tag_uid: str, k: Optional[int] = None) -> Dict:
+        """
+        One scan event. Raises LookupError for an unknown tag or a release
+        with no mapping file. `cached` in the result says whether it was a
+        warm scan.
+        """
+        k = self.k if k is None else k
+        started = time.perf_counter()
+        release_id = self.registry.resolve(tag_uid)
+        if release_id is None:
+            raise LookupError(f"Unknown tag {tag_uid}")
+        cached = (release_id, k) in self._cache
+        result = self.release_result(release_id, k)
+        if result is None:
+            raise LookupError(f"Release {release_id} (tag {tag_uid}) has no mapping")
+        elapsed_ms = 1000 * (time.perf_counter() - started)
+        (self.warm_latency if cached else self.cold_latency).record(elapsed_ms)
+        return dict(result, tag_uid=tag_uid, elapsed_ms=round(elapsed_ms, 3), cached=cached)
+
+    def latency_summary(self) -> Dict:
+        return {
+            "cold": self.cold_latency.summary(self.p99_budget_ms),
+            "warm": self.warm_latency.summary(self.p99_budget_ms),
+        }
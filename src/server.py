@@ -0,0 +1,278 @@
+import json
+import os
+import threading
+import time
+import xml.etree.ElementTree as ET
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from compat_graph import CompatGraph
+from discogs_genres import apply_discogs_genres
+from engine import recommend
+from library_cache import load_rekordbox_library, refresh_rekordbox_library
+from match_index import MatchIndex
+from models import Track
+from query import TrackIndex
+from scan_pipeline import ScanPipeline, load_mappings
+from tag_registry import DEFAULT_TAG_REGISTRY, TagRegistry
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+
+def track_json(t: Track) -> Dict:
+    return {
+        "id": t.id,
+        "title": t.title,
+        "artist": t.artist,
+        "bpm": t.bpm,
+        "key": t.key,
+        "energy": t.energy,
+        "genres": list(t.genres),
+    }
+
+
+def results_json(results: List[Tuple[Track, int, Dict[str, int]]]) -> List[Dict]:
+    return [{"track": track_json(t), "score": score, "breakdown": b} for t, score, b in results]
+
+
+def scan_json(result: Dict) -> Dict:
+    sides = [
+        {
+            "side": side["side"],
+            "tracks": [
+                {"position": mt.get("position"), "discogs_title": mt.get("discogs_title"), "track": track_json(rb)}
+                for mt, rb in side["tracks"]
+            ],
+            "recommendations": results_json(side["recommendations"]),
+        }
+        for side in result["sides"]
+    ]
+    return dict(result, sides=sides)
+
+
+class LibraryState:
+    """
+    Everything a request needs, loaded once: the pool's tracks, the
+    scoring columns and BPM/key index, the match index, the mapping files
+    and the tag scan pipeline.
+
+    refresh() picks up a re-exported XML in place: only the tracks that
+    changed are re-read and re-indexed. Requests and refreshes take turns
+    on a lock, so a request never sees half an update.
+    """
+
+    def __init__(
+        self,
+        xml_path: str,
+        playlists: Optional[List[str]] = None,
+        mappings_dir: str = ".",
+        graph_path: Optional[str] = None,
+        tag_registry: str = DEFAULT_TAG_REGISTRY,
+        discogs_genres: Optional[str] = None,
+    ):
+        self.xml_path = xml_path
+        self.playlists = playlists
+        self.graph_path = graph_path
+        self._lock = threading.Lock()
+
+        self.library = load_rekordbox_library(xml_path)
+        self.tracks = self.library.pool(playlists)
+        self.genre_mappings = load_mappings(discogs_genres) if discogs_genres else None
+        if self.genre_mappings:
+            apply_discogs_genres(self.tracks, self.genre_mappings)
+        self.by_id = {t.id: t for t in self.tracks}
+        self.index = TrackIndex(self.tracks)
+        self.match_index = MatchIndex(self.tracks)
+
+        self.graph = None
+        if graph_path:
+            self.graph = CompatGraph.load(graph_path, self.tracks)
+            if self.graph is None:
+                print(f"Warning: {graph_path} was built for a different library; scoring live.")
+
+        self.mappings = load_mappings(mappings_dir)
+        self.scans = ScanPipeline(
+            self.tracks, self.mappings, TagRegistry(tag_registry), index=self.index, graph=self.graph
+        )
+
+    def refresh(self) -> Dict:
+        """
+        Re-reads the XML if it changed since it was loaded and updates the
+        pool and every index in place. The graph is kept only while it still
+        matches the pool. Returns counts of added/removed/changed pool tracks.
+        """
+        started = time.perf_counter()
+        with self._lock:
+            try:
+                diff = refresh_rekordbox_library(self.library, self.xml_path)
+            except ET.ParseError as e:
+                raise ValueError(f"Could not read {self.xml_path}: {e}") from None
+            if diff:
+                try:
+                    tracks = self.library.pool(self.playlists)
+                except ValueError as e:
+                    # e.g. the playlist was renamed: keep serving the same tracks
+                    print(f"Warning: {e} Keeping the current pool.")
+                    tracks = self.tracks
+                diff = diff.for_pool(self.tracks, tracks)
+            if diff:
+                if self.genre_mappings:
+                    apply_discogs_genres(diff.added + diff.changed, self.genre_mappings)
+                self.tracks = tracks
+                self.by_id = {t.id: t for t in tracks}
+                self.index.update(tracks, diff.changed)
+                self.match_index.update(tracks, diff.changed)
+                if self.graph_path:
+                    self.graph = CompatGraph.load(self.graph_path, tracks)
+                self.scans.update(tracks, diff.changed, graph=self.graph)
+        return dict(
+            diff.summary(),
+            tracks=len(self.tracks),
+            graph=self.graph is not None,
+            refresh_ms=round(1000 * (time.perf_counter() - started), 3),
+        )
+
+    def watch(self, interval_s: float) -> threading.Thread:
+        """
+        Calls refresh() every interval_s on a daemon thread. An export that
+        can't be read (e.g. still being written) is tried again once the file
+        changes.
+        """
+        def loop() -> None:
+            failed = None  # (size, mtime_ns) of an export that didn't parse
+            while True:
+                time.sleep(interval_s)
+                try:
+                    st = os.stat(self.xml_path)
+                    if (st.st_size, st.st_mtime_ns) == failed:
+                        continue
+                    result = self.refresh()
+                except (OSError, ValueError) as e:
+                    print(f"Warning: library refresh failed: {e}")
+                    failed = (st.st_size, st.st_mtime_ns) if isinstance(e, ValueError) else None
+                    continue
+                if result["added"] or result["removed"] or result["changed"]:
+                    print(
+                        f"Refreshed {self.xml_path}: +{result['added']} -{result['removed']} "
+                        f"~{result['changed']} tracks ({result['refresh_ms']} ms)"
+                    )
+
+        thread = threading.Thread(target=loop, name="library-watch", daemon=True)
+        thread.start()
+        return thread
+
+    def recommend(self, track_id: int, k: int) -> Dict:
+        with self._lock:
+            current = self.by_id.get(track_id)
+            if current is None:
+                raise LookupError(f"Track id {track_id} is not in the served pool")
+            results = recommend(current, self.index.columns, k=k, graph=self.graph)
+            return {"current": track_json(current), "results": results_json(results)}
+
+    def lookup(self, query: str, k: int) -> Dict:
+        # "Artist - Title" or just a title
+        artist, _, title = query.rpartition(" - ")
+        with self._lock:
+            candidates = self.match_index.best_candidates(artist, title, top_n=k)
+            return {
+                "query": query,
+                "candidates": [{"track": track_json(t), "match": score} for score, t in candidates],
+            }
+
+    def scan(self, tag_uid: str, k: int) -> Dict:
+        with self._lock:
+            return scan_json(self.scans.scan(tag_uid, k))
+
+    def stats(self) -> Dict:
+        return {
+            "xml": self.xml_path,
+            "playlists": self.playlists,
+            "tracks": len(self.tracks),
+            "mappings": len(self.mappings),
+            "graph": self.graph is not None,
+            "tags": len(self.scans.registry),
+            "scan_latency": self.scans.latency_summary(),
+        }
+
+
+def _param(params: Dict[str, str], name: str) -> str:
+    if name not in params:
+        raise ValueError(f"Missing parameter {name}")
+    return params[name]
+
+
+# (state, query params, k) -> response body
+Route = Callable[[LibraryState, Dict[str, str], int], Dict]
+
+# Read-only queries
+_GET_ROUTES: Dict[str, Route] = {
+    "/health": lambda state, params, k: state.stats(),
+    "/recommend": lambda state, params, k: state.recommend(int(_param(params, "track_id")), k),
+    "/lookup": lambda state, params, k: state.lookup(_param(params, "q"), k),
+    "/scan": lambda state, params, k: state.scan(_param(params, "uid"), k),
+}
+# Requests that change server state; POST, so prefetchers and probes can't trigger them
+_POST_ROUTES: Dict[str, Route] = {
+    "/refresh": lambda state, params, k: state.refresh(),
+}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    state: LibraryState  # set on the subclass made by make_server
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def _send(self, status: int, body: Dict) -> None:
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _dispatch(self, routes: Dict[str, Route], other: Dict[str, Route], other_method: str) -> None:
+        started = time.perf_counter()
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+
+        route = routes.get(url.path)
+        if route is None:
+            if url.path in other:
+                self._send(405, {"error": f"Use {other_method} for {url.path}"})
+            else:
+                self._send(404, {"error": f"Unknown endpoint {url.path}"})
+            return
+
+        try:
+            body = route(self.state, params, int(params.get("k", 10)))
+        except LookupError as e:
+            self._send(404, {"error": str(e.args[0])})
+            return
+        except ValueError as e:
+            self._send(400, {"error": str(e)})
+            return
+        except Exception as e:
+            # e.g. an unreadable export during /refresh: answer instead of dropping the connection
+            self._send(500, {"error": f"{type(e).__name__}: {e}"})
+            return
+
+        body["elapsed_ms"] = round(1000 * (time.perf_counter() - started), 3)
+        self._send(200, body)
+
+    def do_GET(self) -> None:
+        self._dispatch(_GET_ROUTES, _POST_ROUTES, "POST")
+
+    def do_POST(self) -> None:
+        # No endpoint takes a body; read it anyway so the connection stays in step
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        self._dispatch(_POST_ROUTES, _GET_ROUTES, "GET")
+
+
+def make_server(state: LibraryState, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> ThreadingHTTPServer:
+    handler = type("LibraryHandler", (_Handler,), {"state": state})
+    return ThreadingHTTPServer((host, port), handler)
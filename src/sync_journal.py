@@ -0,0 +1,59 @@
+import json
+import os
+from typing import Dict, Optional
+
+
+def journal_path(index_path: str) -> str:
+    return f"{index_path}.journal"
+
+
+class SyncJournal:
+    """
+    Append-only progress log for a long-running sync, next to the index it
+    builds (<index>.journal). The first line says which sync it belongs to;
+    every later line is a checkpoint, fsynced before the sync moves on, so
+    after a crash the last complete line is where to resume. A line cut off
+    by the crash is ignored.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def load(self, meta: Dict) -> Optional[Dict]:
+        """
+        Last checkpoint of an unfinished sync described by `meta`, or None
+        (no journal, a journal for a different sync, or no checkpoint yet).
+        """
+        try:
+            with open(self.path, "rb") as f:
+                lines = f.read().split(b"\n")
+        except OSError:
+            return None
+
+        entries = []
+        for line in lines:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                break
+        if len(entries) < 2 or entries[0] != {"meta": meta}:
+            return None
+        return entries[-1]
+
+    def start(self, meta: Dict) -> None:
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"meta": meta}, separators=(",", ":")) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    def checkpoint(self, state: Dict) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(state, separators=(",", ":")) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def clear(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,49 @@
+import json
+import os
+from typing import Dict, Optional
+
+DEFAULT_TAG_REGISTRY = "nfc_tags.json"
+
+
+def normalise_uid(tag_uid: str) -> str:
+    """
+    Readers report the same UID as "04a1b2c3", "04:A1:B2:C3" or "04 a1 b2 c3".
+    """
+    return "".join(c for c in tag_uid.upper() if c.isalnum())
+
+
+class TagRegistry:
+    """
+    Persistent NFC tag UID -> Discogs release id map, stored as JSON.
+    With path=None the registry lives in memory only (simulations).
+    """
+
+    def __init__(self, path: Optional[str] = DEFAULT_TAG_REGISTRY):
+        self.path = path
+        self.tags: Dict[str, str] = {}
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.tags = {normalise_uid(uid): str(rid) for uid, rid in json.load(f).items()}
+
+    def __len__(self) -> int:
+        return len(self.tags)
+
+    def __contains__(self, tag_uid: str) -> bool:
+        return normalise_uid(tag_uid) in self.tags
+
+    def resolve(self, tag_uid: str) -> Optional[str]:
+        return self.tags.get(normalise_uid(tag_uid))
+
+    def register(self, tag_uid: str, release_id) -> None:
+        self.tags[normalise_uid(tag_uid)] = str(release_id)
+
+    def unregister(self, tag_uid: str) -> bool:
+        return self.tags.pop(normalise_uid(tag_uid), None) is not None
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.tags, f, ensure_ascii=False, indent=2, sort_keys=True)
+        os.replace(tmp, self.path)
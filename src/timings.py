@@ -0,0 +1,148 @@
+import functools
+import sys
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Off by default: a disabled hook costs one global lookup per call
+_enabled = False
+_started: Optional[float] = None
+_lock = threading.Lock()
+# stage -> [calls, seconds, peak RSS (MB) seen when a call finished,
+#           perf_counter() of the last RSS sample]
+_stats: Dict[str, List] = {}
+# A stage's peak RSS is sampled at most this often, so a function called
+# thousands of times doesn't pay a getrusage() syscall on every call
+RSS_SAMPLE_INTERVAL_S = 0.05
+
+
+def peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def enable() -> None:
+    global _enabled, _started
+    reset()
+    _started = time.perf_counter()
+    _enabled = True
+
+
+def disable() -> None:
+    global _enabled
+    _enabled = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def reset() -> None:
+    with _lock:
+        _stats.clear()
+
+
+def _record(name: str, seconds: float, calls: int = 1) -> None:
+    now = time.perf_counter()
+    with _lock:
+        s = _stats.get(name)
+        if s is None:
+            s = _stats[name] = [0, 0.0, None, None]
+        s[0] += calls
+        s[1] += seconds
+        sample = s[3] is None or now - s[3] >= RSS_SAMPLE_INTERVAL_S
+        if sample:
+            s[3] = now
+    if sample:
+        rss = peak_rss_mb()
+        if rss is not None:
+            with _lock:
+                s[2] = max(s[2] or 0.0, rss)
+
+
+class stage:
+    """
+    Times a block as one call of `name`:
+
+        with timings.stage("rekordbox.parse_xml"):
+            ...
+    """
+    __slots__ = ("name", "t0")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.t0: Optional[float] = None
+
+    def __enter__(self) -> "stage":
+        self.t0 = time.perf_counter() if _enabled else None
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if self.t0 is not None:
+            _record(self.name, time.perf_counter() - self.t0)
+
+
+def timed(name: str) -> Callable:
+    """
+    Decorator form of stage(): every call of the function counts as one call of `name`.
+    """
+    def decorate(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _record(name, time.perf_counter() - t0)
+        return wrapper
+    return decorate
+
+
+def report() -> Dict:
+    """
+    Everything recorded since enable(), slowest stage first. Stage seconds
+    include nested stages and are summed across threads, so they can add up
+    to more than total_s. Work done in worker processes isn't seen. A
+    stage's peak RSS is sampled every RSS_SAMPLE_INTERVAL_S at most, so it
+    can miss growth during that stage's last calls.
+    """
+    with _lock:
+        stats = {name: list(s) for name, s in _stats.items()}
+    stages = [
+        {
+            "stage": name,
+            "calls": calls,
+            "seconds": seconds,
+            "mean_ms": 1000 * seconds / calls if calls else 0.0,
+            "peak_rss_mb": rss,
+        }
+        for name, (calls, seconds, rss, _) in stats.items()
+    ]
+    stages.sort(key=lambda s: s["seconds"], reverse=True)
+    return {
+        "total_s": time.perf_counter() - _started if _started is not None else None,
+        "peak_rss_mb": peak_rss_mb(),
+        "stages": stages,
+    }
+
+
+def format_report(rep: Dict) -> str:
+    lines = [f"{'stage':<28} {'calls':>9} {'total s':>9} {'mean ms':>10} {'peak MB':>8}"]
+    for s in rep["stages"]:
+        lines.append(
+            f"{s['stage']:<28} {s['calls']:>9} {s['seconds']:>9.3f} {s['mean_ms']:>10.3f} "
+            f"{s['peak_rss_mb'] or 0:>8.1f}"
+        )
+    total = rep["total_s"] or 0.0
+    lines.append(f"{'(command)':<28} {'':>9} {total:>9.3f} {'':>10} {rep['peak_rss_mb'] or 0:>8.1f}")
+    return "\n".join(lines)
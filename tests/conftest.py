@@ -0,0 +1,16 @@
+import pytest
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """
+    Fresh working directory with its own default release store (cache/ is
+    relative to the cwd, and the store is a process-wide singleton).
+    """
+    import release_store
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(release_store, "_default_store", None)
+    yield tmp_path
+    if release_store._default_store is not None:
+        release_store._default_store.close()
@@ -0,0 +1,198 @@
+"""
+Small seeded test data shared by the tests (tracks, Rekordbox exports,
+Discogs payloads), and a local fake Discogs API.
+"""
+import hashlib
+import json
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Sequence
+from urllib.parse import parse_qs, urlparse
+from xml.sax.saxutils import quoteattr
+
+from models import Track
+
+GENRES = ["Disco", "Boogie", "House", "Funk", "Soul"]
+
+
+def random_tracks(n: int, seed: int = 0) -> List[Track]:
+    rng = random.Random(seed)
+    return [
+        Track(
+            id=i + 1,
+            title=f"Track {i + 1}",
+            artist=f"Artist {rng.randint(1, max(1, n // 5))}",
+            bpm=round(rng.uniform(110, 130), 2),
+            key=f"{rng.randint(1, 12):02d}{rng.choice('AB')}",
+            genres=rng.sample(GENRES, rng.randint(0, 2)),
+            energy=rng.randint(1, 10) if rng.random() < 0.8 else None,
+        )
+        for i in range(n)
+    ]
+
+
+def edited_tracks(tracks: Sequence[Track], added: int, removed: int, changed: int, seed: int = 3) -> List[Track]:
+    """
+    The library as a later export might have it: some tracks gone, some
+    re-analysed (new BPM, key and energy), new ones appended with fresh ids.
+    """
+    rng = random.Random(seed)
+    gone = set(rng.sample(range(len(tracks)), removed))
+    out = [t for i, t in enumerate(tracks) if i not in gone]
+    for i in rng.sample(range(len(out)), changed):
+        t = out[i]
+        out[i] = Track(
+            id=t.id,
+            title=t.title,
+            artist=t.artist,
+            bpm=round(t.bpm + rng.uniform(-1, 1), 2),
+            key=f"{rng.randint(1, 12):02d}{rng.choice('AB')}",
+            genres=t.genres,
+            energy=rng.randint(1, 10),
+        )
+    next_id = max(t.id for t in tracks) + 1
+    for i, t in enumerate(random_tracks(added, seed=seed)):
+        t.id = next_id + i
+        out.append(t)
+    return out
+
+
+def write_rekordbox_xml(path: str, tracks: Sequence[Track]) -> None:
+    """
+    Minimal Rekordbox export: the tracks in COLLECTION and one "All" playlist.
+    """
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<DJ_PLAYLISTS Version="1.0.0">\n')
+        f.write(f'  <COLLECTION Entries="{len(tracks)}">\n')
+        for t in tracks:
+            comments = f"#{t.energy} Energy" if t.energy is not None else ""
+            f.write(
+                f'    <TRACK TrackID="{t.id}" Name={quoteattr(t.title)} Artist={quoteattr(t.artist)} '
+                f'Genre={quoteattr(", ".join(t.genres))} AverageBpm="{t.bpm:.2f}" '
+                f'Tonality="{t.key}" Comments={quoteattr(comments)}/>\n'
+            )
+        f.write('  </COLLECTION>\n  <PLAYLISTS>\n    <NODE Type="0" Name="ROOT" Count="1">\n')
+        f.write(f'      <NODE Name="All" Type="1" KeyType="0" Entries="{len(tracks)}">\n')
+        for t in tracks:
+            f.write(f'        <TRACK Key="{t.id}"/>\n')
+        f.write("      </NODE>\n    </NODE>\n  </PLAYLISTS>\n</DJ_PLAYLISTS>\n")
+
+
+def fake_releases(n: int, seed: int = 0) -> List[Dict]:
+    """
+    Discogs /releases/{id} payloads with a small tracklist each.
+    """
+    rng = random.Random(seed)
+    return [
+        {
+            "id": 100000 + i,
+            "title": f"Release {i + 1}",
+            "artists": [{"name": f"Artist {rng.randint(1, 20)}"}],
+            "year": rng.randint(1975, 1989),
+            "formats": [{"name": "Vinyl", "qty": "1"}],
+            "tracklist": [
+                {"position": f"A{j + 1}", "title": f"Song {i + 1}.{j + 1}", "duration": "5:00"}
+                for j in range(rng.randint(1, 4))
+            ],
+        }
+        for i in range(n)
+    ]
+
+
+def collection_items(releases: Sequence[Dict], first_instance_id: int = 500000) -> List[Dict]:
+    """
+    Collection listing entries for the releases, newest first.
+    """
+    return [
+        {
+            "instance_id": first_instance_id + i,
+            "date_added": f"2024-01-01T00:00:00-{i:05d}",
+            "basic_information": {k: r[k] for k in ("id", "title", "artists", "year", "formats")},
+        }
+        for i, r in enumerate(releases)
+    ]
+
+
+class FakeDiscogsServer:
+    """
+    Collection listing and release endpoints served from memory on a
+    background thread. Tests edit `items` (newest first) and `releases`
+    between calls to change what the next sync sees.
+
+    Releases carry an ETag (a hash of the body), and a matching
+    If-None-Match gets a bodyless 304; `not_modified` counts those.
+
+        with FakeDiscogsServer(releases) as server:
+            client = DiscogsClient("token", "tests", base_url=server.url)
+    """
+
+    def __init__(self, releases: Sequence[Dict]):
+        self.releases = {r["id"]: r for r in releases}
+        self.items = collection_items(releases)
+        self.not_modified = 0
+        self._lock = threading.Lock()
+        self._httpd: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handle(self, handler: BaseHTTPRequestHandler) -> None:
+        url = urlparse(handler.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if "/collection/" in url.path:
+            page, per_page = int(params.get("page", 1)), int(params.get("per_page", 50))
+            items = self.items[::-1] if params.get("sort_order") == "asc" else self.items
+            body = {
+                "pagination": {
+                    "page": page,
+                    "pages": max(1, -(-len(items) // per_page)),
+                    "per_page": per_page,
+                    "items": len(items),
+                },
+                "releases": items[(page - 1) * per_page: page * per_page],
+            }
+        else:
+            body = self.releases.get(int(url.path.rsplit("/", 1)[-1]))
+
+        data = json.dumps(body).encode("utf-8") if body is not None else b""
+        etag = f'"{hashlib.sha1(data).hexdigest()}"' if body is not None and "/releases/" in url.path else None
+        if etag is not None and handler.headers.get("If-None-Match") == etag:
+            with self._lock:
+                self.not_modified += 1
+            data = b""
+            handler.send_response(304)
+        else:
+            handler.send_response(200 if body is not None else 404)
+            handler.send_header("Content-Type", "application/json")
+        if etag is not None:
+            handler.send_header("ETag", etag)
+        handler.send_header("Content-Length", str(len(data)))
+        handler.send_header("X-Discogs-Ratelimit", "1000000")
+        handler.send_header("X-Discogs-Ratelimit-Remaining", "1000000")
+        handler.end_headers()
+        handler.wfile.write(data)
+
+    def __enter__(self) -> "FakeDiscogsServer":
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args) -> None:
+                pass
+
+            def do_GET(self) -> None:
+                server._handle(self)
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._httpd.daemon_threads = True
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
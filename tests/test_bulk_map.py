@@ -0,0 +1,57 @@
+import json
+
+import pytest
+
+from bulk_map import map_all_releases
+from models import Track
+
+
+@pytest.fixture
+def pool():
+    return [
+        Track(1, "Night Fever", "Bee Gees", 109.0, "04A", ["Disco"], 6),
+        # Two copies of one song: any match against them is ambiguous
+        Track(2, "Boogie Wonderland", "Earth Wind Fire", 132.0, "05A", ["Disco"], 8),
+        Track(3, "Boogie Wonderland", "Earth Wind Fire", 132.0, "05A", ["Disco"], 8),
+        Track(4, "Stayin Alive", "Bee Gees", 104.0, "11A", ["Disco"], 7),
+    ]
+
+
+def _release(release_id, artist, *titles):
+    return {
+        "release_id": release_id,
+        "title": f"Release {release_id}",
+        "artists": [artist],
+        "tracklist": [{"position": f"A{i + 1}", "title": t} for i, t in enumerate(titles)],
+    }
+
+
+def _queue(path):
+    with open(path, encoding="utf-8") as f:
+        return [(item["release_id"], item["discogs_title"], item.get("status")) for item in json.load(f)]
+
+
+def test_review_queue_keeps_items_of_releases_not_mapped_again(tmp_path, pool):
+    out, queue = str(tmp_path / "mappings"), str(tmp_path / "review_queue.json")
+    first = _release(10, "Bee Gees", "Night Fever", "Xylophone Quartet Zq")
+    second = _release(20, "Earth Wind Fire", "Boogie Wonderland")
+
+    stats = map_all_releases([first], pool, out, queue, workers=1)
+    assert (stats["accepted"], stats["review"], stats["unmatched"]) == (1, 0, 1)
+    assert _queue(queue) == [(10, "Xylophone Quartet Zq", "unmatched")]
+
+    # Release 10 is skipped as already mapped; its queued line must survive
+    stats = map_all_releases([first, second], pool, out, queue, workers=1)
+    assert (stats["skipped_existing"], stats["review"], stats["review_kept"]) == (1, 1, 1)
+    assert sorted(_queue(queue)) == [
+        (10, "Xylophone Quartet Zq", "unmatched"),
+        (20, "Boogie Wonderland", "ambiguous"),
+    ]
+
+    # Mapping a release again replaces its items rather than adding to them
+    stats = map_all_releases([first], pool, out, queue, workers=1, overwrite=True)
+    assert stats["review_kept"] == 1
+    assert sorted(_queue(queue)) == [
+        (10, "Xylophone Quartet Zq", "unmatched"),
+        (20, "Boogie Wonderland", "ambiguous"),
+    ]
@@ -0,0 +1,154 @@
+import pytest
+import requests
+
+from discogs_client import DiscogsClient, RateLimiter
+from discogs_sync import (
+    load_release_index,
+    open_release_index,
+    refresh_releases_cached,
+    write_release_index_all,
+    write_release_index_incremental,
+)
+from release_store import default_release_store
+from support import FakeDiscogsServer, collection_items, fake_releases
+
+
+class FlakyClient(DiscogsClient):
+    """
+    Loses the connection when asked for one collection page, as if the sync
+    was interrupted there.
+    """
+
+    def __init__(self, *args, fail_page: int, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fail_page = fail_page
+
+    def get_collection_releases(self, username, folder_id=0, page=1, *args, **kwargs):
+        if page == self.fail_page:
+            raise requests.ConnectionError("connection dropped")
+        return super().get_collection_releases(username, folder_id, page, *args, **kwargs)
+
+
+@pytest.fixture(scope="module")
+def releases():
+    return fake_releases(250, seed=12)
+
+
+def _client(server, cls=DiscogsClient, **kwargs):
+    return cls("token", "CrateLogicTests/0.1", base_url=server.url, **kwargs)
+
+
+def _instance_ids(path):
+    return [r["instance_id"] for r in load_release_index(path)["releases"]]
+
+
+def test_incremental_sync_counts_new_and_removed(workdir, releases, capsys):
+    with FakeDiscogsServer(releases[:150]) as server:
+        write_release_index_all(_client(server), "tests", "index.json")
+        before = _instance_ids("index.json")
+
+        # Three items added on top (newest first), two older ones removed
+        added = releases[150:153]
+        removed = {server.items[40]["instance_id"], server.items[90]["instance_id"]}
+        server.items = collection_items(added, first_instance_id=900000) + [
+            it for it in server.items if it["instance_id"] not in removed
+        ]
+        server.releases.update({r["id"]: r for r in added})
+
+        capsys.readouterr()
+        header = write_release_index_incremental(_client(server), "tests", "index.json")
+
+    assert "3 new, 2 removed" in capsys.readouterr().out
+    assert header["count"] == 151
+    assert _instance_ids("index.json") == [900000, 900001, 900002] + [i for i in before if i not in removed]
+
+
+def test_incremental_sync_without_an_index_does_a_full_sync(workdir, releases, capsys):
+    with FakeDiscogsServer(releases[:20]) as server:
+        write_release_index_incremental(_client(server), "tests", "index.json")
+    assert "doing a full sync" in capsys.readouterr().out
+    assert [r["release_id"] for r in load_release_index("index.json")["releases"]] == [r["id"] for r in releases[:20]]
+
+
+def test_index_reader_looks_up_releases_by_id(workdir, releases):
+    with FakeDiscogsServer(releases[:60]) as server:
+        write_release_index_all(_client(server), "tests", "index.json")
+    with open_release_index("index.json") as reader:
+        assert len(reader) == 60
+        assert reader.get(releases[33]["id"])["title"] == releases[33]["title"]
+        assert reader.get(1) is None
+
+
+def test_refresh_keeps_payload_on_304(workdir, releases):
+    with FakeDiscogsServer(releases[:30]) as server:
+        client = _client(server)
+        write_release_index_all(client, "tests", "index.json")
+        store = default_release_store()
+        ids = [r["id"] for r in releases[:30]]
+
+        counts = refresh_releases_cached(client, ids)
+        assert counts["not_modified"] == server.not_modified == 30 and counts["updated"] == 0
+        assert all(store.get(r["id"]) == r for r in releases[:30])
+
+        # A corrected release is downloaded again and replaces the stored copy
+        corrected = dict(releases[0], title="Corrected Title")
+        server.releases[corrected["id"]] = corrected
+        counts = refresh_releases_cached(client, ids)
+        assert counts["updated"] == 1 and counts["not_modified"] == 29
+        assert store.get(corrected["id"]) == corrected
+
+        # Recently checked releases are skipped
+        assert refresh_releases_cached(client, ids, max_age_s=3600)["skipped_recent"] == 30
+
+
+def test_interrupted_full_sync_resumes(workdir, releases, capsys):
+    with FakeDiscogsServer(releases) as server:
+        write_release_index_all(_client(server), "tests", "clean.json")
+        expected = load_release_index("clean.json")
+
+        with pytest.raises(requests.ConnectionError):
+            write_release_index_all(_client(server, FlakyClient, fail_page=3), "tests", "index.json")
+        assert load_release_index("index.json") is None  # nothing published yet
+
+        capsys.readouterr()
+        header = write_release_index_all(_client(server), "tests", "index.json")
+
+    assert "Resuming sync after page 2" in capsys.readouterr().out
+    resumed = load_release_index("index.json")
+    ids = [r["instance_id"] for r in resumed["releases"]]
+    assert len(ids) == len(set(ids)) == header["written"]
+    assert resumed["releases"] == expected["releases"]
+    assert resumed["count"] == expected["count"] == len(releases)
+
+
+def test_resume_starts_over_when_pages_shifted_at_the_same_size(workdir, releases, capsys):
+    with FakeDiscogsServer(releases) as server:
+        with pytest.raises(requests.ConnectionError):
+            write_release_index_all(_client(server, FlakyClient, fail_page=3), "tests", "index.json")
+
+        # The oldest record is removed and one is added, so the total stays
+        # the same but every page moves along by one item
+        oldest = server.items.pop()
+        server.items.insert(0, dict(oldest, instance_id=900000, date_added="2025-01-01T00:00:00-00000"))
+        expected = [item["instance_id"] for item in server.items]
+
+        capsys.readouterr()
+        write_release_index_all(_client(server), "tests", "index.json")
+
+    out = capsys.readouterr().out
+    assert "Collection changed since the interrupted sync; starting over." in out
+    assert _instance_ids("index.json") == expected
+
+
+def test_rate_limiter_follows_a_raised_server_limit():
+    limiter = RateLimiter(limit=60)
+    first, second = limiter.acquire(), limiter.acquire()
+
+    # The newer request's response may raise the budget...
+    limiter.update({"X-Discogs-Ratelimit": "1000", "X-Discogs-Ratelimit-Remaining": "900"}, second)
+    assert limiter._remaining == 900 - 1  # `first` is still in flight
+    # ...an older one arriving late may only lower it
+    limiter.update({"X-Discogs-Ratelimit": "1000", "X-Discogs-Ratelimit-Remaining": "999"}, first)
+    assert limiter._remaining == 899
+    limiter.update({"X-Discogs-Ratelimit-Remaining": "500"}, limiter.acquire())
+    assert limiter._remaining == 500
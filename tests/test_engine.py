@@ -0,0 +1,109 @@
+import random
+
+import pytest
+
+import engine
+from columnar import TrackColumns
+from compat_graph import CompatGraph
+from engine import recommend, recommend_many, recommend_python
+from models import Track
+from support import random_tracks
+
+
+def _plain(results):
+    return [(t.id, score, breakdown) for t, score, breakdown in results]
+
+
+@pytest.fixture(scope="module")
+def library():
+    tracks = random_tracks(400, seed=7)
+    # Edge cases: no key, unparseable key, energy outside 1-10, 12 <-> 1 wrap
+    tracks += [
+        Track(1001, "No Key", "Edge", 120.0, "", ["Disco"], 5),
+        Track(1002, "Odd Key", "Edge", 121.0, "Cm", ["Disco", "Funk"], None),
+        Track(1003, "Loud", "Edge", 119.5, "12A", ["House"], 14),
+        Track(1004, "Wrap", "Edge", 120.5, "01A", [], 0),
+    ]
+    return tracks
+
+
+@pytest.fixture(scope="module")
+def seeds(library):
+    return random.Random(3).sample(library, 40) + library[-4:]
+
+
+@pytest.mark.parametrize("k", [None, 1, 10, 50])
+def test_recommend_matches_reference(library, seeds, k):
+    columns = TrackColumns(library)
+    for seed in seeds:
+        expected = _plain(recommend_python(seed, library))
+        assert _plain(recommend(seed, columns, k=k)) == expected[:k]
+        assert _plain(recommend(seed, library, k=k)) == expected[:k]
+
+
+@pytest.mark.parametrize("k", [None, 10])
+def test_recommend_many_matches_reference(library, seeds, k):
+    columns = TrackColumns(library)
+    batched = recommend_many(seeds, columns, k=k)
+    assert len(batched) == len(seeds)
+    for seed, results in zip(seeds, batched):
+        assert _plain(results) == _plain(recommend_python(seed, library))[:k]
+
+
+def test_graph_recommend_matches_reference(library, seeds):
+    graph = CompatGraph.build(library, k=20)
+    graph.bind(library)
+    for seed in seeds:
+        assert graph.can_answer(seed, 10)
+        assert _plain(graph.recommend(seed, 10)) == _plain(recommend_python(seed, library))[:10]
+        # recommend() goes through the graph when one is given
+        assert _plain(recommend(seed, library, k=10, graph=graph)) == _plain(graph.recommend(seed, 10))
+    assert not graph.can_answer(seeds[0], 21)
+
+
+def test_saved_graph_only_loads_for_the_same_library(library, tmp_path):
+    path = str(tmp_path / "graph.npz")
+    CompatGraph.build(library, k=5).save(path)
+    graph = CompatGraph.load(path, library)
+    assert _plain(graph.recommend(library[0], 5)) == _plain(recommend_python(library[0], library))[:5]
+
+    edited = library[:-1] + [Track(2000, "New", "Edge", 120.0, "08A", ["Disco"], 5)]
+    assert CompatGraph.load(path, edited) is None
+
+
+def test_assigning_key_and_genres_keeps_scoring_in_step():
+    seed = Track(1, "Seed", "A", 120.0, "08A", ["Disco"], 5)
+    other = Track(2, "Other", "B", 120.0, "08A", ["Disco"], 5)
+    other.genres = ["House"]
+    other.key = "03B"
+    seed.genres = ["House"]
+
+    expected = {"key": 0, "bpm": 35, "genre": 5, "energy": 10}
+    assert recommend_python(seed, [seed, other])[0][2] == expected
+    assert recommend(seed, [seed, other])[0][2] == expected
+    assert (other.key, other.key_num, other.key_mode, other.genres) == ("03B", 3, 1, ("House",))
+
+
+def test_plain_list_columns_are_reused_until_the_tracks_change(library):
+    tracks = list(library)
+    seed = tracks[0]
+    recommend(seed, tracks, k=5)
+    columns = engine._last_columns
+    assert recommend(seed, list(tracks), k=5) and engine._last_columns is columns
+
+    tracks[1] = Track(tracks[1].id, "Replaced", "Edge", seed.bpm, seed.key, list(seed.genres), seed.energy)
+    assert _plain(recommend(seed, tracks, k=1)) == _plain(recommend_python(seed, tracks))[:1]
+    assert engine._last_columns is not columns
+
+
+def test_genres_differing_in_case_are_different_genres():
+    seed = Track(1, "Seed", "A", 120.0, "08A", ["Disco", "Funk"], 5)
+    tracks = [
+        seed,
+        Track(2, "Lower", "B", 120.0, "08A", ["disco", "funk"], 5),
+        Track(3, "Mixed", "C", 120.0, "08A", ["disco", "Funk"], 5),
+        Track(4, "Same", "D", 120.0, "08A", ["Funk", "Disco"], 5),
+    ]
+    expected = recommend_python(seed, tracks)
+    assert {t.id: b["genre"] for t, _, b in expected} == {2: 0, 3: 5, 4: 10}
+    assert _plain(recommend(seed, tracks, k=3)) == _plain(expected)
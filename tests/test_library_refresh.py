@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+
+from columnar import TrackColumns
+from library_cache import load_rekordbox_library, refresh_rekordbox_library
+from match_index import MatchIndex
+from query import Query, TrackIndex
+from rekordbox_import import parse_rekordbox_library, rekordbox_track_id
+from support import edited_tracks, random_tracks, write_rekordbox_xml
+
+COLUMNS = ("ids", "bpm", "energy", "key_num", "key_letter", "genre_bits")
+
+
+def _keys(columns):
+    # key codes depend on first-seen order, so compare the keys themselves
+    names = {code: key for key, code in columns.key_vocab.items()}
+    return [names.get(code) for code in columns.key_code.tolist()]
+
+
+@pytest.fixture
+def refreshed(tmp_path):
+    """
+    A library loaded from an export, indexes built over it, then the export
+    replaced (tracks added, removed and changed) and everything refreshed.
+    """
+    path = str(tmp_path / "rekordbox.xml")
+    tracks = random_tracks(1500, seed=5)
+    write_rekordbox_xml(path, tracks)
+    library = load_rekordbox_library(path)
+    pool = library.pool()
+    index, match_index = TrackIndex(pool), MatchIndex(pool)
+
+    write_rekordbox_xml(path, edited_tracks(tracks, added=10, removed=5, changed=5))
+    diff = refresh_rekordbox_library(library, path)
+    new_pool = library.pool()
+    pool_diff = diff.for_pool(pool, new_pool)
+    index.update(new_pool, pool_diff.changed)
+    match_index.update(new_pool, pool_diff.changed)
+    return path, pool, diff, library, index, match_index
+
+
+def test_ids_are_rekordbox_track_ids(tmp_path):
+    path = str(tmp_path / "rekordbox.xml")
+    tracks = random_tracks(50)
+    write_rekordbox_xml(path, tracks)
+    assert [t.id for t in parse_rekordbox_library(path).pool()] == [t.id for t in tracks]
+    assert rekordbox_track_id("abc") == rekordbox_track_id("abc") != rekordbox_track_id("abd")
+
+
+def test_diff_counts_and_identity(refreshed):
+    _, old_pool, diff, library, _, _ = refreshed
+    assert diff.summary() == {"added": 10, "removed": 5, "changed": 5}
+    new_pool = library.pool()
+    # Unchanged and changed tracks keep their Track objects
+    old_ids = {id(t) for t in old_pool}
+    assert sum(id(t) in old_ids for t in new_pool) == len(new_pool) - 10
+    assert all(id(t) in old_ids for t in diff.changed)
+    assert not refresh_rekordbox_library(library, refreshed[0])
+
+
+def test_refresh_matches_fresh_rebuild(refreshed):
+    path, _, _, library, index, match_index = refreshed
+    fresh = parse_rekordbox_library(path).pool()
+    pool = library.pool()
+    assert [(t.id, t.title, t.bpm, t.key, t.genres, t.energy, t.genre_mask) for t in pool] == [
+        (t.id, t.title, t.bpm, t.key, t.genres, t.energy, t.genre_mask) for t in fresh
+    ]
+
+    fresh_index, fresh_match = TrackIndex(fresh), MatchIndex(fresh)
+    for name in COLUMNS:
+        assert np.array_equal(getattr(index.columns, name), getattr(fresh_index.columns, name)), name
+    assert _keys(index.columns) == _keys(fresh_index.columns)
+    assert np.array_equal(match_index._titles.gram_counts, fresh_match._titles.gram_counts)
+
+    by_id = {t.id: t for t in fresh}
+    for seed in pool[::50]:
+        fresh_seed = by_id[seed.id]
+        assert [(t.id, s) for t, s, _ in index.columns.recommend(seed, k=20)] == [
+            (t.id, s) for t, s, _ in fresh_index.columns.recommend(fresh_seed, k=20)
+        ]
+        q = Query(bpm_min=seed.bpm - 3, bpm_max=seed.bpm + 3, keys=[seed.key], genres=list(seed.genres) or None)
+        assert np.array_equal(index.select(q), fresh_index.select(q))
+        assert [t.id for t in match_index.shortlist(seed.artist, seed.title, 30)] == [
+            t.id for t in fresh_match.shortlist(seed.artist, seed.title, 30)
+        ]
+
+
+def test_snapshot_reload_after_reexport(refreshed):
+    path, _, _, library, index, _ = refreshed
+    reloaded = load_rekordbox_library(path)
+    assert [t.id for t in reloaded.pool()] == [t.id for t in library.pool()]
+    columns = TrackColumns(reloaded.pool())
+    for name in COLUMNS:
+        assert np.array_equal(getattr(columns, name), getattr(index.columns, name)), name
@@ -0,0 +1,39 @@
+import json
+
+from bulk_map import map_all_releases, mapping_path
+from mapping_file import mapped_tracks
+from models import Track
+from scan_pipeline import load_mappings
+
+
+def _tracks():
+    return [
+        Track(1, "Night Fever", "Bee Gees", 109.0, "04A", ["Disco"], 6),
+        Track(4, "Stayin Alive", "Bee Gees", 104.0, "11A", ["Disco"], 7),
+    ]
+
+
+def test_old_mapping_files_are_skipped_and_renamed_tracks_flagged(tmp_path, capsys):
+    out = str(tmp_path)
+    release = {
+        "release_id": 10,
+        "title": "Saturday Night Fever",
+        "artists": ["Bee Gees"],
+        "tracklist": [{"position": "A1", "title": "Night Fever"}, {"position": "A2", "title": "Stayin Alive"}],
+    }
+    map_all_releases([release], _tracks(), out, str(tmp_path / "review_queue.json"), workers=1)
+
+    # Written before ids were Rekordbox TrackIDs: id 1 was "the first track"
+    with open(mapping_path(out, 20), "w", encoding="utf-8") as f:
+        json.dump({"release_id": 20, "tracks": [{"position": "A1", "rb_track_id": 1}]}, f)
+
+    capsys.readouterr()
+    mappings = load_mappings(out)
+    assert list(mappings) == ["10"]
+    assert "mapping_20.json was written by an older version" in capsys.readouterr().out
+
+    renamed = _tracks()
+    renamed[0].title = "Night Fever (Edit)"
+    pairs = mapped_tracks(mappings["10"], {t.id: t for t in renamed[:1]})
+    assert [(mt["position"], t.id) for mt, t in pairs] == [("A1", 1)]
+    assert "was mapped to Bee Gees - Night Fever, but track 1 is now" in capsys.readouterr().out
@@ -0,0 +1,13 @@
+from planner import SetPlanner
+from support import random_tracks
+
+
+def test_plan_outlasts_the_cached_neighbours():
+    library = random_tracks(30, seed=4)
+    planner = SetPlanner(library, neighbours=3)
+    plan = planner.plan(library[0], length=20)
+    ids = [step.track.id for step in plan]
+    assert len(ids) == 20 and len(set(ids)) == 20
+
+    # Only running out of library tracks makes a plan short
+    assert len(planner.plan(library[0], length=50)) == 30
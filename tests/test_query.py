@@ -0,0 +1,63 @@
+import pytest
+
+from columnar import TrackColumns
+from engine import recommend
+from models import genre_vocabulary
+from query import Query, TrackIndex
+from support import random_tracks
+
+
+@pytest.fixture(scope="module")
+def library():
+    return random_tracks(500, seed=21)
+
+
+def _brute_force(library, q):
+    rows = []
+    for row, t in enumerate(library):
+        if q.bpm_min is not None and t.bpm < q.bpm_min:
+            continue
+        if q.bpm_max is not None and t.bpm > q.bpm_max:
+            continue
+        if q.keys is not None and t.key not in q.keys:
+            continue
+        if q.min_energy is not None and (t.energy is None or t.energy < q.min_energy):
+            continue
+        if q.genres is not None and not set(t.genres) & set(q.genres):
+            continue
+        rows.append(row)
+    return rows
+
+
+@pytest.mark.parametrize(
+    "q",
+    [
+        Query(),
+        Query(bpm_min=118, bpm_max=122),
+        Query(keys=["08A", "09A", "08B"]),
+        Query(bpm_min=115, bpm_max=125, keys=["01A", "12A"], min_energy=5),
+        Query(genres=["Disco", "Funk"]),
+        Query(bpm_min=140),
+    ],
+)
+def test_select_matches_brute_force(library, q):
+    assert TrackIndex(library).select(q).tolist() == _brute_force(library, q)
+
+
+def test_recommend_keeps_engine_scores(library):
+    index = TrackIndex(library)
+    for seed in library[::50]:
+        compatible = {t.id for t in (library[r] for r in index.select(index.compatible_query(seed)))}
+        expected = [
+            (t.id, score) for t, score, b in recommend(seed, TrackColumns(library))
+            if t.id in compatible and b["bpm"] > 0
+        ]
+        assert [(t.id, score) for t, score, _ in index.recommend(seed)] == expected
+
+
+def test_unknown_query_genres_match_nothing_and_stay_out_of_vocabulary(library):
+    index = TrackIndex(library)
+    size = len(genre_vocabulary())
+    assert len(index.select(Query(genres=["Not A Genre"]))) == 0
+    assert len(index.select(Query(genres=["Not A Genre", "Disco"]))) == len(index.select(Query(genres=["Disco"])))
+    assert len(genre_vocabulary()) == size
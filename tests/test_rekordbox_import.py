@@ -0,0 +1,56 @@
+import pytest
+
+from rekordbox_import import _parse_genres, import_rekordbox_playlist_xml, parse_rekordbox_library
+
+# A "Disco" folder holding a "Disco" playlist, next to a "House" playlist
+XML = """<?xml version="1.0" encoding="UTF-8"?>
+<DJ_PLAYLISTS Version="1.0.0">
+  <COLLECTION Entries="3">
+    <TRACK TrackID="1" Name="One" Artist="A" Genre="Disco" AverageBpm="120.00" Tonality="8A"/>
+    <TRACK TrackID="2" Name="Two" Artist="B" Genre="Disco" AverageBpm="121.00" Tonality="9A"/>
+    <TRACK TrackID="3" Name="Three" Artist="C" Genre="House" AverageBpm="124.00" Tonality="10A"/>
+  </COLLECTION>
+  <PLAYLISTS>
+    <NODE Type="0" Name="ROOT" Count="2">
+      <NODE Type="0" Name="Disco" Count="1">
+        <TRACK Key="1"/>
+        <NODE Name="Disco" Type="1" KeyType="0" Entries="1">
+          <TRACK Key="2"/>
+        </NODE>
+      </NODE>
+      <NODE Name="House" Type="1" KeyType="0" Entries="1">
+        <TRACK Key="3"/>
+      </NODE>
+    </NODE>
+  </PLAYLISTS>
+</DJ_PLAYLISTS>
+"""
+
+
+@pytest.fixture
+def xml_path(tmp_path):
+    path = tmp_path / "rekordbox.xml"
+    path.write_text(XML, encoding="utf-8")
+    return str(path)
+
+
+def _titles(tracks):
+    return [t.title for t in tracks]
+
+
+def test_single_playlist_name_takes_the_first_node(xml_path):
+    assert _titles(import_rekordbox_playlist_xml(xml_path, "Disco")) == ["One", "Two"]
+    library = parse_rekordbox_library(xml_path)
+    assert _titles(library.pool(["Disco"])) == ["One", "Two"]
+    assert _titles(library.pool(["/Disco/Disco"])) == ["Two"]
+
+
+def test_union_of_playlists_rejects_an_ambiguous_name(xml_path):
+    library = parse_rekordbox_library(xml_path)
+    with pytest.raises(ValueError, match="ambiguous"):
+        library.pool(["Disco", "House"])
+    assert _titles(library.pool(["/Disco", "House"])) == ["One", "Two", "Three"]
+
+
+def test_genres_are_deduplicated_exactly():
+    assert _parse_genres("Disco; disco, Disco | Funk") == ["Disco", "disco", "Funk"]
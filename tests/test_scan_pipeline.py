@@ -0,0 +1,35 @@
+from scan_pipeline import ScanPipeline
+from support import random_tracks
+from tag_registry import TagRegistry
+
+
+def test_cold_and_warm_scans_are_timed_apart():
+    tracks = random_tracks(200, seed=9)
+    mappings = {
+        "10": {
+            "release_id": 10,
+            "title": "Release 10",
+            "artists": ["Artist 1"],
+            "tracks": [
+                {"position": "A1", "rb_track_id": tracks[0].id},
+                {"position": "B1", "rb_track_id": tracks[1].id},
+            ],
+        }
+    }
+    registry = TagRegistry(None)
+    registry.register("04:AA", "10")
+    pipeline = ScanPipeline(tracks, mappings, registry, k=5)
+
+    first, second = pipeline.scan("04:AA"), pipeline.scan("04:AA")
+    assert (first["cached"], second["cached"]) == (False, True)
+    assert [side["side"] for side in first["sides"]] == ["A", "B"]
+    assert all(len(side["recommendations"]) == 5 for side in first["sides"])
+
+    pipeline.drop_cached()
+    assert not pipeline.scan("04:AA")["cached"]
+    # Another k is another cache entry
+    assert not pipeline.scan("04:AA", k=3)["cached"]
+
+    summary = pipeline.latency_summary()
+    assert (summary["cold"]["count"], summary["warm"]["count"]) == (3, 1)
+    assert summary["cold"]["p99_budget_ms"] == pipeline.p99_budget_ms
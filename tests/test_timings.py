@@ -0,0 +1,56 @@
+import pytest
+
+import timings
+from rekordbox_import import parse_rekordbox_library
+from support import random_tracks, write_rekordbox_xml
+
+
+@pytest.fixture
+def recording():
+    timings.enable()
+    yield
+    timings.disable()
+    timings.reset()
+
+
+def _stages():
+    return {s["stage"]: s for s in timings.report()["stages"]}
+
+
+def test_hot_stage_samples_rss_at_most_once_per_interval(recording, monkeypatch):
+    samples = []
+
+    def fake_rss():
+        samples.append(1)
+        return 100.0 + len(samples)
+
+    monkeypatch.setattr(timings, "peak_rss_mb", fake_rss)
+    monkeypatch.setattr(timings, "RSS_SAMPLE_INTERVAL_S", 3600.0)
+
+    @timings.timed("hot")
+    def hot(x):
+        return x + 1
+
+    for i in range(5000):
+        hot(i)
+    assert len(samples) == 1
+
+    stage = _stages()["hot"]
+    assert stage["calls"] == 5000
+    assert stage["peak_rss_mb"] == 101.0
+
+
+def test_collection_lookup_is_its_own_stage(recording, tmp_path):
+    path = str(tmp_path / "rekordbox.xml")
+    write_rekordbox_xml(path, random_tracks(200, seed=2))
+    library = parse_rekordbox_library(path)
+    library.playlist_tracks("All")
+
+    stages = _stages()
+    assert stages["rekordbox.collection_lookup"]["calls"] == 1
+    assert stages["rekordbox.parse_xml"]["calls"] == 1
+    assert stages["rekordbox.resolve_playlist"]["calls"] == 1
+    assert (
+        stages["rekordbox.collection_lookup"]["seconds"]
+        <= stages["rekordbox.parse_xml"]["seconds"]
+    )